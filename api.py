@@ -1,9 +1,25 @@
 # api.py — full replacement
 
-from fastapi import FastAPI
+from functools import partial
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from typing import Any, Dict, List
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, List, Optional
+from roma_engine.budgets import StageBudgets
+from roma_engine.cache import ReportCache
+from roma_engine.cohorts import CohortStats
+from roma_engine.instrumentation import Instrumentation
+from roma_engine.memo import NodeMemo
+from roma_engine.profiling import Profiler
 from roma_engine.runner import HealthRunner
+from roma_engine.scheduler import DagScheduler
+from roma_engine.schema import PayloadError, validate_batch, validate_dates, validate_payload
+from roma_engine.sessions import SessionStore
+from roma_engine.singleflight import SingleFlight
+from roma_engine.store import HistoryStore
+from roma_engine.web import (FastJSONResponse, ProfilingMiddleware, ReportResponses, coalesced,
+                             ndjson_report_response, payload_error_response, read_json)
 
 # Dev-friendly docs ON; safe to disable in prod by setting openapi_url=None
 app = FastAPI(
@@ -12,14 +28,57 @@ app = FastAPI(
     redoc_url=None,
     openapi_url="/openapi.json",
 )
+app.add_exception_handler(PayloadError, payload_error_response)
 
-runner = HealthRunner()
+# HEALTH_CACHE_SIZE>0 turns on the report cache; HEALTH_STORE_PATH turns on the history store;
+# HEALTH_METRICS=0 turns off /metrics instrumentation; HEALTH_PROFILE=1 / HEALTH_PROFILE_RATE
+# turn on per-request profiling (see /debug/profiles); HEALTH_MEMO_SIZE>0 memoizes agent stages;
+# HEALTH_COHORTS=1 / HEALTH_COHORTS_PATH add population percentiles to reports;
+# HEALTH_DEADLINE_MS bounds a report's time, past it coach/trends degrade (HEALTH_STAGE_BUDGETS_MS, HEALTH_DEGRADE=1);
+# HEALTH_SESSIONS_MAX / HEALTH_SESSIONS_TTL_S bound the day-sync sessions (per worker process);
+# HEALTH_DAG_WORKERS>1 runs a report's independent agents in parallel
+profiler = Profiler.from_env()
+runner = HealthRunner(cache=ReportCache.from_env(), instrumentation=Instrumentation.from_env(),
+                      store=HistoryStore.from_env(), profiler=profiler, memo=NodeMemo.from_env(),
+                      cohorts=CohortStats.from_env(), budgets=StageBudgets.from_env(),
+                      sessions=SessionStore.from_env(), max_workers=DagScheduler.workers_from_env())
+if profiler is not None:
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+# Concurrent identical report requests share one run (HEALTH_COALESCE=0 turns this off)
+flights = SingleFlight.from_env()
+if flights is not None and runner.instrumentation is not None:
+    runner.instrumentation.register("coalesce", flights.stats)
+# ETag / If-None-Match and gzip/br bodies for /weekly-report and /example (HEALTH_COMPRESS_MIN_BYTES)
+responses = ReportResponses.from_env(flights)
+if runner.instrumentation is not None:
+    runner.instrumentation.register("http", responses.stats)
 
 
 class Payload(BaseModel):
     user_profile: Dict[str, Any]
     targets: Dict[str, Any]
     daily_logs: List[Dict[str, Any]]
+    include_trends: bool = False
+
+
+# Report endpoints read the raw body (one-pass schema check, no model copy); this
+# keeps the Payload schema in the docs
+_PAYLOAD_BODY = {"requestBody": {"required": True, "content": {"application/json": {
+    "schema": Payload.model_json_schema()}}}}
+_BATCH_BODY = {"requestBody": {"required": True, "content": {"application/json": {
+    "schema": {"type": "array", "items": Payload.model_json_schema()}}}}}
+
+
+class DayUpdate(BaseModel):
+    day: Dict[str, Any]
+    user_profile: Optional[Dict[str, Any]] = None
+    targets: Optional[Dict[str, Any]] = None
+
+
+class HistoryUpdate(BaseModel):
+    user_profile: Optional[Dict[str, Any]] = None
+    targets: Optional[Dict[str, Any]] = None
+    daily_logs: List[Dict[str, Any]] = []
 
 
 @app.get("/")
@@ -28,8 +87,18 @@ def home():
         "name": "Health Tracker",
         "docs": "/docs",
         "report_endpoint": "/weekly-report",
+        "batch_report_endpoint": "/weekly-report/batch",
+        "weeks_report_endpoint": "/weekly-report/weeks",
+        "day_sync_endpoint": "/users/{user_id}/days",
+        "history_endpoint": "/users/{user_id}/history",
+        "history_report_endpoint": "/users/{user_id}/weekly-report",
+        "trends_endpoint": "/trends",
+        "stream_report_endpoint": "/weekly-report/stream",
         "example_endpoint": "/example",
         "healthcheck": "/health",
+        "cache_stats": "/cache/stats",
+        "metrics": "/metrics",
+        "profiles": "/debug/profiles",
     }
 
 
@@ -38,10 +107,48 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/cache/stats")
+def cache_stats():
+    # Report cache counters (enable with HEALTH_CACHE_SIZE / HEALTH_CACHE_TTL_S)
+    if runner.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **runner.cache.stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text: per-agent latency/size histograms, call and error counts
+    if runner.instrumentation is None:
+        return "# instrumentation disabled (HEALTH_METRICS=0)\n"
+    return runner.instrumentation.render()
+
+
+def _require_profiler():
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Profiling disabled (set HEALTH_PROFILE=1 or HEALTH_PROFILE_RATE)")
+
+
+@app.get("/debug/profiles")
+def list_profiles():
+    # Recent profiled requests, newest first: per-stage seconds and peak traced bytes
+    _require_profiler()
+    return {**profiler.stats(), "profiles": profiler.list()}
+
+
+@app.get("/debug/profiles/{profile_id}")
+def get_profile(profile_id: int):
+    # One profiled request with each stage's top functions by cumulative time
+    _require_profiler()
+    record = profiler.get(profile_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not in the buffer")
+    return record
+
+
 @app.get("/example")
-def example():
+def example(request: Request):
     # Ready-to-use example payload you can paste into /weekly-report
-    return {
+    return responses.static(request, {
         "user_profile": {
             "age": 28,
             "sex": "M",
@@ -79,12 +186,68 @@ def example():
                 "notes": "light walk",
             },
         ],
-    }
+    })
+
+
+@app.post("/weekly-report", openapi_extra=_PAYLOAD_BODY)
+async def weekly_report(request: Request):
+    # Hand off to ROMA runner; returns the final structured report JSON (304 when If-None-Match matches)
+    payload = await read_json(request, validate_payload)
+    return await responses.report(request, "run", payload, partial(run_in_threadpool, runner.run, payload), runner.cache)
+
+
+@app.post("/weekly-report/batch", openapi_extra=_BATCH_BODY)
+async def weekly_report_batch(request: Request):
+    # One runner pass for many users; results come back in request order
+    payloads = await read_json(request, validate_batch)
+    return FastJSONResponse(await run_in_threadpool(runner.run_batch, payloads))
+
+
+@app.post("/weekly-report/weeks", openapi_extra=_PAYLOAD_BODY)
+async def weekly_report_weeks(request: Request, start: Optional[str] = None, end: Optional[str] = None):
+    # One report per ISO week of the submitted logs; start/end are inclusive ISO dates (422 otherwise)
+    validate_dates(start=start, end=end)
+    payload = await read_json(request, validate_payload)
+    return FastJSONResponse(await coalesced(flights, "weeks", (payload, start, end),
+                                            partial(run_in_threadpool, runner.run_weeks, payload, start, end)))
+
+
+@app.post("/users/{user_id}/days")
+def upsert_day(user_id: str, update: DayUpdate):
+    # Absorb one new/corrected day into the user's running metrics (in-process state)
+    return runner.upsert_day(user_id, update.day, update.user_profile, update.targets)
+
+
+def _require_store():
+    if runner.store is None:
+        raise HTTPException(status_code=501, detail="History store disabled (set HEALTH_STORE_PATH)")
+
+
+@app.post("/users/{user_id}/history")
+def save_history(user_id: str, update: HistoryUpdate):
+    # Persist a delta: profile and/or targets and/or new or corrected days (repeated date replaces)
+    _require_store()
+    return runner.save_history(user_id, update.user_profile, update.targets, update.daily_logs)
+
+
+@app.get("/users/{user_id}/weekly-report")
+def history_report(user_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                   trends: bool = False):
+    # Report from stored, already-normalized history; start/end are inclusive ISO dates (422 otherwise)
+    validate_dates(start=start, end=end)
+    _require_store()
+    return runner.report_history(user_id, start, end, trends)
 
 
-@app.post("/weekly-report")
-def weekly_report(payload: Payload):
-    # Hand off to ROMA runner; returns the final structured report JSON
-    return runner.run(payload.dict())
+@app.post("/trends", openapi_extra=_PAYLOAD_BODY)
+async def trends(request: Request):
+    # 7/28/90-day rolling averages and week-over-week deltas (also in /weekly-report with include_trends)
+    payload = await read_json(request, validate_payload)
+    return FastJSONResponse(await coalesced(flights, "trends", payload, partial(run_in_threadpool, runner.trends, payload)))
 
 
+@app.post("/weekly-report/stream")
+async def weekly_report_stream(request: Request):
+    # NDJSON in: {"user_profile":..,"targets":..} line, then one daily log per line.
+    # NDJSON out: one {"type":"day",..} line per day as produced, {"type":"summary",..} last.
+    return ndjson_report_response(runner, request)
@@ -1,41 +1,63 @@
-from dotenv import load_dotenv
 from pathlib import Path
-import os, sys, json, traceback
-from typing import Optional, Dict, Any
+import asyncio, os, sys, json, threading, traceback
+from functools import partial
+from typing import Callable, Optional, Dict, Any, List
 
-# ---- Load .env from the REPO ROOT ----
 _here = Path(__file__).resolve()
 _root = _here.parent
-load_dotenv(dotenv_path=_root / ".env")
 
-# ---- CRITICAL: Set up LiteLLM/OpenRouter BEFORE any imports ----
-# This ensures ROMA uses OpenRouter instead of OpenAI
-openrouter_key = os.getenv("OPENROUTER_API_KEY")
-if not openrouter_key:
-    print("WARNING: OPENROUTER_API_KEY not set. Please add it to your .env file")
-    print("Get your free API key at: https://openrouter.ai/keys")
-    sys.exit(1)
+# ---- LLM/provider setup is lazy ----
+# The local HealthRunner agents never call an LLM, so nothing below runs at import
+# time; set HEALTH_REQUIRE_LLM=1 to restore the fail-fast check on startup.
+_llm_configured: Optional[bool] = None
+
+def configure_llm() -> bool:
+    """Load .env and point LiteLLM/Agno at OpenRouter, once, on first use.
 
-# Set up LiteLLM configuration for OpenRouter
-os.environ["LITELLM_API_KEY"] = openrouter_key
-os.environ["LITELLM_API_BASE"] = "https://openrouter.ai/api/v1"
-os.environ["OPENROUTER_BASE_URL"] = "https://openrouter.ai/api/v1"
+    Returns whether OPENROUTER_API_KEY is set.
+    """
+    global _llm_configured
+    if _llm_configured is not None:
+        return _llm_configured
+    try:
+        from dotenv import load_dotenv
+    except ImportError:  # .env support is optional; plain env vars still work
+        pass
+    else:
+        # ---- Load .env from the REPO ROOT ----
+        load_dotenv(dotenv_path=_root / ".env")
+
+    openrouter_key = os.getenv("OPENROUTER_API_KEY")
+    if openrouter_key:
+        # Set up LiteLLM configuration for OpenRouter
+        os.environ["LITELLM_API_KEY"] = openrouter_key
+        os.environ["LITELLM_API_BASE"] = "https://openrouter.ai/api/v1"
+        os.environ["OPENROUTER_BASE_URL"] = "https://openrouter.ai/api/v1"
 
-# Force OpenRouter as default provider
-os.environ["AGNO_DEFAULT_PROVIDER"] = "openrouter"
-os.environ["AGNO_DEFAULT_MODEL"] = "openrouter/deepseek/deepseek-chat"
+        # Force OpenRouter as default provider
+        os.environ["AGNO_DEFAULT_PROVIDER"] = "openrouter"
+        os.environ["AGNO_DEFAULT_MODEL"] = "openrouter/deepseek/deepseek-chat"
 
-# IMPORTANT: Set a dummy OpenAI key to prevent errors
-os.environ["OPENAI_API_KEY"] = "sk-dummy-key-for-openrouter"
+        # IMPORTANT: Set a dummy OpenAI key to prevent errors
+        os.environ["OPENAI_API_KEY"] = "sk-dummy-key-for-openrouter"
+    _llm_configured = bool(openrouter_key)
+    return _llm_configured
+
+if os.getenv("HEALTH_REQUIRE_LLM") == "1" and not configure_llm():
+    print("WARNING: OPENROUTER_API_KEY not set. Please add it to your .env file")
+    print("Get your free API key at: https://openrouter.ai/keys")
+    sys.exit(1)
 
 # ---- FastAPI app with simple local agents ----
-from fastapi import FastAPI, Body
+from fastapi import FastAPI, Body, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel, Field
 
-# Import your local health runner
-from roma_engine.runner import HealthRunner
+# Only the light pool and schema modules are imported eagerly; the runner, agents and
+# HTTP helpers (roma_engine.web: orjson, gzip/brotli, ETags) load on first use
+from roma_engine.executor import Overloaded, RunnerPool
+from roma_engine.schema import PayloadError, check_lenient, validate_batch, validate_dates, validate_payload
 
 app = FastAPI(title="Health Wellness Tracker", version="1.0.0")
 app.add_middleware(
@@ -46,8 +68,129 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.exception_handler(PayloadError)
+def _payload_error(request: Request, exc: PayloadError) -> JSONResponse:
+    from roma_engine.web import payload_error_response
+    return payload_error_response(request, exc)
+
+# HEALTH_PROFILE=1 profiles requests sent with "X-Health-Profile: 1"; HEALTH_PROFILE_RATE
+# samples a fraction of all requests; results are kept in memory under /debug/profiles
+profiler = None
+if os.getenv("HEALTH_PROFILE") or os.getenv("HEALTH_PROFILE_RATE"):
+    from roma_engine.profiling import Profiler
+    from roma_engine.web import ProfilingMiddleware
+    profiler = Profiler.from_env()
+    if profiler is not None:
+        app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
 # Use your local HealthRunner instead of ROMA's runner
-runner = HealthRunner()
+_runner = None
+_pool: Optional[RunnerPool] = None
+_runner_lock = threading.Lock()
+_responses = None
+_responses_lock = threading.Lock()
+
+def get_responses():
+    """ETag / If-None-Match and gzip/br bodies for /weekly-report and /example
+    (HEALTH_COMPRESS_MIN_BYTES), built on first use. Its `flights` make concurrent
+    identical report requests share one pool call; HEALTH_COALESCE=0 turns this off.
+    """
+    global _responses
+    if _responses is None:
+        with _responses_lock:
+            if _responses is None:
+                from roma_engine.singleflight import SingleFlight
+                from roma_engine.web import ReportResponses
+                _responses = ReportResponses.from_env(SingleFlight.from_env())
+    return _responses
+
+def get_runner():
+    """Import and build the HealthRunner and its pool on first use (fast worker spawn).
+
+    HEALTH_CACHE_SIZE>0 turns on the report cache; HEALTH_STORE_PATH turns on the history
+    store; HEALTH_METRICS=0 turns off /metrics instrumentation; HEALTH_MEMO_SIZE>0 memoizes
+    agent stages by input fingerprint; HEALTH_COHORTS=1 / HEALTH_COHORTS_PATH add population
+    percentiles to reports; HEALTH_DEADLINE_MS bounds a report's time, past it the coach and
+    trends stages degrade (HEALTH_STAGE_BUDGETS_MS; HEALTH_DEGRADE=1 degrades on errors
+    only). Runner work goes through a bounded pool so async endpoints never block the loop
+    (HEALTH_EXEC_MODE=thread|process|inline, HEALTH_EXEC_WORKERS, HEALTH_EXEC_MAX_PENDING,
+    HEALTH_EXEC_TIMEOUT_S). HEALTH_SESSIONS_MAX / HEALTH_SESSIONS_TTL_S bound the day-sync
+    sessions, which are per worker process. HEALTH_DAG_WORKERS>1 runs a report's independent
+    agents in parallel.
+    """
+    global _runner, _pool
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                from roma_engine.budgets import StageBudgets
+                from roma_engine.cache import ReportCache
+                from roma_engine.cohorts import CohortStats
+                from roma_engine.instrumentation import Instrumentation
+                from roma_engine.memo import NodeMemo
+                from roma_engine.runner import HealthRunner
+                from roma_engine.scheduler import DagScheduler
+                from roma_engine.sessions import SessionStore
+                from roma_engine.store import HistoryStore
+                runner = HealthRunner(cache=ReportCache.from_env(), instrumentation=Instrumentation.from_env(),
+                                      store=HistoryStore.from_env(), profiler=profiler, memo=NodeMemo.from_env(),
+                                      cohorts=CohortStats.from_env(), budgets=StageBudgets.from_env(),
+                                      sessions=SessionStore.from_env(), max_workers=DagScheduler.workers_from_env())
+                _pool = RunnerPool.from_env(runner)
+                if runner.instrumentation is not None:
+                    responses = get_responses()
+                    runner.instrumentation.register("pool", _pool.stats)
+                    if responses.flights is not None:
+                        runner.instrumentation.register("coalesce", responses.flights.stats)
+                    runner.instrumentation.register("http", responses.stats)
+                _runner = runner
+    return _runner
+
+def get_pool() -> RunnerPool:
+    get_runner()
+    return _pool
+
+@app.on_event("shutdown")
+def _shutdown_pool():
+    if _pool is not None:
+        _pool.shutdown()
+
+def _busy_response(e: Exception) -> JSONResponse:
+    """503 with Retry-After when the pool is full, 504 when a call timed out"""
+    if isinstance(e, Overloaded):
+        return JSONResponse(status_code=503, content={"error": f"server busy: {e}"}, headers={"Retry-After": "1"})
+    return JSONResponse(status_code=504, content={"error": f"report timed out after {get_pool().timeout_s}s"})
+
+async def _offload(method: str, *args, coalesce: bool = False, request: Optional[Request] = None):
+    """Run a HealthRunner method on the pool; failures become JSON error responses.
+
+    With `coalesce`, concurrent calls with the same method and canonical args share
+    one pool call, and its result, error or timeout reaches every one of them. With
+    `request` (a report of one payload), the response is conditional and compressed
+    and identical concurrent calls are always shared (see ReportResponses). The report
+    deadline starts here, so time spent queueing for the pool counts against it"""
+    from roma_engine.budgets import deadline
+    from roma_engine.web import FastJSONResponse, coalesced
+    try:
+        call = partial(get_pool().call, method, *args)
+        budgets, responses = get_runner().budgets, get_responses()
+        with deadline(None if budgets is None else budgets.deadline_s):
+            if request is not None:
+                # in process mode the reports are cached in the workers, so a 304 needs a run
+                return await responses.report(request, method, args[0], call, get_runner().cache)
+            result = await (coalesced(responses.flights, method, args, call) if coalesce else call())
+        # returned as a response so FastAPI skips jsonable_encoder; orjson renders it
+        return FastJSONResponse(result)
+    except (Overloaded, asyncio.TimeoutError) as e:
+        return _busy_response(e)
+    except Exception as e:
+        tb = traceback.format_exc()
+        return JSONResponse(
+            status_code=500,
+            content={
+                "error": str(e),
+                "trace_tail": tb[-1000:],
+            },
+        )
 
 class HealthEntry(BaseModel):
     meal_log: Optional[str] = Field(None, example="Rice and beans for lunch")
@@ -69,12 +212,24 @@ def health():
             "/version": "System info",
             "/analyze": "Analyze health entry (POST)",
             "/weekly-report": "Generate weekly report (POST)",
-            "/example": "Get example payload"
+            "/weekly-report/batch": "Generate weekly reports for many users (POST)",
+            "/weekly-report/weeks": "One report per ISO week of the logs, optional ?start=&end= (POST)",
+            "/weekly-report/stream": "Stream a report over NDJSON daily logs (POST)",
+            "/users/{user_id}/days": "Sync one day, get the updated report (POST)",
+            "/users/{user_id}/history": "Store profile/targets/days for a user (POST, needs HEALTH_STORE_PATH)",
+            "/users/{user_id}/weekly-report": "Report from stored history, optional ?start=&end=&trends= (GET)",
+            "/trends": "7/28/90-day rolling averages and week-over-week deltas (POST)",
+            "/example": "Get example payload",
+            "/cache/stats": "Report cache counters",
+            "/pool/stats": "Runner pool load and backpressure counters",
+            "/metrics": "Prometheus metrics (per-agent latency, calls, errors, input sizes)",
+            "/debug/profiles": "Recent profiled requests (needs HEALTH_PROFILE=1 or HEALTH_PROFILE_RATE)"
         }
     }
 
 @app.get("/version")
 def version():
+    configure_llm()
     return {
         "cwd": str(Path.cwd()),
         "repo_root": str(_root),
@@ -84,10 +239,53 @@ def version():
         "dummy_openai_key_set": bool(os.environ.get("OPENAI_API_KEY")),
     }
 
+@app.get("/cache/stats")
+def cache_stats():
+    """Report cache counters (enable with HEALTH_CACHE_SIZE / HEALTH_CACHE_TTL_S)"""
+    runner = get_runner()
+    if runner.cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **runner.cache.stats()}
+
+@app.get("/pool/stats")
+def pool_stats():
+    """Runner pool load: pending, completed, rejected (503) and timed out (504) calls,
+    plus requests coalesced onto an identical one in flight"""
+    flights = get_responses().flights
+    return {**get_pool().stats(), "coalescing": flights.stats() if flights is not None else {"enabled": False}}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text: per-agent latency/size histograms, call and error counts"""
+    runner = get_runner()
+    if runner.instrumentation is None:
+        return "# instrumentation disabled (HEALTH_METRICS=0)\n"
+    return runner.instrumentation.render()
+
+def _no_profiler() -> Optional[JSONResponse]:
+    """404 when profiling is not configured"""
+    if profiler is None:
+        return JSONResponse(status_code=404,
+                            content={"error": "profiling disabled (set HEALTH_PROFILE=1 or HEALTH_PROFILE_RATE)"})
+    return None
+
+@app.get("/debug/profiles")
+def list_profiles():
+    """Recent profiled requests, newest first: per-stage seconds and peak traced bytes"""
+    return _no_profiler() or {**profiler.stats(), "profiles": profiler.list()}
+
+@app.get("/debug/profiles/{profile_id}")
+def get_profile(profile_id: int):
+    """One profiled request with each stage's top functions by cumulative time"""
+    record = _no_profiler() or profiler.get(profile_id)
+    if record is None:
+        return JSONResponse(status_code=404, content={"error": f"profile {profile_id} not in the buffer"})
+    return record
+
 @app.get("/example")
-def example():
+def example(request: Request):
     """Ready-to-use example payload for /weekly-report"""
-    return {
+    return get_responses().static(request, {
         "user_profile": {
             "age": 28,
             "sex": "M",
@@ -135,24 +333,84 @@ def example():
                 "notes": "great day",
             }
         ],
-    }
+    })
 
-@app.post("/weekly-report")
-async def weekly_report(payload: Dict[str, Any] = Body(...)):
+# Report endpoints read the raw body (orjson when installed, no Dict model copy)
+async def _read_payload(request: Request, validate: Callable = validate_payload):
+    from roma_engine.web import read_json
+    return await read_json(request, lambda obj: validate(obj, check_lenient))
+
+_OBJECT_BODY = {"requestBody": {"required": True, "content": {"application/json": {"schema": {"type": "object"}}}}}
+_ARRAY_BODY = {"requestBody": {"required": True, "content": {"application/json": {
+    "schema": {"type": "array", "items": {"type": "object"}}}}}}
+
+@app.post("/weekly-report", openapi_extra=_OBJECT_BODY)
+async def weekly_report(request: Request):
     """Generate weekly health report using local agents"""
-    try:
-        # Use your local HealthRunner
-        result = runner.run(payload)
-        return result
-    except Exception as e:
-        tb = traceback.format_exc()
-        return JSONResponse(
-            status_code=500,
-            content={
-                "error": str(e),
-                "trace_tail": tb[-1000:],
-            },
-        )
+    # Use your local HealthRunner (on the runner pool, off the event loop)
+    payload = await _read_payload(request)
+    return await _offload("run", payload, request=request)
+
+@app.post("/weekly-report/batch", openapi_extra=_ARRAY_BODY)
+async def weekly_report_batch(request: Request):
+    """Generate weekly reports for many users in one batched runner pass"""
+    payloads = await _read_payload(request, validate_batch)
+    return await _offload("run_batch", payloads)
+
+@app.post("/weekly-report/weeks", openapi_extra=_OBJECT_BODY)
+async def weekly_report_weeks(request: Request, start: Optional[str] = None, end: Optional[str] = None):
+    """One report per ISO week of the submitted logs; start/end are inclusive ISO dates (422 otherwise)"""
+    validate_dates(start=start, end=end)
+    payload = await _read_payload(request)
+    return await _offload("run_weeks", payload, start, end, coalesce=True)
+
+@app.post("/weekly-report/stream")
+async def weekly_report_stream(request: Request):
+    """NDJSON in (profile/targets line, then one daily log per line), NDJSON out
+    (one day line per log as it is produced, the summary line last)"""
+    from roma_engine.web import ndjson_report_response
+    return ndjson_report_response(get_runner(), request)
+
+class DayUpdate(BaseModel):
+    day: Dict[str, Any]
+    user_profile: Optional[Dict[str, Any]] = None
+    targets: Optional[Dict[str, Any]] = None
+
+@app.post("/users/{user_id}/days")
+async def upsert_day(user_id: str, update: DayUpdate):
+    """Absorb one new or corrected day and return the updated report"""
+    return await _offload("upsert_day", user_id, update.day, update.user_profile, update.targets)
+
+class HistoryUpdate(BaseModel):
+    user_profile: Optional[Dict[str, Any]] = None
+    targets: Optional[Dict[str, Any]] = None
+    daily_logs: List[Dict[str, Any]] = []
+
+def _no_store() -> Optional[JSONResponse]:
+    """501 when the history store is not configured"""
+    if get_runner().store is None:
+        return JSONResponse(status_code=501, content={"error": "history store disabled (set HEALTH_STORE_PATH)"})
+    return None
+
+@app.post("/users/{user_id}/history")
+async def save_history(user_id: str, update: HistoryUpdate):
+    """Store a delta (profile, targets, new or corrected days) for a user"""
+    return _no_store() or await _offload("save_history", user_id, update.user_profile, update.targets,
+                                         update.daily_logs)
+
+@app.get("/users/{user_id}/weekly-report")
+async def history_report(user_id: str, start: Optional[str] = None, end: Optional[str] = None,
+                         trends: bool = False):
+    """Report from the user's stored history, optionally limited to start..end (inclusive)"""
+    validate_dates(start=start, end=end)
+    return _no_store() or await _offload("report_history", user_id, start, end, trends)
+
+@app.post("/trends", openapi_extra=_OBJECT_BODY)
+async def trends(request: Request):
+    """Rolling 7/28/90-day averages and week-over-week deltas; send "include_trends": true
+    to /weekly-report to get the same section in the report"""
+    payload = await _read_payload(request)
+    return await _offload("trends", payload, coalesce=True)
 
 @app.post("/analyze", response_model=AnalysisOut)
 async def analyze_entry(entry: HealthEntry = Body(...)):
@@ -207,7 +465,7 @@ async def analyze_entry(entry: HealthEntry = Body(...)):
     }
     
     try:
-        result = runner.run(payload)
+        result = await get_pool().call("run", payload)
         
         # Create a simplified analysis
         analysis = {
@@ -222,6 +480,8 @@ async def analyze_entry(entry: HealthEntry = Body(...)):
         }
         
         return {"analysis": analysis}
+    except (Overloaded, asyncio.TimeoutError) as e:
+        return _busy_response(e)
     except Exception as e:
         return {"analysis": {"error": str(e), "status": "error"}}
 
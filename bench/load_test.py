@@ -0,0 +1,351 @@
+"""Load test the HTTP service on this machine.
+
+    python -m bench.load_test                                # app:app, 1 worker, 16 clients for 20 s
+    python -m bench.load_test --app api:app --workers 4 --concurrency 64
+    python -m bench.load_test --rate 200 --env HEALTH_EXEC_WORKERS=8 --env HEALTH_EXEC_MODE=process
+    python -m bench.load_test --url http://127.0.0.1:8000    # an already running server
+    python -m bench.load_test --compare bench/results/OLD.json bench/results/NEW.json
+
+Starts uvicorn in a subprocess on a free port (with --workers and any
+--env overrides), waits until it answers, then drives /weekly-report and
+/analyze with deterministic synthetic payloads (bench/synthetic.py).
+
+Closed loop by default: --concurrency clients, each sending its next
+request as soon as the previous one returns. With --rate the load is open
+loop: requests start on a fixed schedule over at most --concurrency
+connections, and latency is measured from the scheduled start, so queueing
+behind a slow server is counted rather than hidden.
+
+Per endpoint: p50/p95/p99 latency of successful responses, throughput
+(successful responses/s) and error rate (non-2xx, timeouts, connection
+errors). The first --warmup seconds are not counted. Results go to
+bench/results/load-<timestamp>.json together with the server settings, so
+runs with different worker counts or runner concurrency can be compared.
+The client is a small keep-alive HTTP/1.1 client on asyncio (no extra
+dependencies); it shares the machine with the server, so leave it a core.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from bench.run_bench import RESULTS_DIR, ROOT, _git_rev
+from bench.synthetic import make_entry, make_payload
+
+# endpoint name -> path; bodies come from make_bodies
+ENDPOINTS = {"weekly-report": "/weekly-report", "analyze": "/analyze"}
+# api.py has no /analyze
+DEFAULT_MIX = {"app:app": "weekly-report=1,analyze=1", "api:app": "weekly-report=1"}
+
+Sample = Tuple[str, float, float, int]  # (endpoint, start offset s, latency s, status; 0 = no response)
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection; reconnects after errors or `Connection: close`."""
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def post(self, path: str, body: bytes) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip().lower()
+        if headers.get("transfer-encoding") == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            await self.reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection") == "close":
+            self.close()
+        return status
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ENDPOINTS:
+            raise SystemExit(f"unknown endpoint {name.strip()!r} (choose from {', '.join(ENDPOINTS)})")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def make_bodies(users: int, days: int, seed: int) -> Dict[str, List[bytes]]:
+    """`users` distinct request bodies per endpoint (fewer users, more cache/coalescing hits)."""
+    return {
+        "weekly-report": [json.dumps(make_payload(seed * 1_000_003 + i, days)).encode() for i in range(users)],
+        "analyze": [json.dumps(make_entry(seed * 1_000_003 + i)).encode() for i in range(users)],
+    }
+
+class LoadGenerator:
+    def __init__(self, url: str, mix: Dict[str, float], bodies: Dict[str, List[bytes]], timeout: float, seed: int):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 80
+        self.names = list(mix)
+        self.weights = [mix[n] for n in self.names]
+        self.bodies = bodies
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.sent = {n: 0 for n in self.names}
+        self.samples: List[Sample] = []
+        self.t0 = 0.0
+
+    def next_request(self) -> Tuple[str, bytes]:
+        name = self.rng.choices(self.names, self.weights)[0]
+        bodies = self.bodies[name]
+        body = bodies[self.sent[name] % len(bodies)]
+        self.sent[name] += 1
+        return name, body
+
+    async def send(self, conn: Connection, name: str, body: bytes, start: float) -> None:
+        try:
+            status = await asyncio.wait_for(conn.post(ENDPOINTS[name], body), self.timeout)
+        except (OSError, EOFError, ValueError, IndexError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            conn.close()
+            status = 0
+        self.samples.append((name, start - self.t0, time.perf_counter() - start, status))
+
+    async def closed_loop(self, concurrency: int, duration: float) -> None:
+        self.t0 = time.perf_counter()
+        end = self.t0 + duration
+
+        async def client() -> None:
+            conn = Connection(self.host, self.port)
+            try:
+                while time.perf_counter() < end:
+                    name, body = self.next_request()
+                    await self.send(conn, name, body, time.perf_counter())
+            finally:
+                conn.close()
+
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+
+    async def open_loop(self, rate: float, concurrency: int, duration: float) -> None:
+        idle: "asyncio.Queue[Connection]" = asyncio.Queue()
+        for _ in range(concurrency):
+            idle.put_nowait(Connection(self.host, self.port))
+
+        async def one(name: str, body: bytes, scheduled: float) -> None:
+            conn = await idle.get()
+            try:
+                await self.send(conn, name, body, scheduled)
+            finally:
+                idle.put_nowait(conn)
+
+        loop = asyncio.get_running_loop()
+        tasks = []
+        self.t0 = time.perf_counter()
+        for i in range(int(rate * duration)):
+            scheduled = self.t0 + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(loop.create_task(one(*self.next_request(), scheduled)))
+        await asyncio.gather(*tasks)
+        while not idle.empty():
+            idle.get_nowait().close()
+
+def percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+def summarize(endpoint: str, samples: List[Sample], window: float) -> Dict[str, Any]:
+    ok = sorted(lat for _, _, lat, status in samples if 200 <= status < 300)
+    errors = len(samples) - len(ok)
+    statuses: Dict[str, int] = {}
+    for _, _, _, status in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "endpoint": endpoint,
+        "requests": len(samples),
+        "errors": errors,
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "statuses": statuses,
+        "throughput_per_s": len(ok) / window if window > 0 else 0.0,
+        "mean_s": statistics.fmean(ok) if ok else None,
+        "p50_s": percentile(ok, 0.50),
+        "p95_s": percentile(ok, 0.95),
+        "p99_s": percentile(ok, 0.99),
+        "max_s": ok[-1] if ok else None,
+    }
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_ready(url: str, proc: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"server exited with code {proc.returncode} before answering")
+        try:
+            with urllib.request.urlopen(url + "/", timeout=1):
+                return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.1)
+    raise SystemExit(f"server did not answer within {timeout:.0f} s")
+
+@contextmanager
+def serve(app: str, workers: int, env: Dict[str, str], ready_timeout: float) -> Iterator[str]:
+    """Run `uvicorn app` on a free local port for the duration of the block; yields its URL."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT, env={**os.environ, **env})
+    try:
+        _wait_ready(url, proc, ready_timeout)
+        yield url
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+def run(args: argparse.Namespace, url: str, mix: Dict[str, float], env: Dict[str, str]) -> Dict[str, Any]:
+    gen = LoadGenerator(url, mix, make_bodies(args.users, args.days, args.seed), args.timeout, args.seed)
+    if args.rate:
+        asyncio.run(gen.open_loop(args.rate, args.concurrency, args.warmup + args.duration))
+    else:
+        asyncio.run(gen.closed_loop(args.concurrency, args.warmup + args.duration))
+    measured = [s for s in gen.samples if s[1] >= args.warmup]
+    results = [summarize(name, [s for s in measured if s[0] == name], args.duration) for name in mix]
+    if len(mix) > 1:
+        results.append(summarize("all", measured, args.duration))
+    return {
+        "meta": {
+            "app": None if args.url else args.app,
+            "url": args.url,
+            "workers": None if args.url else args.workers,
+            # server settings: --env overrides plus HEALTH_* inherited from this shell
+            "env": {k: v for k, v in {**os.environ, **env}.items() if k.startswith("HEALTH_") or k in env},
+            "mode": "open" if args.rate else "closed",
+            "concurrency": args.concurrency,
+            "rate_per_s": args.rate,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "mix": mix,
+            "users": args.users,
+            "days": args.days,
+            "seed": args.seed,
+            "cpu_count": os.cpu_count(),
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+def _ms(v: Optional[float]) -> str:
+    return f"{v*1e3:9.1f}" if v is not None else f"{'-':>9}"
+
+def print_results(report: Dict[str, Any]) -> None:
+    print(f"{'endpoint':<14} {'requests':>8} {'ok/s':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}",
+          file=sys.stderr)
+    for r in report["results"]:
+        print(f"{r['endpoint']:<14} {r['requests']:8d} {r['throughput_per_s']:9.1f} {r['error_rate']:7.1%} "
+              f"{_ms(r['p50_s'])} {_ms(r['p95_s'])} {_ms(r['p99_s'])}", file=sys.stderr)
+
+def _settings(meta: Dict[str, Any]) -> str:
+    env = " ".join(f"{k}={v}" for k, v in sorted(meta["env"].items()))
+    load = f"rate {meta['rate_per_s']}/s" if meta["mode"] == "open" else f"concurrency {meta['concurrency']}"
+    return f"{meta['app'] or meta['url']} workers={meta['workers']} {load} {env}".rstrip()
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> None:
+    """Print both runs' settings and their per-endpoint numbers side by side."""
+    print(f"old: {_settings(old['meta'])}\nnew: {_settings(new['meta'])}")
+    before = {r["endpoint"]: r for r in old["results"]}
+    print(f"{'endpoint':<14} {'metric':<10} {'old':>10} {'new':>10} {'ratio':>7}")
+    for r in new["results"]:
+        o = before.get(r["endpoint"])
+        if o is None:
+            continue
+        for key, label, scale in (("throughput_per_s", "ok/s", 1), ("error_rate", "errors %", 100),
+                                  ("p50_s", "p50 ms", 1e3), ("p95_s", "p95 ms", 1e3), ("p99_s", "p99 ms", 1e3)):
+            a, b = o[key], r[key]
+            if a is None or b is None:
+                continue
+            ratio = f"{b / a:7.2f}" if a else f"{'-':>7}"
+            print(f"{r['endpoint']:<14} {label:<10} {a*scale:10.2f} {b*scale:10.2f} {ratio}")
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--app", choices=sorted(DEFAULT_MIX), default="app:app", help="server module to start")
+    ap.add_argument("--url", help="load an already running server instead of starting one")
+    ap.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                    help="server environment override, e.g. HEALTH_EXEC_WORKERS=8 (repeatable)")
+    ap.add_argument("--concurrency", type=int, default=16, help="clients (closed loop) or connections (open loop)")
+    ap.add_argument("--rate", type=float, help="requests/s on a fixed schedule (open loop)")
+    ap.add_argument("--duration", type=float, default=20.0, help="measured seconds")
+    ap.add_argument("--warmup", type=float, default=3.0, help="seconds of load before measuring")
+    ap.add_argument("--mix", help="endpoint weights, e.g. weekly-report=3,analyze=1 "
+                                  "(default both for app:app, weekly-report for api:app)")
+    ap.add_argument("--users", type=int, default=200, help="distinct payloads per endpoint")
+    ap.add_argument("--days", type=int, default=7, help="daily logs per /weekly-report payload")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--timeout", type=float, default=30.0, help="per-request timeout, counted as an error")
+    ap.add_argument("--ready-timeout", type=float, default=60.0, help="seconds to wait for the server to start")
+    ap.add_argument("--out", type=Path, help="result file (default bench/results/load-<timestamp>.json)")
+    ap.add_argument("--compare", nargs=2, type=Path, metavar=("OLD", "NEW"))
+    args = ap.parse_args(argv)
+
+    if args.compare:
+        old, new = (json.loads(p.read_text()) for p in args.compare)
+        compare(old, new)
+        return 0
+
+    env = dict(kv.split("=", 1) for kv in args.env)
+    mix = parse_mix(args.mix or DEFAULT_MIX[args.app])
+    if args.url:
+        report = run(args, args.url.rstrip("/"), mix, env)
+    else:
+        with serve(args.app, args.workers, env, args.ready_timeout) as url:
+            report = run(args, url, mix, env)
+    print_results(report)
+    out = args.out or RESULTS_DIR / f"load-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(out)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,341 @@
+"""Benchmark suite for the agents and HealthRunner.
+
+    python -m bench.run_bench                        # quick scale -> bench/results/<stamp>.json
+    python -m bench.run_bench --scale full           # 7 days .. 5 years, 1 .. 100k users
+    python -m bench.run_bench --only agent.metrics   # name prefix filter
+    python -m bench.run_bench --compare old.json new.json [--threshold 1.10]
+    python -m bench.run_bench --check-startup        # import-time budget gate, exit 1 if over
+
+Every result records latency (mean/p50/p95), throughput and the
+tracemalloc peak of one extra, untimed call. `--compare` matches results
+by name and parameters, prints the ratios and exits 1 when any mean
+slowed down by more than the threshold.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from bench.synthetic import make_payload, make_payloads
+from roma_engine.memo import NodeMemo
+from roma_engine.runner import HealthRunner
+
+SCALES = {
+    "quick": {"days": (7, 90, 365), "users": (1, 100, 1000),
+              "density": (0.5,), "missing": (0.1,), "min_time": 0.2},
+    "full": {"days": (7, 28, 90, 365, 1825), "users": (1, 100, 10_000, 100_000),
+             "density": (0.0, 0.5, 2.0), "missing": (0.0, 0.1, 0.5), "min_time": 1.0},
+}
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "bench" / "results"
+
+# Cold-import budget (ms) for each server module: its own body plus this repo's
+# packages (and dotenv) it pulls in eagerly; framework and stdlib imports excluded.
+# Gated on the median of STARTUP_RUNS imports. Most of app's own time is FastAPI
+# building its routes (~17-21 ms median, single imports up to ~27 ms on a busy box)
+STARTUP_BUDGET_MS = {"app": 35.0, "api": 60.0}
+STARTUP_RUNS = 9
+OWN_PACKAGES = {"roma_engine", "roma_agents", "dotenv"}
+# Must not be loaded by a bare `import app` (lazy startup)
+LAZY_IN_APP = ("roma_agents", "roma_engine.runner", "roma_engine.web", "roma_engine.singleflight",
+               "roma_engine.budgets", "roma_engine.profiling", "dotenv", "multiprocessing")
+
+def measure(fn: Callable[[], Any], min_time: float, min_calls: int = 5, max_calls: int = 100_000) -> List[float]:
+    """Per-call latencies; calls `fn` until both `min_time` and `min_calls` are reached."""
+    lat: List[float] = []
+    start = time.perf_counter()
+    while len(lat) < max_calls and (len(lat) < min_calls or time.perf_counter() - start < min_time):
+        t0 = time.perf_counter()
+        fn()
+        lat.append(time.perf_counter() - t0)
+    return lat
+
+def peak_memory(fn: Callable[[], Any]) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def record(name: str, params: Dict[str, Any], lat: List[float], items_per_call: int, unit: str,
+           peak: int) -> Dict[str, Any]:
+    lat_sorted = sorted(lat)
+    mean = statistics.fmean(lat)
+    return {
+        "name": name,
+        "params": params,
+        "calls": len(lat),
+        "mean_s": mean,
+        "p50_s": lat_sorted[len(lat) // 2],
+        "p95_s": lat_sorted[min(len(lat) - 1, int(len(lat) * 0.95))],
+        "throughput_per_s": items_per_call / mean if mean else None,
+        "unit": unit,
+        "peak_mem_bytes": peak,
+    }
+
+def bench_agents(scale: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Each agent alone, fed the outputs of the stages before it."""
+    runner = HealthRunner()
+    ag = runner.agents
+    out = []
+    for days in scale["days"]:
+        for density in scale["density"]:
+            for missing in scale["missing"]:
+                payload = make_payload(1, days, density, missing)
+                ing = ag["ingest"].run(payload)
+                agg = ag["aggregates"].run(ing)
+                met_in = {"normalized_profile": ing["normalized_profile"],
+                          "normalized_targets": ing["normalized_targets"], "log_aggregates": agg["log_aggregates"]}
+                met = ag["metrics"].run(met_in)
+                coach_in = {"normalized_logs": ing["normalized_logs"],
+                            "normalized_targets": ing["normalized_targets"], "metrics": met["metrics"]}
+                coach = ag["coach"].run(coach_in)
+                rep_in = {"metrics": met["metrics"], "weekly_focus": coach["weekly_focus"]}
+                params = {"days": days, "workout_density": density, "missing_rate": missing}
+                for name, fn in (
+                    ("ingest", lambda: ag["ingest"].run(payload)),
+                    ("aggregates", lambda: ag["aggregates"].run(ing)),
+                    ("metrics", lambda: ag["metrics"].run(met_in)),
+                    ("coach", lambda: ag["coach"].run(coach_in)),
+                    ("report", lambda: ag["report"].run(rep_in)),
+                    ("trends", lambda: ag["trends"].run({"normalized_logs": ing["normalized_logs"]})),
+                ):
+                    lat = measure(fn, scale["min_time"])
+                    out.append(record(f"agent.{name}", params, lat, days, "days", peak_memory(fn)))
+    return out
+
+def bench_end_to_end(scale: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """HealthRunner.run on one user with growing history; with a NodeMemo, a
+    targets-only change per call (aggregates and parsed logs are reused)."""
+    runner = HealthRunner()
+    memo_runner = HealthRunner(memo=NodeMemo(64))
+    out = []
+    for days in scale["days"]:
+        payload = make_payload(2, days)
+        fn = lambda: runner.run(payload)
+        lat = measure(fn, scale["min_time"])
+        out.append(record("runner.run", {"days": days}, lat, days, "days", peak_memory(fn)))
+        steps = itertools.count(8000)
+        fn = lambda: memo_runner.run({**payload, "targets": {**payload["targets"], "steps": next(steps)}})
+        lat = measure(fn, scale["min_time"])
+        out.append(record("runner.run_memo_targets_only", {"days": days}, lat, days, "days", peak_memory(fn)))
+    return out
+
+def bench_users(scale: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Many 7-day users: one run() per user vs a single run_batch()."""
+    runner = HealthRunner()
+    out = []
+    for n in scale["users"]:
+        payloads = make_payloads(n, days=7, seed=3)
+        for name, fn in (
+            ("runner.run_loop", lambda: [runner.run(p) for p in payloads]),
+            ("runner.run_batch", lambda: runner.run_batch(payloads)),
+        ):
+            lat = measure(fn, scale["min_time"], min_calls=1 if n >= 10_000 else 3)
+            out.append(record(name, {"users": n, "days": 7}, lat, n, "users", peak_memory(fn)))
+    return out
+
+def bench_request_path(scale: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """/weekly-report body bytes -> response bytes, minus HTTP: pydantic model,
+    .dict() and jsonable_encoder (the old path) vs the schema check and
+    FastJSONResponse."""
+    from fastapi.encoders import jsonable_encoder
+    from starlette.responses import JSONResponse
+    from api import Payload
+    from roma_engine.schema import validate_payload
+    from roma_engine.jsonio import loads
+    from roma_engine.web import FastJSONResponse
+
+    runner = HealthRunner()
+    out = []
+    for days in scale["days"]:
+        body = json.dumps(make_payload(4, days)).encode()
+        for name, fn in (
+            ("request.pydantic", lambda: JSONResponse(jsonable_encoder(
+                runner.run(Payload.model_validate(json.loads(body)).model_dump()))).body),
+            ("request.fast", lambda: FastJSONResponse(runner.run(validate_payload(loads(body)))).body),
+        ):
+            lat = measure(fn, scale["min_time"])
+            out.append(record(name, {"days": days}, lat, days, "days", peak_memory(fn)))
+    return out
+
+def _load_dayfile(path: str, metrics: Any) -> int:
+    from roma_engine.dayfile import DayFile
+    with DayFile(path) as f:
+        return len(metrics.run_batch(f[:]))  # the mapped users are dropped before the file closes
+
+def bench_load(scale: Dict[str, Any], users: int = 100) -> List[Dict[str, Any]]:
+    """Metrics for `users` users read from storage: JSONL parse + ingest vs a mapped DayFile
+    (opened per call); both include MetricsAgent over what was read."""
+    import tempfile
+    from roma_engine.dayfile import write_dayfile
+    from roma_engine.jsonio import loads
+    agents = HealthRunner().agents
+    ingest, metrics = agents["ingest"], agents["metrics"]
+    out = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for days in scale["days"]:
+            payloads = make_payloads(users, days, seed=5)
+            lines = [json.dumps(p).encode() for p in payloads]
+            path = os.path.join(tmp, f"{days}.rhd")
+            write_dayfile(path, payloads)
+            for name, fn in (
+                ("load.json", lambda: len(metrics.run_batch([ingest.run(loads(line)) for line in lines]))),
+                ("load.dayfile", lambda: _load_dayfile(path, metrics)),
+            ):
+                lat = measure(fn, scale["min_time"])
+                out.append(record(name, {"users": users, "days": days}, lat, users * days, "days",
+                                  peak_memory(fn)))
+    return out
+
+def import_profile(module: str) -> Dict[str, Any]:
+    """One cold `python -X importtime -c "import <module>"` in a fresh interpreter.
+
+    Returns the module's total cumulative milliseconds, its `own_ms` (self
+    time plus directly imported repo packages) and the names of all modules
+    imported.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    total, own, names = 0.0, 0.0, []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cum, name = line[len("import time:"):].split("|")
+        if not cum.strip().isdigit():
+            continue  # header
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        names.append(name)
+        if name == module:
+            total = int(cum) / 1000
+            own += int(self_us) / 1000
+        elif depth == 1 and name.split(".")[0] in OWN_PACKAGES:
+            own += int(cum) / 1000
+    return {"total_ms": total, "own_ms": own, "modules": names}
+
+def bench_startup(scale: Dict[str, Any], runs: int = STARTUP_RUNS) -> List[Dict[str, Any]]:
+    """Cold import cost of the server modules attributable to this repo."""
+    out = []
+    for module, budget in STARTUP_BUDGET_MS.items():
+        profiles = [import_profile(module) for _ in range(runs)]
+        r = record("startup.import", {"module": module}, [p["own_ms"] / 1000 for p in profiles], 1, "imports", 0)
+        r["budget_ms"] = float(os.getenv("HEALTH_IMPORT_BUDGET_MS", budget))
+        r["total_ms"] = statistics.median(p["total_ms"] for p in profiles)
+        if module == "app":
+            r["eager_modules"] = sorted({m for m in profiles[0]["modules"] for lazy in LAZY_IN_APP
+                                         if m == lazy or m.startswith(lazy + ".")})
+        out.append(r)
+    return out
+
+def check_startup(results: List[Dict[str, Any]]) -> int:
+    """Number of startup budget violations (over budget, or lazy modules loaded eagerly)."""
+    failures = 0
+    for r in results:
+        if r["name"] != "startup.import":
+            continue
+        over = r["p50_s"] * 1000 > r["budget_ms"]
+        eager = r.get("eager_modules")
+        failures += over + bool(eager)
+        print(f"import {r['params']['module']:<4} own {r['p50_s']*1000:7.1f} ms (budget {r['budget_ms']:.0f} ms, "
+              f"total with framework {r['total_ms']:.0f} ms){'  OVER BUDGET' if over else ''}"
+              f"{'  eager: ' + ', '.join(eager) if eager else ''}")
+    return failures
+
+# (benchmark names a suite produces, suite)
+SUITES = [
+    (("agent.ingest", "agent.metrics", "agent.coach", "agent.report", "agent.trends"), bench_agents),
+    (("runner.run",), bench_end_to_end),
+    (("runner.run_loop", "runner.run_batch"), bench_users),
+    (("request.pydantic", "request.fast"), bench_request_path),
+    (("load.json", "load.dayfile"), bench_load),
+    (("startup.import",), bench_startup),
+]
+
+def _git_rev() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(scale_name: str, only: Optional[str] = None) -> Dict[str, Any]:
+    scale = SCALES[scale_name]
+    results = []
+    for names, suite in SUITES:
+        if only and not any(n.startswith(only) for n in names):
+            continue
+        for r in suite(scale):
+            if not only or r["name"].startswith(only):
+                results.append(r)
+                print(f"{r['name']:<20} {json.dumps(r['params']):<60} "
+                      f"p50 {r['p50_s']*1e3:9.3f} ms  {r['throughput_per_s']:12.0f} {r['unit']}/s  "
+                      f"peak {r['peak_mem_bytes']/1024:9.0f} KiB", file=sys.stderr)
+    return {
+        "meta": {
+            "scale": scale_name,
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+def _key(r: Dict[str, Any]) -> str:
+    return r["name"] + " " + json.dumps(r["params"], sort_keys=True)
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], threshold: float) -> int:
+    """Print new/old mean ratios; returns the number of regressions over `threshold`."""
+    before = {_key(r): r for r in old["results"]}
+    regressions = 0
+    print(f"{'benchmark':<80} {'old ms':>10} {'new ms':>10} {'ratio':>7}")
+    for r in new["results"]:
+        o = before.get(_key(r))
+        if o is None:
+            continue
+        ratio = r["mean_s"] / o["mean_s"] if o["mean_s"] else float("inf")
+        flag = "  REGRESSION" if ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{_key(r):<80} {o['mean_s']*1e3:10.3f} {r['mean_s']*1e3:10.3f} {ratio:7.2f}{flag}")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scale", choices=sorted(SCALES), default="quick")
+    ap.add_argument("--only", help="run only benchmarks whose name starts with this")
+    ap.add_argument("--out", type=Path, help="result file (default bench/results/<timestamp>.json)")
+    ap.add_argument("--compare", nargs=2, type=Path, metavar=("OLD", "NEW"))
+    ap.add_argument("--threshold", type=float, default=1.10, help="new/old mean ratio counted as a regression")
+    ap.add_argument("--check-startup", action="store_true",
+                    help="only run the import-time budget check; exit 1 when it fails")
+    args = ap.parse_args(argv)
+
+    if args.check_startup:
+        return 1 if check_startup(bench_startup(SCALES[args.scale])) else 0
+
+    if args.compare:
+        old, new = (json.loads(p.read_text()) for p in args.compare)
+        return 1 if compare(old, new, args.threshold) else 0
+
+    report = run(args.scale, args.only)
+    out = args.out or RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{args.scale}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(out)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
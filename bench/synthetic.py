@@ -0,0 +1,80 @@
+"""Deterministic synthetic payloads for benchmarks and load tests.
+
+Same arguments, same payloads: every generator takes an explicit seed and
+uses its own `random.Random`, so runs on different machines (or commits)
+measure identical inputs.
+"""
+import random
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+WORKOUT_TYPES = ("push", "pull", "legs", "cardio", "yoga", "walk")
+GOALS = ("fat loss", "maintain", "muscle gain", "endurance")
+
+def make_profile(rng: random.Random, missing_rate: float = 0.0) -> Dict[str, Any]:
+    prof = {
+        "age": rng.randint(18, 75),
+        "sex": rng.choice(("M", "F")),
+        "height_cm": rng.randint(150, 200),
+        "weight_kg": round(rng.uniform(48, 120), 1),
+        "goal": rng.choice(GOALS),
+        "constraints": rng.choice(("", "knee pain on runs", "night shifts")),
+    }
+    return {k: (None if rng.random() < missing_rate else v) for k, v in prof.items()}
+
+def make_targets(rng: random.Random) -> Dict[str, Any]:
+    return {
+        "sleep_h": rng.choice((7, 7.5, 8)),
+        "steps": rng.choice((6000, 8000, 9000, 10000)),
+        "workouts_per_week": rng.randint(2, 5),
+        "calories_in": rng.choice((1800, 2000, 2200, 2400, 2600)),
+        "water_liters": rng.choice((2, 2.5, 3)),
+    }
+
+def make_logs(rng: random.Random, days: int, workout_density: float = 0.5,
+              missing_rate: float = 0.1, start: date = date(2024, 1, 1)) -> List[Dict[str, Any]]:
+    """`workout_density` is the mean number of workouts per day."""
+    def maybe(v):
+        return None if rng.random() < missing_rate else v
+
+    logs = []
+    for i in range(days):
+        n_workouts = int(workout_density) + (rng.random() < workout_density % 1)
+        logs.append({
+            "date": (start + timedelta(days=i)).isoformat(),
+            "sleep_hours": maybe(round(rng.gauss(7.1, 0.9), 1)),
+            "steps": maybe(max(0, int(rng.gauss(8000, 2500)))),
+            "workouts": [
+                {"type": rng.choice(WORKOUT_TYPES), "minutes": rng.randint(10, 75), "intensity_1_5": rng.randint(1, 5)}
+                for _ in range(n_workouts)
+            ],
+            "calories_in": maybe(int(rng.gauss(2300, 350))),
+            "water_liters": maybe(round(rng.uniform(0.8, 3.8), 2)),
+            "mood_1_5": maybe(rng.randint(1, 5)),
+            "notes": rng.choice(("", "desk day", "travel", "light walk", "great day")),
+        })
+    return logs
+
+def make_payload(seed: int, days: int = 7, workout_density: float = 0.5,
+                 missing_rate: float = 0.1, start: Optional[date] = None) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    return {
+        "user_profile": make_profile(rng),
+        "targets": make_targets(rng),
+        "daily_logs": make_logs(rng, days, workout_density, missing_rate, start or date(2024, 1, 1)),
+    }
+
+def make_payloads(n_users: int, days: int = 7, workout_density: float = 0.5,
+                  missing_rate: float = 0.1, seed: int = 0) -> List[Dict[str, Any]]:
+    return [make_payload(seed * 1_000_003 + i, days, workout_density, missing_rate) for i in range(n_users)]
+
+def make_entry(seed: int) -> Dict[str, Any]:
+    """One free-text entry for app.py's /analyze."""
+    rng = random.Random(seed)
+    return {
+        "meal_log": rng.choice(("Rice and beans for lunch", "Oats and fruit", "Pasta", None)),
+        "exercise_log": rng.choice(("20 min walk", "45 min push day", None)),
+        "sleep_log": rng.choice(("6h", "7.5h", "8h", None)),
+        "mood_log": rng.choice(("tired", "ok", "good", "great", None)),
+        "water_intake_l": rng.choice((1.5, 2.0, 2.5, None)),
+    }
@@ -1,36 +1,73 @@
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
+from roma_agents.columns import as_columns
+from roma_agents.rules import WEAKEST, Rule, compile_rules
+
+# Default coaching table. Comparator rules fire per day against the user's
+# targets; "weakest" rules pick the weekly focus from the lowest adherence.
+RULES = [
+    Rule("sleep_hours", "<", "sleep_h", "Go to bed 20 min earlier tonight", 1),
+    Rule("steps", "<", "steps", "Add a 10-minute brisk walk", 2),
+    Rule("water_liters", "<", "water_liters", "Drink 1 glass after each bathroom break", 3),
+    Rule("calories_in", ">", "calories_in", "Swap one snack for fruit or yogurt", 4),
+    Rule("sleep", WEAKEST, None, "Sleep: add 15–20 minutes per night"),
+    Rule("steps", WEAKEST, None, "Movement: one short walk daily"),
+    Rule("calories_in", WEAKEST, None, "Food: one lighter swap per day"),
+    Rule("water", WEAKEST, None, "Hydration: 1 extra glass per meal"),
+    Rule("workouts", WEAKEST, None, "Training: schedule 1 short session"),
+]
+
+# Days still given tips when a report is out of time (see `degrade`)
+DEGRADED_DAYS = 7
 
 class CoachAgent:
     name = "coach"
+    inputs = ("normalized_logs", "normalized_targets", "metrics")
+    outputs = ("daily_suggestions", "weekly_focus")
+
+    def __init__(self, rules: Optional[List[Rule]] = None):
+        # compiled once; pass a site-specific table to replace the defaults
+        self.rules = compile_rules(RULES if rules is None else rules)
 
     def run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        logs = payload["normalized_logs"]
-        targets = payload["normalized_targets"]
-        m = payload["metrics"]
-
-        adh = m["adherence"]
-        pairs = [(k, (v if v is not None else -1)) for k, v in adh.items()]
-        pairs.sort(key=lambda x: x[1])
-        weakest = pairs[0][0] if pairs else None
-
-        daily = []
-        for day in logs:
-            tips = []
-            if day.get("sleep_hours") is not None and targets.get("sleep_h") and day["sleep_hours"] < targets["sleep_h"]:
-                tips.append("Go to bed 20 min earlier tonight")
-            if day.get("steps") is not None and targets.get("steps") and day["steps"] < targets["steps"]:
-                tips.append("Add a 10-minute brisk walk")
-            if day.get("water_liters") is not None and targets.get("water_liters") and day["water_liters"] < targets["water_liters"]:
-                tips.append("Drink 1 glass after each bathroom break")
-            if day.get("calories_in") is not None and targets.get("calories_in") and day["calories_in"] > targets["calories_in"]:
-                tips.append("Swap one snack for fruit or yogurt")
-            daily.append({"date": day["date"], "tips": tips[:3]})
-
-        focus = []
-        if weakest == "sleep": focus.append("Sleep: add 15–20 minutes per night")
-        if weakest == "steps": focus.append("Movement: one short walk daily")
-        if weakest == "calories_in": focus.append("Food: one lighter swap per day")
-        if weakest == "water": focus.append("Hydration: 1 extra glass per meal")
-        if weakest == "workouts": focus.append("Training: schedule 1 short session")
-
-        return {"status": "ok", "daily_suggestions": daily, "weekly_focus": focus[:2]}
+        logs = as_columns(payload["normalized_logs"])
+        tips = self.rules.evaluate(logs, payload["normalized_targets"], limit=3)
+        daily = [{"date": d, "tips": t} for d, t in zip(logs.dates, tips)]
+        return {"status": "ok", "daily_suggestions": daily, "weekly_focus": self.focus(payload["metrics"]["adherence"])}
+
+    def run_batch(self, payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Same as `run` for many users at once; each rule is one pass over every user's days."""
+        cols = [as_columns(p["normalized_logs"]) for p in payloads]
+        tips = self.rules.evaluate_batch(cols, [p["normalized_targets"] for p in payloads], limit=3)
+        return [
+            {
+                "status": "ok",
+                "daily_suggestions": [{"date": d, "tips": t} for d, t in zip(c.dates, user_tips)],
+                "weekly_focus": self.focus(p["metrics"]["adherence"]),
+            }
+            for p, c, user_tips in zip(payloads, cols, tips)
+        ]
+
+    def degrade(self, payload: Dict[str, Any], reason: str) -> Dict[str, Any]:
+        """Cheap stand-in for `run`, same weekly focus: out of time ("deadline"), tips for the
+        last DEGRADED_DAYS days only; after `run` raised ("error"), no daily tips at all."""
+        logs = as_columns(payload["normalized_logs"])
+        daily, detail = [], "daily_suggestions skipped"
+        if reason == "deadline":
+            recent = logs.take(range(max(0, len(logs) - DEGRADED_DAYS), len(logs)))
+            tips = self.rules.evaluate(recent, payload["normalized_targets"], limit=3)
+            daily = [{"date": d, "tips": t} for d, t in zip(recent.dates, tips)]
+            detail = (f"daily_suggestions cover the last {len(recent)} of {len(logs)} days"
+                      if len(recent) < len(logs) else f"daily_suggestions cover all {len(logs)} days")
+        return {
+            "status": "ok",
+            "daily_suggestions": daily,
+            "weekly_focus": self.focus(payload["metrics"]["adherence"]),
+            "detail": detail,
+        }
+
+    def day_tips(self, day: Dict[str, Any], targets: Dict[str, Any]) -> List[str]:
+        """Tips for a single normalized day dict; same rules as `run`."""
+        return self.rules.match(day, targets, limit=3)
+
+    def focus(self, adh: Dict[str, Any]) -> List[str]:
+        return self.rules.weakest(adh, 1)[:2]
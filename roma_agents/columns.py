@@ -0,0 +1,216 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from datetime import date
+from itertools import compress
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Numeric per-day fields, in the order IngestorAgent emits them
+FIELDS = ("sleep_hours", "steps", "calories_in", "water_liters", "mood_1_5")
+
+def date_ordinal(d: Any) -> int:
+    """Proleptic ordinal of an ISO date string; 0 for a missing or unparseable date."""
+    try:
+        return date.fromisoformat(d).toordinal()
+    except (TypeError, ValueError):
+        return 0
+
+class DayColumns(Sequence):
+    """Columnar, array-backed form of `normalized_logs`.
+
+    Each numeric field is an `array('d')` with a parallel `bytearray` mask
+    instead of None: 0 = missing, 1 = logged float, 2 = logged int (so the
+    dict view hands back the caller's original number type). Workouts are flattened into
+    parallel arrays; day i owns workouts `w_offsets[i]:w_offsets[i+1]`.
+    Indexing still yields the per-day dict IngestorAgent used to build, but
+    only when a caller asks for it.
+    """
+    __slots__ = ("dates", "notes", "values", "mask",
+                 "w_offsets", "w_types", "w_minutes", "w_intensity")
+
+    def __init__(self):
+        self.dates: List[Optional[str]] = []
+        self.notes: List[str] = []
+        self.values: Dict[str, array] = {f: array("d") for f in FIELDS}
+        self.mask: Dict[str, bytearray] = {f: bytearray() for f in FIELDS}
+        self.w_offsets = array("q", [0])
+        self.w_types: List[str] = []
+        self.w_minutes = array("q")
+        self.w_intensity = array("q")
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]], missing: Optional[List[str]] = None) -> "DayColumns":
+        cols = cls()
+        for row in rows:
+            cols.append_row(row, missing)
+        return cols
+
+    def append_row(self, row: Dict[str, Any], missing: Optional[List[str]] = None) -> None:
+        """Normalize one raw `daily_logs` entry straight into the columns."""
+        if not row.get("date") and missing is not None:
+            missing.append("daily_logs[].date")
+        self.dates.append(row.get("date"))
+        for f in FIELDS:
+            v = row.get(f)
+            if v is not None:
+                try:
+                    x = float(v)
+                except (TypeError, ValueError):
+                    if missing is not None:
+                        missing.append(f"daily_logs[].{f}")
+                    v = None
+            if v is None:
+                self.values[f].append(0.0)
+                self.mask[f].append(0)
+            else:
+                self.values[f].append(x)
+                self.mask[f].append(2 if type(v) is int else 1)
+        for w in row.get("workouts", []) or []:
+            self.w_types.append(w.get("type") or "other")
+            self.w_minutes.append(int(w.get("minutes") or 0))
+            self.w_intensity.append(int(w.get("intensity_1_5") or 1))
+        self.w_offsets.append(len(self.w_minutes))
+        self.notes.append((row.get("notes") or "")[:140])
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("day index out of range")
+        day: Dict[str, Any] = {"date": self.dates[i]}
+        for f in FIELDS:
+            if f == "calories_in":
+                day["workouts"] = self.workouts(i)
+            day[f] = self.value(f, i)
+        day["notes"] = self.notes[i]
+        return day
+
+    def __repr__(self) -> str:
+        return f"<DayColumns days={len(self)} workouts={len(self.w_minutes)}>"
+
+    def value(self, field: str, i: int):
+        """Field value for day i, or None when missing."""
+        m = self.mask[field][i]
+        if not m:
+            return None
+        x = self.values[field][i]
+        return int(x) if m == 2 else x
+
+    def workouts(self, i: int) -> List[Dict[str, Any]]:
+        a, b = self.w_offsets[i], self.w_offsets[i + 1]
+        return [
+            {"type": t, "minutes": m, "intensity_1_5": k}
+            for t, m, k in zip(self.w_types[a:b], self.w_minutes[a:b], self.w_intensity[a:b])
+        ]
+
+    def logged(self, field: str) -> int:
+        """Number of days on which `field` was logged."""
+        return len(self.dates) - self.mask[field].count(0)
+
+    def present(self, field: str) -> List[float]:
+        """Logged values of one field, in day order, missing days skipped."""
+        return list(compress(self.values[field], self.mask[field]))
+
+    def workout_counts(self) -> List[int]:
+        o = self.w_offsets
+        return [b - a for a, b in zip(o, o[1:])]
+
+    def workout_minutes(self) -> List[int]:
+        o, m = self.w_offsets, self.w_minutes
+        return [sum(m[a:b]) for a, b in zip(o, o[1:])]
+
+    def ordinals(self) -> List[int]:
+        """`date_ordinal` of each day's date, in day order."""
+        return [date_ordinal(d) for d in self.dates]
+
+    def take(self, idx: Iterable[int]) -> "DayColumns":
+        """New columns holding days `idx` of these, in that order."""
+        idx = list(idx)
+        out = DayColumns()
+        out.dates = [self.dates[i] for i in idx]
+        out.notes = [self.notes[i] for i in idx]
+        for f in FIELDS:
+            v, m = self.values[f], self.mask[f]
+            out.values[f] = array("d", [v[i] for i in idx])
+            out.mask[f] = bytearray([m[i] for i in idx])
+        o = self.w_offsets
+        for i in idx:
+            a, b = o[i], o[i + 1]
+            out.w_types.extend(self.w_types[a:b])
+            out.w_minutes.extend(self.w_minutes[a:b])
+            out.w_intensity.extend(self.w_intensity[a:b])
+            out.w_offsets.append(len(out.w_minutes))
+        return out
+
+    def by_date(self) -> "DayColumns":
+        """Days sorted by date with one day per date: a repeated date keeps its last entry.
+
+        Returns `self` when dates already strictly increase (the usual case),
+        so that costs one parse pass. Days without an ISO date follow the
+        dated ones in their original order.
+        """
+        ords = self.ordinals()
+        prev = 0
+        for o in ords:
+            if o <= prev:
+                break
+            prev = o
+        else:
+            return self
+        last: Dict[int, int] = {}
+        undated = []
+        for i, o in enumerate(ords):
+            if o:
+                last[o] = i
+            else:
+                undated.append(i)
+        return self.take([last[o] for o in sorted(last)] + undated)
+
+    def date_range(self, start: Optional[str] = None, end: Optional[str] = None,
+                   ords: Optional[List[int]] = None) -> Tuple[int, int]:
+        """Day indices i:j with dates between `start` and `end` (inclusive ISO dates,
+        either may be omitted), by binary search; days must be in `by_date` order.
+        Raises ValueError for a bound that is not an ISO date."""
+        lo, hi = (None if d is None else date_ordinal(d) for d in (start, end))
+        for name, d, o in (("start", start, lo), ("end", end, hi)):
+            if o == 0:
+                raise ValueError(f"{name} must be an ISO date (YYYY-MM-DD), got {d!r}")
+        ords = self.ordinals() if ords is None else ords
+        n = len(ords)
+        while n and not ords[n - 1]:  # undated days sort last
+            n -= 1
+        i = 0 if lo is None else bisect_left(ords, lo, 0, n)
+        j = n if hi is None else bisect_right(ords, hi, 0, n)
+        return i, max(i, j)
+
+    def iso_weeks(self, start: Optional[str] = None, end: Optional[str] = None) -> List[Tuple[str, int, int]]:
+        """("YYYY-Www", i, j) per ISO week with logged days in the range, in one pass;
+        days must be in `by_date` order."""
+        ords = self.ordinals()
+        i, j = self.date_range(start, end, ords)
+        weeks = []
+        while i < j:
+            monday = ords[i] - (ords[i] - 1) % 7  # ordinal 1 (0001-01-01) is a Monday
+            k = bisect_left(ords, monday + 7, i, j)
+            year, week, _ = date.fromordinal(monday).isocalendar()
+            weeks.append((f"{year}-W{week:02d}", i, k))
+            i = k
+        return weeks
+
+    def span_days(self) -> int:
+        """Calendar days from the first to the last ISO date, inclusive; 0 without dates."""
+        ords = [o for o in self.ordinals() if o]
+        return max(ords) - min(ords) + 1 if ords else 0
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        """Materialize the dict view, e.g. for a JSON response."""
+        return [self[i] for i in range(len(self))]
+
+def as_columns(logs) -> DayColumns:
+    """Accept either DayColumns or a list of per-day dicts."""
+    return logs if isinstance(logs, DayColumns) else DayColumns.from_rows(logs)
@@ -1,7 +1,15 @@
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
+from roma_agents.columns import DayColumns
 
 class IngestorAgent:
     name = "ingestor"
+    inputs = ("user_profile", "targets", "daily_logs")
+    outputs = ("normalized_profile", "normalized_logs", "normalized_targets")
+
+    def __init__(self, memo: Optional[Any] = None):
+        # optional roma_engine.memo.NodeMemo: parsed logs are reused while
+        # only the profile or targets change
+        self.memo = memo
 
     def run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         user = payload.get("user_profile", {}) or {}
@@ -9,6 +17,46 @@ class IngestorAgent:
         targets = payload.get("targets", {}) or {}
         missing: List[str] = []
 
+        prof = self.profile(user, missing)
+
+        # columnar: typed arrays per field, no per-day / per-workout dicts; date
+        # ordered, one day per date (a repeated date keeps its last entry)
+        if self.memo is None:
+            norm_logs = DayColumns.from_rows(logs, missing).by_date()
+        else:
+            norm_logs, logs_fp = self._logs_memoized(logs, missing)
+
+        norm_targets = self.targets(targets)
+
+        ok = (len(missing) == 0) and (len(norm_logs) > 0)
+        out = {
+            "status": "ok" if ok else "needs_input",
+            "missing_fields": [] if ok else missing,
+            "normalized_profile": prof,
+            "normalized_logs": norm_logs,
+            "normalized_targets": norm_targets,
+        }
+        if self.memo is not None:
+            # lets DagScheduler key each downstream node on just the parts it reads
+            out["fingerprints"] = {
+                "normalized_profile": self.memo.fingerprint(prof),
+                "normalized_logs": logs_fp,
+                "normalized_targets": self.memo.fingerprint(norm_targets),
+            }
+        return out
+
+    def _logs_memoized(self, logs: List[Dict[str, Any]], missing: List[str]):
+        key = self.memo.fingerprint(logs)
+        hit = self.memo.get("ingest.logs", key) if key is not None else None
+        if hit is None:
+            log_missing: List[str] = []
+            hit = (DayColumns.from_rows(logs, log_missing).by_date(), tuple(log_missing))
+            if key is not None:
+                self.memo.put("ingest.logs", key, hit)
+        missing.extend(hit[1])
+        return hit[0], key
+
+    def profile(self, user: Dict[str, Any], missing: List[str]) -> Dict[str, Any]:
         prof = {
             "age": user.get("age"),
             "sex": user.get("sex"),
@@ -20,30 +68,10 @@ class IngestorAgent:
         for k in ["age","sex","height_cm","weight_kg","goal"]:
             if prof.get(k) is None:
                 missing.append(f"user_profile.{k}")
+        return prof
 
-        norm_logs: List[Dict[str, Any]] = []
-        for row in logs:
-            if not row.get("date"):
-                missing.append("daily_logs[].date")
-            workouts = []
-            for w in row.get("workouts", []) or []:
-                workouts.append({
-                    "type": w.get("type") or "other",
-                    "minutes": int(w.get("minutes") or 0),
-                    "intensity_1_5": int(w.get("intensity_1_5") or 1),
-                })
-            norm_logs.append({
-                "date": row.get("date"),
-                "sleep_hours": row.get("sleep_hours"),
-                "steps": row.get("steps"),
-                "workouts": workouts,
-                "calories_in": row.get("calories_in"),
-                "water_liters": row.get("water_liters"),
-                "mood_1_5": row.get("mood_1_5"),
-                "notes": (row.get("notes") or "")[:140],
-            })
-
-        norm_targets = {
+    def targets(self, targets: Dict[str, Any]) -> Dict[str, Any]:
+        return {
             "sleep_h": targets.get("sleep_h"),
             "steps": targets.get("steps"),
             "workouts_per_week": targets.get("workouts_per_week"),
@@ -51,11 +79,6 @@ class IngestorAgent:
             "water_liters": targets.get("water_liters"),
         }
 
-        ok = (len(missing) == 0) and (len(norm_logs) > 0)
-        return {
-            "status": "ok" if ok else "needs_input",
-            "missing_fields": [] if ok else missing,
-            "normalized_profile": prof,
-            "normalized_logs": norm_logs,
-            "normalized_targets": norm_targets,
-        }
+    def day(self, row: Dict[str, Any], missing: List[str]) -> Dict[str, Any]:
+        """Normalize a single `daily_logs` entry to the per-day dict shape."""
+        return DayColumns.from_rows([row], missing)[0]
@@ -1,74 +1,200 @@
-from typing import Any, Dict
+from itertools import compress
+from typing import Any, Dict, List, Optional
+from roma_agents.columns import DayColumns, as_columns, date_ordinal
 
-def _avg(xs):
-    xs = [x for x in xs if x is not None]
-    return round(sum(xs)/len(xs), 2) if xs else None
+def _col_avg(cols: DayColumns, field: str):
+    # same float sum, in the same day order, as averaging the dict view
+    n = cols.logged(field)
+    return round(sum(compress(cols.values[field], cols.mask[field]))/n, 2) if n else None
+
+def _bmi(prof):
+    try:
+        h = (prof["height_cm"] or 0)/100
+        if h and prof["weight_kg"]:
+            return round(prof["weight_kg"]/(h*h), 2)
+    except:
+        pass
+    return None
+
+def _tdee(prof, steps_avg):
+    age = prof.get("age"); sex = prof.get("sex")
+    w = prof.get("weight_kg"); hcm = prof.get("height_cm")
+    if None in (age, sex, w, hcm) or steps_avg is None:
+        return None
+    bmr = 10*w + 6.25*hcm - 5*age + (5 if str(sex).upper().startswith("M") else -161)
+    if steps_avg < 5000: af = 1.2
+    elif steps_avg < 8000: af = 1.35
+    elif steps_avg < 12000: af = 1.5
+    else: af = 1.7
+    return round(bmr*af, 0)
+
+def _adhere(actual, target, higher=True):
+    if actual is None or target is None or target == 0:
+        return None
+    if higher:
+        ratio = min(actual/target, 1.0)
+    else:
+        ratio = min(target/max(actual,1), 1.0) if actual > 0 else 1.0
+    return int(round(ratio*100))
+
+def _metrics(prof, targets, agg):
+    t = _tdee(prof, agg["steps_avg"])
+    # workouts_per_week is a weekly target: rate over the span when it is longer than a week
+    workouts = agg["workouts_count"]
+    if agg["span_days"] > 7:
+        workouts = workouts * 7 / agg["span_days"]
+    cals_avg = agg["calories_avg"]
+    cal_bal = round(cals_avg - t, 0) if (cals_avg is not None and t is not None) else None
+    adherence = {
+        "sleep": _adhere(agg["sleep_avg"], targets.get("sleep_h"), True),
+        "steps": _adhere(agg["steps_avg"], targets.get("steps"), True),
+        "workouts": _adhere(workouts, targets.get("workouts_per_week"), True),
+        "calories_in": _adhere(cals_avg, targets.get("calories_in"), False),
+        "water": _adhere(agg["water_avg"], targets.get("water_liters"), True),
+    }
+    return {
+        "bmi": _bmi(prof),
+        "sleep_avg_h": agg["sleep_avg"],
+        "steps_avg": agg["steps_avg"],
+        "water_avg_l": agg["water_avg"],
+        "workouts_count": agg["workouts_count"],
+        "minutes_total": agg["minutes_total"],
+        "calorie_balance_est": cal_bal,
+        "adherence": adherence
+    }
+
+def log_aggregates(logs: DayColumns) -> Dict[str, Any]:
+    """Everything MetricsAgent needs from the logs; independent of profile and targets."""
+    return {
+        "sleep_avg": _col_avg(logs, "sleep_hours"),
+        "steps_avg": _col_avg(logs, "steps"),
+        "water_avg": _col_avg(logs, "water_liters"),
+        "calories_avg": _col_avg(logs, "calories_in"),
+        "workouts_count": len(logs.w_minutes),
+        "minutes_total": sum(logs.w_minutes),
+        "span_days": logs.span_days(),
+    }
+
+class LogAggregatesAgent:
+    """Field averages and workout totals over the logs.
+
+    A node of its own so that a targets- or profile-only change (e.g. a new
+    weigh-in) reuses the memoized aggregates and only recomputes adherence.
+    """
+    name = "aggregates"
+    inputs = ("normalized_logs",)
+    outputs = ("log_aggregates",)
+
+    def run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return {"status": "ok", "log_aggregates": log_aggregates(as_columns(payload["normalized_logs"]))}
 
 class MetricsAgent:
     name = "metrics"
+    inputs = ("normalized_profile", "normalized_targets", "log_aggregates")
+    outputs = ("metrics",)
 
     def run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        prof = payload["normalized_profile"]
-        logs = payload["normalized_logs"]
-        targets = payload["normalized_targets"]
-
-        sleep_avg = _avg([d.get("sleep_hours") for d in logs])
-        steps_avg = _avg([d.get("steps") for d in logs])
-        water_avg = _avg([d.get("water_liters") for d in logs])
-        workouts_count = sum(len(d.get("workouts",[])) for d in logs)
-        minutes_total = sum(sum(w["minutes"] for w in d.get("workouts",[])) for d in logs)
-        cals_avg = _avg([d.get("calories_in") for d in logs])
-
-        bmi = None
-        try:
-            h = (prof["height_cm"] or 0)/100
-            if h and prof["weight_kg"]:
-                bmi = round(prof["weight_kg"]/(h*h), 2)
-        except:
-            pass
-
-        def tdee():
-            age = prof.get("age"); sex = prof.get("sex")
-            w = prof.get("weight_kg"); hcm = prof.get("height_cm")
-            if None in (age, sex, w, hcm) or steps_avg is None:
-                return None
-            bmr = 10*w + 6.25*hcm - 5*age + (5 if str(sex).upper().startswith("M") else -161)
-            if steps_avg < 5000: af = 1.2
-            elif steps_avg < 8000: af = 1.35
-            elif steps_avg < 12000: af = 1.5
-            else: af = 1.7
-            return round(bmr*af, 0)
-
-        t = tdee()
-        cal_bal = round(cals_avg - t, 0) if (cals_avg is not None and t is not None) else None
-
-        def adhere(actual, target, higher=True):
-            if actual is None or target is None or target == 0:
-                return None
-            if higher:
-                ratio = min(actual/target, 1.0)
-            else:
-                ratio = min(target/max(actual,1), 1.0) if actual > 0 else 1.0
-            return int(round(ratio*100))
-
-        adherence = {
-            "sleep": adhere(sleep_avg, targets.get("sleep_h"), True),
-            "steps": adhere(steps_avg, targets.get("steps"), True),
-            "workouts": adhere(workouts_count, targets.get("workouts_per_week"), True),
-            "calories_in": adhere(cals_avg, targets.get("calories_in"), False),
-            "water": adhere(water_avg, targets.get("water_liters"), True),
-        }
-
+        """Metrics from `log_aggregates`, or computed from `normalized_logs` when run on its own."""
+        agg = payload.get("log_aggregates")
+        if agg is None:
+            agg = log_aggregates(as_columns(payload["normalized_logs"]))
         return {
             "status": "ok",
-            "metrics": {
-                "bmi": bmi,
-                "sleep_avg_h": sleep_avg,
-                "steps_avg": steps_avg,
-                "water_avg_l": water_avg,
-                "workouts_count": workouts_count,
-                "minutes_total": minutes_total,
-                "calorie_balance_est": cal_bal,
-                "adherence": adherence
-            }
+            "metrics": _metrics(payload["normalized_profile"], payload["normalized_targets"], agg)
         }
+
+    def run_batch(self, payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Same as `run` for many users at once (from `normalized_logs`).
+
+        One scheduler call covers the batch; the work per user is the same
+        as in `run` (each field average is a C-level compress/sum over that
+        user's typed array, kept per user so the float sums match `run` bit
+        for bit). Element i of the result equals `run(payloads[i])`.
+        """
+        return [
+            {"status": "ok", "metrics": _metrics(p["normalized_profile"], p["normalized_targets"],
+                                                 log_aggregates(as_columns(p["normalized_logs"])))}
+            for p in payloads
+        ]
+
+class MetricsAccumulator:
+    """Running sums and counts behind `MetricsAgent`, updated one day at a time.
+
+    Each field keeps its running sum after every day, i.e. exactly the
+    partial sums `sum()` produces over the same days, so `metrics` matches
+    `MetricsAgent.run` bit for bit. Appending a day, or correcting the most
+    recent one, is O(1); correcting an older date re-adds only the days
+    after it. Per day only its field values, workout totals and partial
+    sums are kept, so a repeated date replaces the earlier entry just as
+    ingest's `by_date` keeps the last one.
+    """
+    FIELDS = ("sleep_hours", "steps", "water_liters", "calories_in")
+
+    def __init__(self):
+        self.counts = dict.fromkeys(self.FIELDS, 0)
+        self.workouts_count = 0
+        self.minutes_total = 0
+        self._n = 0
+        self._first = self._last = 0  # date ordinals bounding the days seen
+        self._sums: Optional[tuple] = None  # running field sums after the latest day
+        self._index: Dict[Any, int] = {}  # date -> position, first-seen order
+        self._values: List[tuple] = []    # per day: field values (None = missing)
+        self._partial: List[tuple] = []   # per day: running field sums after it
+        self._workouts: List[tuple] = []  # per day: (count, minutes)
+
+    def __len__(self) -> int:
+        return self._n
+
+    def add_day(self, day: Dict[str, Any]) -> None:
+        """Absorb a normalized day dict; a date seen before replaces that day."""
+        values = tuple(day.get(f) for f in self.FIELDS)
+        o = date_ordinal(day.get("date"))
+        if o:
+            self._first = min(self._first or o, o)
+            self._last = max(self._last, o)
+        ws = day.get("workouts", [])
+        workouts = (len(ws), sum(w["minutes"] for w in ws))
+        i = self._index.get(day.get("date"))
+        if i is None:
+            self._n += 1
+            self._sums = self._step(self._sums, values)
+            self._index[day.get("date")] = len(self._values)
+            self._values.append(values)
+            self._workouts.append(workouts)
+            self._partial.append(self._sums)
+        else:
+            self._count(self._values[i], self._workouts[i], -1)
+            self._values[i] = values
+            self._workouts[i] = workouts
+            prev = self._partial[i - 1] if i else None
+            for j in range(i, len(self._values)):
+                prev = self._partial[j] = self._step(prev, self._values[j])
+            self._sums = prev
+        self._count(values, workouts, 1)
+
+    def _step(self, prev, values) -> tuple:
+        if prev is None:
+            prev = (0,) * len(self.FIELDS)
+        return tuple(s if v is None else s + v for s, v in zip(prev, values))
+
+    def _count(self, values: tuple, workouts: tuple, sign: int) -> None:
+        for f, v in zip(self.FIELDS, values):
+            if v is not None:
+                self.counts[f] += sign
+        self.workouts_count += sign*workouts[0]
+        self.minutes_total += sign*workouts[1]
+
+    def avg(self, field: str):
+        n = self.counts[field]
+        return round(self._sums[self.FIELDS.index(field)]/n, 2) if n else None
+
+    def metrics(self, prof: Dict[str, Any], targets: Dict[str, Any]) -> Dict[str, Any]:
+        return _metrics(prof, targets, {
+            "sleep_avg": self.avg("sleep_hours"),
+            "steps_avg": self.avg("steps"),
+            "water_avg": self.avg("water_liters"),
+            "calories_avg": self.avg("calories_in"),
+            "workouts_count": self.workouts_count,
+            "minutes_total": self.minutes_total,
+            "span_days": self._last - self._first + 1 if self._last else 0,
+        })
@@ -1,7 +1,22 @@
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional
+from roma_agents.rules import WEAKEST, Rule, compile_rules
+
+# next_actions for the two lowest adherence keys
+RULES = [
+    Rule("sleep", WEAKEST, None, "Set a fixed bedtime alarm tonight"),
+    Rule("steps", WEAKEST, None, "Add 10-minute afternoon walk today"),
+    Rule("calories_in", WEAKEST, None, "Swap one snack for fruit today"),
+    Rule("water", WEAKEST, None, "Carry a 500ml bottle all day"),
+    Rule("workouts", WEAKEST, None, "Book one 20-minute session this week"),
+]
 
 class ReporterAgent:
     name = "reporter"
+    inputs = ("metrics", "weekly_focus")
+    outputs = ("week_summary", "weekly_plan", "next_actions")
+
+    def __init__(self, rules: Optional[List[Rule]] = None):
+        self.rules = compile_rules(RULES if rules is None else rules)
 
     def run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         m = payload["metrics"]
@@ -26,19 +41,7 @@ class ReporterAgent:
                 {"day": "Sat", "action": "1 bodyweight session, 20 min"},
             ],
         }
-        pairs = sorted([(k, v if v is not None else -1) for k,v in m["adherence"].items()], key=lambda x: x[1])
-        next_actions = []
-        for k,_ in pairs[:2]:
-            if k == "sleep":
-                next_actions.append("Set a fixed bedtime alarm tonight")
-            elif k == "steps":
-                next_actions.append("Add 10-minute afternoon walk today")
-            elif k == "calories_in":
-                next_actions.append("Swap one snack for fruit today")
-            elif k == "water":
-                next_actions.append("Carry a 500ml bottle all day")
-            elif k == "workouts":
-                next_actions.append("Book one 20-minute session this week")
+        next_actions = self.rules.weakest(m["adherence"], 2)
 
         return {
             "status": "ok",
@@ -0,0 +1,124 @@
+import operator
+from itertools import chain, compress, repeat
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Union
+from roma_agents.columns import FIELDS, DayColumns
+
+_OPS = {
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "==": operator.eq,
+    "!=": operator.ne,
+}
+WEAKEST = "weakest"
+
+class Rule(NamedTuple):
+    """One coaching rule.
+
+    A comparator rule fires on a day when `field <op> target` holds, where
+    `field` is a `DayColumns` field and `target` is a key of the normalized
+    targets (the rule is skipped when that target is unset or 0) or a number. A `"weakest"` rule fires when
+    `field` is among the lowest-scored adherence keys. Lower `priority`
+    comes first; ties keep table order.
+    """
+    field: str
+    op: str
+    target: Union[str, float, None]
+    tip: str
+    priority: int = 0
+
+class RuleSet:
+    """A rule table compiled once into per-field, per-comparator evaluators.
+
+    Day rules run one C-level pass per rule over a `DayColumns` field (or
+    over the concatenated columns of a whole batch), so adding rules adds
+    passes over typed arrays, not Python branches per day.
+    """
+    def __init__(self, rules: Sequence[Rule]):
+        for r in rules:
+            if r.op != WEAKEST and r.op not in _OPS:
+                raise ValueError(f"Unknown comparator {r.op!r} in rule for {r.field!r}")
+            if r.op != WEAKEST and r.field not in FIELDS:
+                raise ValueError(f"Unknown day field {r.field!r} in rule {r.tip!r} (one of {', '.join(FIELDS)})")
+        self.rules = sorted(rules, key=lambda r: r.priority)
+        self.day_rules = [(r.field, _OPS[r.op], r.target, r.tip) for r in self.rules if r.op != WEAKEST]
+        self.rank_rules: Dict[str, List[str]] = {}
+        for r in self.rules:
+            if r.op == WEAKEST:
+                self.rank_rules.setdefault(r.field, []).append(r.tip)
+
+    @staticmethod
+    def _threshold(target: Union[str, float, None], targets: Dict[str, Any]) -> Optional[float]:
+        if isinstance(target, str):
+            t = targets.get(target)
+            return t if t else None  # an unset or 0 target turns the rule off
+        return target
+
+    def evaluate(self, cols: DayColumns, targets: Dict[str, Any], limit: Optional[int] = None) -> List[List[str]]:
+        """Tips for every day of one user's columns, highest priority first."""
+        n = len(cols)
+        daily: List[List[str]] = [[] for _ in range(n)]
+        for field, cmp, target, tip in self.day_rules:
+            t = self._threshold(target, targets)
+            if t is None:
+                continue
+            # mask code (0 missing, 1/2 logged) times the comparison: truthy only for logged hits
+            hits = map(operator.mul, cols.mask[field], map(cmp, cols.values[field], repeat(t)))
+            for i in compress(range(n), hits):
+                daily[i].append(tip)
+        if limit is not None:
+            daily = [d[:limit] for d in daily]
+        return daily
+
+    def evaluate_batch(self, cols: Sequence[DayColumns], targets: Sequence[Dict[str, Any]],
+                       limit: Optional[int] = None) -> List[List[List[str]]]:
+        """`evaluate` for many users at once; element u equals `evaluate(cols[u], targets[u], limit)`.
+
+        Each field is concatenated across users once; every rule is then a
+        single pass over all days of all users, with each user's own target
+        repeated along their days.
+        """
+        sizes = [len(c) for c in cols]
+        total = sum(sizes)
+        daily: List[List[str]] = [[] for _ in range(total)]
+        values: Dict[str, Any] = {}
+        present: Dict[str, bytes] = {}
+        for field, cmp, target, tip in self.day_rules:
+            if field not in values:
+                values[field] = list(chain.from_iterable(c.values[field] for c in cols))
+                present[field] = b"".join(c.mask[field] for c in cols)
+            ts = [self._threshold(target, t) for t in targets]
+            if all(t is None for t in ts):
+                continue
+            thresholds = chain.from_iterable(repeat(t or 0, k) for t, k in zip(ts, sizes))
+            hits = map(operator.mul, present[field], map(cmp, values[field], thresholds))
+            if any(t is None for t in ts):
+                enabled = chain.from_iterable(repeat(t is not None, k) for t, k in zip(ts, sizes))
+                hits = map(operator.mul, hits, enabled)
+            for i in compress(range(total), hits):
+                daily[i].append(tip)
+        if limit is not None:
+            daily = [d[:limit] for d in daily]
+        out, start = [], 0
+        for k in sizes:
+            out.append(daily[start:start + k])
+            start += k
+        return out
+
+    def match(self, record: Dict[str, Any], targets: Dict[str, Any], limit: Optional[int] = None) -> List[str]:
+        """Tips for a single record (e.g. one normalized day dict); same rules as `evaluate`."""
+        tips = []
+        for field, cmp, target, tip in self.day_rules:
+            v, t = record.get(field), self._threshold(target, targets)
+            if v is not None and t is not None and cmp(v, t):
+                tips.append(tip)
+        return tips[:limit] if limit is not None else tips
+
+    def weakest(self, scores: Dict[str, Any], n: int = 1) -> List[str]:
+        """Tips of the `"weakest"` rules for the `n` lowest scores (None ranks lowest)."""
+        ranked = sorted(scores.items(), key=lambda kv: kv[1] if kv[1] is not None else -1)
+        return [tip for k, _ in ranked[:n] for tip in self.rank_rules.get(k, ())]
+
+def compile_rules(rules: Sequence[Rule]) -> RuleSet:
+    return RuleSet(rules)
@@ -0,0 +1,122 @@
+from array import array
+from datetime import date
+from itertools import accumulate
+from typing import Any, Dict, List, Optional
+from roma_agents.columns import DayColumns, as_columns
+
+WINDOWS = (7, 28, 90)
+# day fields averaged over logged days, plus total workout minutes per logged day
+TREND_FIELDS = ("sleep_hours", "steps", "water_liters", "calories_in", "workout_minutes")
+# history further back than this from the latest date is ignored
+MAX_SPAN_DAYS = 3660
+
+def _two_sum(a: float, b: float):
+    s = a + b
+    bb = s - a
+    return s, (a - (s - bb)) + (b - bb)
+
+def _prefix(xs: List[float]):
+    """Compensated prefix sums: `hi[k] + lo[k]` is the sum of `xs[:k]` to double-double precision."""
+    hi, lo = array("d", [0.0]), array("d", [0.0])
+    s = c = 0.0
+    for x in xs:
+        s, e = _two_sum(s, x)
+        c += e
+        hi.append(s)
+        lo.append(c)
+    return hi, lo
+
+class DailySeries:
+    """Prefix sums and counts per calendar day, built once over a user's logs.
+
+    Day k of the series is `start + k`; prefix entry k covers the days
+    before k, so any window average is a couple of subtractions. Sums are
+    compensated, so a window sum does not pick up the rounding error of
+    the whole history before it. Days are placed by date, so input order
+    does not matter and gaps count as missing. Undated or unparseable days
+    are skipped.
+    """
+    def __init__(self, cols: DayColumns, max_span_days: int = MAX_SPAN_DAYS):
+        days = []
+        for i, d in enumerate(cols.dates):
+            try:
+                days.append((date.fromisoformat(d).toordinal(), i))
+            except (TypeError, ValueError):
+                continue
+        self.end = max((o for o, _ in days), default=0)
+        self.start = max(min((o for o, _ in days), default=0), self.end - max_span_days + 1)
+        n = self.end - self.start + 1 if days else 0
+
+        minutes = cols.workout_minutes()
+        self.sums: Dict[str, array] = {}
+        self.sums_lo: Dict[str, array] = {}
+        self.counts: Dict[str, array] = {}
+        for f in TREND_FIELDS:
+            day_sum, day_cnt = [0.0] * n, [0] * n
+            if f == "workout_minutes":
+                for o, i in days:
+                    if o >= self.start:
+                        day_sum[o - self.start] += minutes[i]
+                        day_cnt[o - self.start] += 1
+            else:
+                vals, mask = cols.values[f], cols.mask[f]
+                for o, i in days:
+                    if mask[i] and o >= self.start:
+                        day_sum[o - self.start] += vals[i]
+                        day_cnt[o - self.start] += 1
+            self.sums[f], self.sums_lo[f] = _prefix(day_sum)
+            self.counts[f] = array("q", accumulate(day_cnt, initial=0))
+
+    def __len__(self) -> int:
+        return len(self.sums[TREND_FIELDS[0]]) - 1
+
+    def as_of(self) -> Optional[str]:
+        return date.fromordinal(self.end).isoformat() if len(self) else None
+
+    def avg(self, field: str, days: int, end: Optional[int] = None) -> Optional[float]:
+        """Average of `field` over the `days` calendar days ending at ordinal `end` (default: latest)."""
+        n = len(self)
+        b = min((self.end if end is None else end) - self.start + 1, n)
+        a = max(b - days, 0)
+        if b <= 0:
+            return None
+        cnt = self.counts[field][b] - self.counts[field][a]
+        if not cnt:
+            return None
+        hi, lo = self.sums[field], self.sums_lo[field]
+        d, e = _two_sum(hi[b], -hi[a])
+        return round((d + (e + (lo[b] - lo[a]))) / cnt, 2)
+
+    def delta(self, field: str, days: int = 7, end: Optional[int] = None) -> Optional[float]:
+        """Average over the last `days` minus the `days` before them (e.g. week over week)."""
+        end = self.end if end is None else end
+        cur, prev = self.avg(field, days, end), self.avg(field, days, end - days)
+        if cur is None or prev is None:
+            return None
+        return round(cur - prev, 2)
+
+class TrendsAgent:
+    name = "trends"
+    inputs = ("normalized_logs",)
+    outputs = ("trends",)
+
+    def __init__(self, windows: List[int] = WINDOWS):
+        self.windows = tuple(windows)
+
+    def run(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        series = DailySeries(as_columns(payload["normalized_logs"]))
+        return {
+            "status": "ok",
+            "trends": {
+                "as_of": series.as_of(),
+                "windows": {
+                    f"{w}d": {f: series.avg(f, w) for f in TREND_FIELDS}
+                    for w in self.windows
+                },
+                "week_over_week": {f: series.delta(f, 7) for f in TREND_FIELDS},
+            },
+        }
+
+    def degrade(self, payload: Dict[str, Any], reason: str) -> Dict[str, Any]:
+        """Stand-in for `run` when a report is out of time or `run` raised: trends are skipped."""
+        return {"status": "ok", "trends": {}, "detail": "trends skipped"}
@@ -0,0 +1,114 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("health_deadline", default=None)
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline (negative once past); None without one."""
+    d = _deadline.get()
+    return None if d is None else d - time.monotonic()
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Finish the enclosed work within `seconds` (None: no limit of its own).
+
+    Nested use keeps the earlier deadline, so one set at request arrival
+    still counts the time spent queueing. It is a context variable: the
+    scheduler's and RunnerPool's threads inherit it with the caller's context.
+    """
+    if seconds is None:
+        yield
+        return
+    d = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(d if outer is None else min(outer, d))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+# Seconds each stage is expected to take on a large payload
+DEFAULT_BUDGETS_S = {
+    "ingest": 0.050,
+    "aggregates": 0.010,
+    "metrics": 0.005,
+    "coach": 0.020,
+    "report": 0.002,
+    "trends": 0.010,
+}
+
+class StageBudgets:
+    """Per-agent time budgets under a report deadline, with graceful degradation.
+
+    HealthRunner runs a plan under a deadline of `deadline_s` (an earlier
+    one the caller set wins). A stage whose agent has a `degrade` method
+    (coach, trends) runs in full only while at least its budget is left;
+    otherwise, or when it raises, the agent's cheap `degrade` result stands
+    in and the report lists the stage under "degraded" (a failure is also
+    logged). Stages without one always run. Batch calls (run_batch,
+    run_weeks) are admitted against the budget times the batch size. As
+    DagScheduler middleware it counts single-user stages that ran over
+    their budget. Degraded reports are never cached.
+    """
+    def __init__(self, deadline_s: Optional[float] = None, budgets: Optional[Dict[str, float]] = None):
+        self.deadline_s = deadline_s
+        self.budgets = {**DEFAULT_BUDGETS_S, **(budgets or {})}
+        self._lock = threading.Lock()
+        self.reports = 0
+        self.degraded_reports = 0
+        self.degraded: Dict[str, int] = {}  # "<stage>_<reason>" -> count
+        self.overruns: Dict[str, int] = {}
+
+    @classmethod
+    def from_env(cls) -> Optional["StageBudgets"]:
+        """Off unless HEALTH_DEADLINE_MS (the deadline) is set, or HEALTH_DEGRADE=1 (stages
+        degrade on errors only); HEALTH_STAGE_BUDGETS_MS="coach=20,trends=10" overrides budgets."""
+        deadline_ms = float(os.getenv("HEALTH_DEADLINE_MS", "0") or 0)
+        if not deadline_ms and os.getenv("HEALTH_DEGRADE", "0") != "1":
+            return None
+        budgets = {}
+        for item in os.getenv("HEALTH_STAGE_BUDGETS_MS", "").split(","):
+            stage, _, ms = item.partition("=")
+            if stage.strip():
+                budgets[stage.strip()] = float(ms) / 1000
+        return cls(deadline_ms / 1000 or None, budgets)
+
+    def admit(self, stage: str, users: int = 1) -> bool:
+        """Whether `stage`, for `users` users at once, still fits before the current deadline."""
+        left = remaining()
+        return left is None or left >= self.budgets.get(stage, 0.0) * users
+
+    def __call__(self, stage: str, call_next: Callable, payload: Any) -> Any:
+        budget = self.budgets.get(stage)
+        if budget is None or isinstance(payload, list):  # a batch call covers many users
+            return call_next(payload)
+        t0 = time.perf_counter()
+        result = call_next(payload)
+        if time.perf_counter() - t0 > budget:
+            with self._lock:
+                self.overruns[stage] = self.overruns.get(stage, 0) + 1
+        return result
+
+    def record(self, degraded: Optional[List[Dict[str, Any]]]) -> None:
+        """Count one finished report and the stages that degraded in it."""
+        with self._lock:
+            self.reports += 1
+            if degraded:
+                self.degraded_reports += 1
+                for d in degraded:
+                    key = f"{d['stage']}_{d['reason']}"
+                    self.degraded[key] = self.degraded.get(key, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "deadline_ms": None if self.deadline_s is None else self.deadline_s * 1000,
+                "reports": self.reports,
+                "degraded_reports": self.degraded_reports,
+                **{f"degraded_{k}": v for k, v in self.degraded.items()},
+                **{f"overruns_{k}": v for k, v in self.overruns.items()},
+            }
@@ -0,0 +1,333 @@
+"""Offline bulk report generation: JSONL payloads in, JSONL reports out.
+
+    python -m roma_engine.bulk users.jsonl --out reports.jsonl
+    python -m roma_engine.bulk data/ --out-dir reports/ --workers 8
+    python -m roma_engine.bulk users.jsonl --out reports.jsonl --resume
+    python -m roma_engine.bulk data/ --out-dir reports/ --cohorts cohorts.json
+
+Each input line is one `/weekly-report` payload (an optional "user_id" is
+copied to the output). A directory means every *.jsonl and *.rhd file in
+it, in name order. `.rhd` files are DayFiles (see roma_engine.dayfile):
+already normalized, memory-mapped by each worker and read with no JSON
+parsing or copying. Inputs are cut into chunks of `--chunk-size` users,
+and each chunk is one `HealthRunner.run_batch` call on a worker process.
+
+`--out` writes one report line per input line, in input order. A
+checkpoint file next to it records how many chunks are safely on disk,
+and `--resume` truncates any partial tail and carries on from there.
+`--out-dir` writes one file per chunk as chunks finish. Existing chunk
+files are skipped on the next run, so a rerun resumes by itself. A line
+that is not a valid payload, or a user whose report fails, yields
+{"status": "error", ...} rather than stopping the run.
+
+`--cohorts` also builds population percentile sketches (see
+roma_engine.cohorts) from the users this run computes: each worker sketches
+its chunk, the sketches are merged here and saved as a snapshot a server
+loads with HEALTH_COHORTS_PATH. Reports themselves are not affected. So
+that a resumed run still covers every user, the sketches so far are kept
+in the `--out` checkpoint, and each `--out-dir` chunk file gets a
+"<chunk>.cohorts.json" sketch of its users that later runs merge instead
+of recomputing the chunk.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from roma_engine.cohorts import CohortStats
+from roma_engine.jsonio import dumps, loads
+from roma_engine.schema import check_lenient
+
+DAYFILE_SUFFIX = ".rhd"
+
+_worker_runner = None
+_worker_cohorts: Optional[CohortStats] = None
+_worker_dayfiles: Dict[str, Any] = {}
+
+def _init_worker(cohorts: bool = False) -> None:
+    global _worker_runner, _worker_cohorts
+    from roma_engine.runner import HealthRunner
+    _worker_runner = HealthRunner()
+    if cohorts:
+        # observe only: reports must not depend on the part of the population seen so far
+        _worker_cohorts = CohortStats()
+        _worker_runner.scheduler.middleware.append(_worker_cohorts)
+
+def _error(e: Any) -> Dict[str, Any]:
+    return {"status": "error", "error": str(e)}
+
+def _dumps_lines(reports: List[Dict[str, Any]]) -> bytes:
+    return b"".join(dumps(r) + b"\n" for r in reports)
+
+def _isolated(batch: Callable[[List[Any]], List[Dict[str, Any]]], one: Callable[[Any], Dict[str, Any]],
+              users: List[Any]) -> List[Dict[str, Any]]:
+    """`batch(users)`; if that raises, each user on its own, so only the one that broke
+    the batch pass gets an error report."""
+    try:
+        return batch(users)
+    except Exception:
+        if _worker_cohorts is not None:
+            _worker_cohorts.clear()  # this chunk's users, some observed already; redone below
+        reports = []
+        for u in users:
+            try:
+                reports.append(one(u))
+            except Exception as e:
+                reports.append(_error(e))
+        return reports
+
+def run_dayfile_chunk(path: str, start: int, stop: int) -> bytes:
+    """Reports for users start..stop of a DayFile, as JSONL bytes in user order."""
+    if _worker_runner is None:
+        _init_worker()
+    days = _worker_dayfiles.get(path)
+    if days is None:
+        from roma_engine.dayfile import DayFile
+        days = _worker_dayfiles[path] = DayFile(path)
+    users = days[start:stop]
+    reports = _isolated(_worker_runner.run_batch_normalized, _worker_runner.run_normalized, users)
+    return _dumps_lines([{"user_id": u["user_id"], **r} if u["user_id"] is not None else r
+                         for u, r in zip(users, reports)])
+
+def run_chunk(lines: Union[List[bytes], Tuple[str, int, int]]) -> bytes:
+    """Reports for one chunk of payload lines (or a DayFile user range), as JSONL bytes in order."""
+    if isinstance(lines, tuple):
+        return run_dayfile_chunk(*lines)
+    if _worker_runner is None:
+        _init_worker()
+    out: List[Optional[Dict[str, Any]]] = [None] * len(lines)
+    valid: List[Tuple[int, Dict[str, Any]]] = []
+    for i, line in enumerate(lines):
+        try:
+            payload = loads(line)
+        except ValueError as e:
+            out[i] = _error(f"invalid JSON: {e}")
+            continue
+        errors = check_lenient(payload)
+        if errors:
+            out[i] = _error("; ".join(f"{'.'.join(map(str, x['loc'][1:]))}: {x['msg']}" for x in errors))
+        else:
+            valid.append((i, payload))
+    reports = _isolated(_worker_runner.run_batch, _worker_runner.run, [p for _, p in valid])
+    for (i, p), report in zip(valid, reports):
+        out[i] = {"user_id": p["user_id"], **report} if "user_id" in p else report
+    return _dumps_lines(out)
+
+def run_chunk_cohorts(lines: Union[List[bytes], Tuple[str, int, int]]) -> Tuple[bytes, Dict[str, Any]]:
+    """`run_chunk` plus a snapshot of the cohort sketches of just this chunk."""
+    if _worker_cohorts is None:
+        _init_worker(cohorts=True)
+    out = run_chunk(lines)
+    snapshot = _worker_cohorts.to_dict()
+    _worker_cohorts.clear()
+    return out, snapshot
+
+def input_files(paths: List[Path]) -> List[Path]:
+    files = []
+    for p in paths:
+        if p.is_dir():
+            files.extend(sorted(f for f in p.iterdir() if f.suffix in (".jsonl", DAYFILE_SUFFIX)))
+        else:
+            files.append(p)
+    return files
+
+def read_chunks(files: List[Path], chunk_size: int) -> Iterator[Tuple[int, Any]]:
+    """(chunk number, non-blank lines or a DayFile user range) over all files;
+    a chunk never spans two files."""
+    seq = 0
+    for path in files:
+        if path.suffix == DAYFILE_SUFFIX:
+            from roma_engine.dayfile import DayFile
+            with DayFile(str(path)) as days:
+                n = len(days)
+            for start in range(0, n, chunk_size):
+                yield seq, (str(path), start, min(start + chunk_size, n))
+                seq += 1
+            continue
+        chunk: List[bytes] = []
+        with open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    chunk.append(line)
+                    if len(chunk) == chunk_size:
+                        yield seq, chunk
+                        seq, chunk = seq + 1, []
+        if chunk:
+            yield seq, chunk
+            seq += 1
+
+class Progress:
+    """Users done and users/s on stderr, at most every `every_s` seconds."""
+    def __init__(self, every_s: float = 1.0, stream=sys.stderr):
+        self.start = time.perf_counter()
+        self.every_s = every_s
+        self.stream = stream
+        self.users = 0
+        self.errors = 0
+        self._last = 0.0
+
+    def add(self, users: int, errors: int = 0) -> None:
+        self.users += users
+        self.errors += errors
+        now = time.perf_counter()
+        if now - self._last >= self.every_s:
+            self._last = now
+            self.stream.write(f"\r{self.users} users  {self.rate():,.0f} users/s  {self.errors} errors")
+            self.stream.flush()
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.start
+        return self.users / elapsed if elapsed else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        return {"users": self.users, "errors": self.errors,
+                "seconds": round(time.perf_counter() - self.start, 3), "users_per_s": round(self.rate(), 1)}
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def _submit(pool: Optional[Executor], lines: Any, cohorts: Optional[CohortStats]) -> Future:
+    fn = run_chunk if cohorts is None else run_chunk_cohorts
+    if pool is not None:
+        return pool.submit(fn, lines)
+    fut: Future = Future()
+    fut.set_result(fn(lines))
+    return fut
+
+def _result(fut: Future, cohorts: Optional[CohortStats]) -> Tuple[bytes, Optional[Dict[str, Any]]]:
+    """The chunk's report lines and, with `cohorts`, its sketch snapshot (merged into `cohorts`)."""
+    if cohorts is None:
+        return fut.result(), None
+    out, snapshot = fut.result()
+    cohorts.merge(CohortStats.from_dict(snapshot))
+    return out, snapshot
+
+def _sketch_path(shard: Path) -> Path:
+    return shard.with_suffix(".cohorts.json")
+
+def _count(result: bytes) -> Tuple[int, int]:
+    return result.count(b"\n"), result.count(b'"status":"error"')
+
+def run_ordered(files: List[Path], out: Path, chunk_size: int, pool: Optional[Executor],
+                max_inflight: int, resume: bool, progress: Progress,
+                cohorts: Optional[CohortStats] = None) -> None:
+    ckpt = out.with_name(out.name + ".ckpt")
+    done, offset = 0, 0
+    if resume and ckpt.exists() and out.exists():
+        state = loads(ckpt.read_bytes())
+        if state["chunk_size"] != chunk_size or state["inputs"] != [str(f) for f in files]:
+            raise SystemExit(f"{ckpt} was written for other inputs or --chunk-size; remove it to start over")
+        done, offset = state["chunks_done"], state["out_bytes"]
+        if cohorts is not None and done:
+            if "cohorts" not in state:
+                raise SystemExit(f"{ckpt} was written without --cohorts, so the users already "
+                                 "reported are not in any sketch; remove it to start over")
+            cohorts.merge(CohortStats.from_dict(state["cohorts"]))
+    mode = "r+b" if done else "wb"
+    with open(out, mode) as f:
+        f.truncate(offset)  # drop whatever a crash left after the last checkpoint
+        f.seek(offset)
+        inflight: "deque[Future]" = deque()
+
+        def drain_one() -> None:
+            nonlocal done
+            result, _ = _result(inflight.popleft(), cohorts)
+            f.write(result)
+            f.flush()
+            os.fsync(f.fileno())
+            done += 1
+            state = {"inputs": [str(p) for p in files], "chunk_size": chunk_size,
+                     "chunks_done": done, "out_bytes": f.tell()}
+            if cohorts is not None:
+                state["cohorts"] = cohorts.to_dict()  # the sketches of exactly the chunks done
+            _write_atomic(ckpt, dumps(state))
+            progress.add(*_count(result))
+
+        for seq, lines in read_chunks(files, chunk_size):
+            if seq < done:
+                continue
+            inflight.append(_submit(pool, lines, cohorts))
+            if len(inflight) >= max_inflight:
+                drain_one()
+        while inflight:
+            drain_one()
+
+def run_sharded(files: List[Path], out_dir: Path, chunk_size: int, pool: Optional[Executor],
+                max_inflight: int, progress: Progress, cohorts: Optional[CohortStats] = None) -> None:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    inflight: Dict[Future, Path] = {}
+
+    def drain(block: bool) -> None:
+        for fut in [f for f in inflight if block or f.done()]:
+            result, snapshot = _result(fut, cohorts)
+            path = inflight.pop(fut)
+            if snapshot is not None:
+                _write_atomic(_sketch_path(path), dumps(snapshot))  # first: a chunk file implies its sketch
+            _write_atomic(path, result)
+            progress.add(*_count(result))
+            if block:
+                return
+
+    for seq, lines in read_chunks(files, chunk_size):
+        path = out_dir / f"shard-{seq:06d}.jsonl"
+        if path.exists():  # finished by an earlier run
+            if cohorts is not None:
+                sketch = _sketch_path(path)
+                if not sketch.exists():
+                    raise SystemExit(f"{path} was written without --cohorts, so its users are not in "
+                                     "any sketch; remove it to recompute it")
+                cohorts.merge(CohortStats.load(str(sketch)))
+            continue
+        inflight[_submit(pool, lines, cohorts)] = path
+        drain(block=False)
+        while len(inflight) >= max_inflight:
+            drain(block=True)
+    while inflight:
+        drain(block=True)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m roma_engine.bulk", description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("inputs", nargs="+", type=Path, help="JSONL files or directories of *.jsonl")
+    dest = ap.add_mutually_exclusive_group(required=True)
+    dest.add_argument("--out", type=Path, help="single JSONL output, in input order")
+    dest.add_argument("--out-dir", type=Path, help="one JSONL file per chunk")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes (0 = run inline)")
+    ap.add_argument("--chunk-size", type=int, default=1000, help="users per run_batch call")
+    ap.add_argument("--resume", action="store_true", help="continue --out from its checkpoint")
+    ap.add_argument("--cohorts", type=Path, help="also save population percentile sketches here")
+    args = ap.parse_args(argv)
+
+    files = input_files(args.inputs)
+    missing = [f for f in files if not f.is_file()]
+    if missing:
+        ap.error(f"no such file: {missing[0]}")
+    progress = Progress()
+    cohorts = CohortStats() if args.cohorts is not None else None
+    pool = (ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(cohorts is not None,))
+            if args.workers > 0 else None)
+    max_inflight = 2 * max(args.workers, 1)
+    try:
+        if args.out is not None:
+            run_ordered(files, args.out, args.chunk_size, pool, max_inflight, args.resume, progress, cohorts)
+        else:
+            run_sharded(files, args.out_dir, args.chunk_size, pool, max_inflight, progress, cohorts)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    sys.stderr.write("\n")
+    if cohorts is not None:
+        cohorts.save(str(args.cohorts))
+    print(dumps(progress.summary()).decode())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
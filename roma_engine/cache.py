@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+def _canon(obj: Any) -> Any:
+    # integral floats collapse to ints (2.0 and 2 give the same report)
+    if isinstance(obj, float):
+        return int(obj) if obj.is_integer() else obj
+    if isinstance(obj, dict):
+        return {str(k): _canon(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_canon(v) for v in obj]
+    return obj
+
+def canonical_key(payload: Any) -> str:
+    """Content hash of a payload: stable key order, normalized floats."""
+    blob = json.dumps(_canon(payload), sort_keys=True, separators=(",", ":"),
+                      ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+class ReportCache:
+    """Thread-safe LRU cache with a TTL for final reports.
+
+    Cached reports are shared between callers and must be treated as
+    read-only.
+    """
+    def __init__(self, max_size: int = 1024, ttl_s: Optional[float] = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self._clock = clock
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value, etag)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["ReportCache"]:
+        """HEALTH_CACHE_SIZE > 0 enables the cache; HEALTH_CACHE_TTL_S (0 = no expiry)."""
+        size = int(os.getenv("HEALTH_CACHE_SIZE", "0") or 0)
+        if size <= 0:
+            return None
+        ttl = float(os.getenv("HEALTH_CACHE_TTL_S", "300") or 0)
+        return cls(max_size=size, ttl_s=ttl or None)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] is not None and item[0] <= self._clock():
+                del self._items[key]
+                self.expirations += 1
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        expires = self._clock() + self.ttl_s if self.ttl_s else None
+        with self._lock:
+            self._items[key] = (expires, value, None)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def etag(self, key: str, make: Callable[[Dict[str, Any]], str]) -> Optional[str]:
+        """HTTP validator of the report cached under `key`, or None when it is not cached.
+
+        `make(report)` runs once per entry and its result is kept with it; a
+        lookup here counts as neither a hit nor a miss.
+        """
+        with self._lock:
+            item = self._items.get(key)
+        if item is None or (item[0] is not None and item[0] <= self._clock()):
+            return None
+        if item[2] is None:
+            tag = make(item[1])
+            with self._lock:
+                if self._items.get(key) is item:
+                    self._items[key] = (item[0], item[1], tag)
+            return tag
+        return item[2]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._items),
+            "max_size": self.max_size,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
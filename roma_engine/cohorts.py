@@ -0,0 +1,340 @@
+import contextvars
+import json
+import math
+import os
+import random
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import accumulate
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Per-day averages only: counts and totals (workouts, minutes) grow with the span a
+# report covers, so users sending 7 and 90 days would not be comparable
+METRICS = ("sleep_avg_h", "steps_avg", "water_avg_l")
+LABELS = {"sleep_avg_h": "Sleep avg", "steps_avg": "Steps avg", "water_avg_l": "Water avg"}
+ALL = "all"
+
+Summary = Tuple[List[float], List[int]]  # sorted values, cumulative weights (leading 0)
+
+_observing: contextvars.ContextVar[bool] = contextvars.ContextVar("health_cohort_observing", default=True)
+
+@contextmanager
+def unobserved() -> Iterator[None]:
+    """Metrics computed in the enclosed work are not added to any CohortStats, e.g.
+    the per-week reports of one user, who would otherwise count once per week."""
+    token = _observing.set(False)
+    try:
+        yield
+    finally:
+        _observing.reset(token)
+
+def _rank(summary: Summary, x: float) -> float:
+    values, cum = summary
+    below = cum[bisect_left(values, x)]
+    equal = cum[bisect_right(values, x)] - below
+    return (below + equal / 2) / cum[-1]
+
+class KLLSketch:
+    """Streaming quantile sketch (Karnin, Lang, Liberty 2016), mergeable.
+
+    Level h holds items of weight 2**h. When the sketch is over its size
+    budget, the lowest full level is sorted and every other item (random
+    offset) is promoted, halving it; upper levels get the larger share of
+    the budget. Rank error is about 1.7/k of n, in O(k log(n/k)) items.
+    Queries run on a sorted (value, cumulative weight) summary that is
+    rebuilt on the first query after an update, then are two binary searches.
+    Not thread-safe; CohortStats locks around it.
+    """
+    def __init__(self, k: int = 200, seed: int = 0):
+        self.k = k
+        self.n = 0
+        self.levels: List[List[float]] = [[]]
+        self._size = 0
+        self._max_size = self._capacity(0)
+        self._rng = random.Random(seed)
+        self._summary: Optional[Summary] = None
+
+    def __len__(self) -> int:
+        return self.n
+
+    def _capacity(self, h: int) -> int:
+        return max(2, math.ceil(self.k * (2 / 3) ** (len(self.levels) - h - 1)))
+
+    def update(self, x: float) -> None:
+        self.levels[0].append(x)
+        self.n += 1
+        self._size += 1
+        self._summary = None
+        if self._size >= self._max_size:
+            self._compress()
+
+    def _compress(self) -> None:
+        while self._size >= self._max_size:
+            for h, level in enumerate(self.levels):
+                if len(level) >= self._capacity(h):
+                    break
+            if h + 1 == len(self.levels):
+                self.levels.append([])
+                self._max_size = sum(self._capacity(i) for i in range(len(self.levels)))
+            level.sort()
+            keep = [level.pop()] if len(level) % 2 else []
+            promoted = level[int(self._rng.random() < 0.5)::2]
+            self.levels[h + 1].extend(promoted)
+            self.levels[h] = keep
+            self._size -= len(level) - len(promoted)
+
+    def merge(self, other: "KLLSketch") -> None:
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for mine, theirs in zip(self.levels, other.levels):
+            mine.extend(theirs)
+        self.n += other.n
+        self._size = sum(len(level) for level in self.levels)
+        self._summary = None
+        self._max_size = sum(self._capacity(h) for h in range(len(self.levels)))
+        self._compress()
+
+    def _sorted(self) -> Summary:
+        if self._summary is None:
+            items = sorted((v, 1 << h) for h, level in enumerate(self.levels) for v in level)
+            self._summary = ([v for v, _ in items], [0, *accumulate(w for _, w in items)])
+        return self._summary
+
+    def summary(self) -> Optional[Summary]:
+        """The sorted summary as of now; an update does not change a summary handed out."""
+        return self._sorted() if self.n else None
+
+    def rank(self, x: float) -> Optional[float]:
+        """Estimated fraction of values below `x`, counting ties as half."""
+        return _rank(self._sorted(), x) if self.n else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.n:
+            return None
+        values, cum = self._sorted()
+        return values[min(len(values) - 1, bisect_right(cum, q * cum[-1]) - 1)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"k": self.k, "n": self.n, "levels": self.levels}
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "KLLSketch":
+        s = cls(k=d["k"])
+        s.n = d["n"]
+        s.levels = [list(level) for level in d["levels"]] or [[]]
+        s._size = sum(len(level) for level in s.levels)
+        s._max_size = sum(s._capacity(h) for h in range(len(s.levels)))
+        return s
+
+def age_band(age: Any) -> Optional[str]:
+    """Band of an age; "unknown" for one that is not a finite number, None when missing."""
+    if age is None:
+        return None
+    try:
+        age = float(age)
+    except (TypeError, ValueError):
+        return "unknown"
+    if not math.isfinite(age):
+        return "unknown"
+    if age < 18:
+        return "<18"
+    if age < 30:
+        return "18-29"
+    return "60+" if age >= 60 else f"{int(age) // 10 * 10}-{int(age) // 10 * 10 + 9}"
+
+def cohort_key(profile: Optional[Dict[str, Any]]) -> Optional[str]:
+    """"30-39/F/fat loss" from a normalized profile; None when age, sex or goal is missing.
+    An age that is not a number ("thirty", NaN) gives the "unknown" band."""
+    if not profile:
+        return None
+    band, sex, goal = age_band(profile.get("age")), profile.get("sex"), profile.get("goal")
+    if band is None or not sex or not goal:
+        return None
+    return f"{band}/{str(sex).strip().upper()[:1]}/{str(goal).strip().lower()}"
+
+class CohortStats:
+    """Population percentiles per metric and cohort (age band, sex, goal).
+
+    Used as DagScheduler middleware: every "metrics" result that is
+    computed (a memoized or cached one is not counted again) adds the
+    user's per-day averages to the sketches of their cohort and of "all",
+    except inside `unobserved()`. An observation identical to one among the
+    last `dedupe_window` (same profile and averages, e.g. a dashboard polling
+    one payload with no cache) is not counted again; a user whose data
+    changed is.
+    `standing` places a user within their cohort, or within "all" while the
+    cohort has fewer than `min_count` users; HealthRunner puts it in the
+    report's week_summary. Sketches live in this process; snapshots
+    (`to_dict`, `save`) from other processes are combined with `merge`, e.g.
+    the cohorts `roma_engine.bulk --cohorts` builds over its worker pool.
+
+    `standing` reads a snapshot of sorted summaries, not the live sketches:
+    every report observes, which would otherwise re-sort the summaries on
+    each lookup. The snapshot is rebuilt once `refresh_every` observations
+    or `refresh_s` seconds (with new observations) have passed, and right
+    after a `merge` or `clear`; in between a lookup is binary searches only.
+    """
+    def __init__(self, k: int = 200, min_count: int = 30, refresh_every: int = 1000,
+                 refresh_s: float = 5.0, dedupe_window: int = 100_000):
+        self.k = k
+        self.min_count = min_count
+        self.refresh_every = refresh_every
+        self.refresh_s = refresh_s
+        self.dedupe_window = dedupe_window
+        self._lock = threading.Lock()
+        self._sketches: Dict[str, Dict[str, KLLSketch]] = {}  # cohort -> metric -> sketch
+        self._users: Dict[str, int] = {}
+        self._seen: "OrderedDict[int, None]" = OrderedDict()  # hashes of recent observations
+        self.observed = 0
+        self.repeats = 0
+        # cohort -> (users, metric -> summary), as of `_snapshot_observed` observations
+        self._snapshot: Optional[Dict[str, Tuple[int, Dict[str, Summary]]]] = None
+        self._snapshot_observed = 0
+        self._snapshot_at = 0.0
+        self.rebuilds = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["CohortStats"]:
+        """HEALTH_COHORTS=1 enables it; HEALTH_COHORTS_PATH (implies enabled) seeds it
+        from a saved snapshot if the file exists; HEALTH_COHORTS_MIN sets `min_count`."""
+        path = os.getenv("HEALTH_COHORTS_PATH")
+        if os.getenv("HEALTH_COHORTS", "0") != "1" and not path:
+            return None
+        stats = cls(min_count=int(os.getenv("HEALTH_COHORTS_MIN", "30")))
+        if path and os.path.exists(path):
+            stats.merge(cls.load(path))
+        return stats
+
+    def _observe(self, cohort: str, metrics: Dict[str, Any]) -> None:
+        sketches = self._sketches.get(cohort)
+        if sketches is None:
+            sketches = self._sketches[cohort] = {m: KLLSketch(self.k) for m in METRICS}
+        self._users[cohort] = self._users.get(cohort, 0) + 1
+        for m in METRICS:
+            v = metrics.get(m)
+            if v is not None and math.isfinite(v):
+                sketches[m].update(v)
+
+    def observe(self, profile: Optional[Dict[str, Any]], metrics: Dict[str, Any]) -> None:
+        cohort = cohort_key(profile)
+        if cohort is None:
+            return
+        seen = hash((json.dumps(profile, sort_keys=True, default=str), *(metrics.get(m) for m in METRICS)))
+        with self._lock:
+            if self.dedupe_window:
+                if seen in self._seen:
+                    self._seen.move_to_end(seen)
+                    self.repeats += 1
+                    return
+                self._seen[seen] = None
+                if len(self._seen) > self.dedupe_window:
+                    self._seen.popitem(last=False)
+            self._observe(cohort, metrics)
+            self._observe(ALL, metrics)
+            self.observed += 1
+
+    def __call__(self, stage: str, call_next: Callable, payload: Any) -> Any:
+        result = call_next(payload)
+        if stage == "metrics" and _observing.get():
+            if isinstance(payload, list):  # MetricsAgent.run_batch
+                for p, r in zip(payload, result):
+                    self.observe(p.get("normalized_profile"), r["metrics"])
+            else:
+                self.observe(payload.get("normalized_profile"), result["metrics"])
+        return result
+
+    def _current_snapshot(self) -> Dict[str, Tuple[int, Dict[str, Summary]]]:
+        with self._lock:
+            snap, new = self._snapshot, self.observed - self._snapshot_observed
+            if snap is None or new >= self.refresh_every or (
+                    new and time.monotonic() - self._snapshot_at >= self.refresh_s):
+                snap = self._snapshot = {
+                    cohort: (self._users[cohort], {m: sk.summary() for m, sk in sketches.items() if sk.n})
+                    for cohort, sketches in self._sketches.items()
+                }
+                self._snapshot_observed = self.observed
+                self._snapshot_at = time.monotonic()
+                self.rebuilds += 1
+            return snap
+
+    def standing(self, profile: Optional[Dict[str, Any]], metrics: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Percentile (0-100, higher = more than peers) of each metric within the
+        user's cohort, as of the last snapshot; None until enough users have been seen."""
+        cohort = cohort_key(profile)
+        if cohort is None:
+            return None
+        snap = self._current_snapshot()
+        if snap.get(cohort, (0,))[0] < self.min_count:
+            cohort = ALL
+            if snap.get(ALL, (0,))[0] < self.min_count:
+                return None
+        users, summaries = snap[cohort]
+        pct = {m: round(100 * _rank(summaries[m], metrics[m]))
+               for m in METRICS if metrics.get(m) is not None and m in summaries}
+        scope = "all users" if cohort == ALL else "your cohort"
+        return {
+            "cohort": cohort,
+            "users": users,
+            "percentiles": pct,
+            "highlights": [f"{LABELS[m]} in the top {max(1, 100 - p)}% of {scope}"
+                           for m, p in pct.items() if p >= 80],
+        }
+
+    def merge(self, other: "CohortStats") -> None:
+        with self._lock:
+            for cohort, sketches in other._sketches.items():
+                mine = self._sketches.setdefault(cohort, {m: KLLSketch(self.k) for m in METRICS})
+                for m, s in sketches.items():
+                    mine[m].merge(s)
+                self._users[cohort] = self._users.get(cohort, 0) + other._users.get(cohort, 0)
+            self.observed += other.observed
+            self._snapshot = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._sketches.clear()
+            self._users.clear()
+            self._seen.clear()
+            self.observed = 0
+            self._snapshot = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "k": self.k,
+                "observed": self.observed,
+                "cohorts": {c: {"users": self._users[c], "metrics": {m: s.to_dict() for m, s in sk.items()}}
+                            for c, sk in self._sketches.items()},
+            }
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "CohortStats":
+        stats = cls(k=d["k"])
+        stats.observed = d["observed"]
+        for c, entry in d["cohorts"].items():
+            stats._users[c] = entry["users"]
+            stats._sketches[c] = {m: KLLSketch.from_dict(s) for m, s in entry["metrics"].items()}
+        return stats
+
+    def save(self, path: str) -> None:
+        tmp = Path(path + ".tmp")
+        tmp.write_text(json.dumps(self.to_dict()))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CohortStats":
+        return cls.from_dict(json.loads(Path(path).read_text()))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "cohorts": len(self._sketches) - (ALL in self._sketches),
+                "observed": self.observed,
+                "repeats": self.repeats,
+                "sketch_items": sum(s._size for sk in self._sketches.values() for s in sk.values()),
+                "snapshot_rebuilds": self.rebuilds,
+            }
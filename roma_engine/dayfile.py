@@ -0,0 +1,249 @@
+"""Memory-mapped, fixed-width binary format for normalized users and days.
+
+    python -m roma_engine.dayfile users.jsonl users.rhd      # convert JSONL payloads
+
+Layout (little-endian, every section 8-byte aligned):
+
+    file header   magic "RHDAYS01", u64 n_users, u64 index offset
+    user blocks   one per user, see below
+    index         n_users x (u64 block offset, u64 block length)
+
+    user block    u32 n_days, n_workouts, meta_len, notes_len, logged[5]
+                  meta        JSON: status, missing_fields, profile, targets,
+                              user_id, workout type names, raw dates
+                  dates       i32 x n_days (proleptic ordinal, 0 = no date; a date
+                              that is not ISO is undated, as in DayColumns.by_date)
+                  values      f64 x n_days, one column per field in FIELDS
+                  w_offsets   i64 x (n_days + 1)
+                  w_minutes   i64 x n_workouts
+                  w_intensity i64 x n_workouts
+                  missing map u8 x n_days per field (0 missing, 1 float, 2 int)
+                  w_types     u16 x n_workouts (index into meta workout types)
+                  notes       u32 x (n_days + 1) offsets, then the UTF-8 blob
+
+A date that does not read back from its ordinal (not ISO, e.g. "yesterday",
+or not in YYYY-MM-DD form) is also kept as given in meta "raw_dates"
+(day index -> date), so reports from a DayFile equal those from its JSONL.
+
+The missing map is a byte per day rather than a bit so the agents' C-level
+`compress`/`zip` passes consume it as is. `DayFile` maps the file and
+hands out `MappedColumns`: DayColumns whose arrays are memoryviews into
+the map, so MetricsAgent and CoachAgent read the file with zero copies.
+"""
+import json
+import mmap
+import struct
+import sys
+from collections.abc import Sequence
+from datetime import date
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional
+from roma_agents.columns import FIELDS, DayColumns
+from roma_agents.ingestor import IngestorAgent
+
+MAGIC = b"RHDAYS01"
+_FILE = struct.Struct("<8sQQ")
+_USER = struct.Struct(f"<4I{len(FIELDS)}I")
+_INDEX = struct.Struct("<QQ")
+
+def _pad(n: int) -> int:
+    return -n % 8
+
+class _Lazy(Sequence):
+    """Read-only sequence of `decode(x)` for x in `source`, decoded on access."""
+    __slots__ = ("_source", "_decode")
+
+    def __init__(self, source: Sequence, decode: Callable[[Any], Any]):
+        self._source = source
+        self._decode = decode
+
+    def __len__(self) -> int:
+        return len(self._source)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return list(map(self._decode, self._source[i]))
+        return self._decode(self._source[i])
+
+    def __iter__(self):
+        return map(self._decode, self._source)
+
+class MappedColumns(DayColumns):
+    """DayColumns over one user block of a mapped DayFile (read-only)."""
+    __slots__ = ("_logged",)
+
+    def __init__(self, dates, notes, values, mask, w_offsets, w_types, w_minutes, w_intensity, logged):
+        self.dates, self.notes, self.values, self.mask = dates, notes, values, mask
+        self.w_offsets, self.w_types, self.w_minutes, self.w_intensity = w_offsets, w_types, w_minutes, w_intensity
+        self._logged = logged
+
+    def logged(self, field: str) -> int:
+        return self._logged[field]
+
+    def append_row(self, row, missing=None):
+        raise TypeError("MappedColumns are read-only")
+
+@lru_cache(maxsize=1 << 16)  # a bulk file repeats the same calendar days across users
+def _iso(ordinal: int) -> Optional[str]:
+    return date.fromordinal(ordinal).isoformat() if ordinal else None
+
+def encode_user(ingested: Dict[str, Any], user_id: Any = None) -> bytes:
+    """One user block from an `IngestorAgent.run` result."""
+    cols: DayColumns = ingested["normalized_logs"]
+    n, w = len(cols), len(cols.w_minutes)
+    types = sorted(set(cols.w_types))
+    type_idx = {t: k for k, t in enumerate(types)}
+    ordinals = cols.ordinals()
+    raw_dates = {i: d for i, (d, o) in enumerate(zip(cols.dates, ordinals)) if d is not None and _iso(o) != d}
+    meta = json.dumps({
+        "status": ingested["status"],
+        "missing_fields": ingested["missing_fields"],
+        "profile": ingested["normalized_profile"],
+        "targets": ingested["normalized_targets"],
+        "user_id": user_id,
+        "workout_types": types,
+        "raw_dates": raw_dates,
+    }).encode("utf-8")
+    notes = [s.encode("utf-8") for s in cols.notes]
+    note_offsets, pos = [0], 0
+    for s in notes:
+        pos += len(s)
+        note_offsets.append(pos)
+
+    parts = [_USER.pack(n, w, len(meta), pos, *(cols.logged(f) for f in FIELDS))]
+    def section(data: bytes) -> None:
+        parts.append(data)
+        parts.append(b"\0" * _pad(len(data)))
+    parts.append(b"\0" * _pad(_USER.size))
+    section(meta)
+    section(struct.pack(f"<{n}i", *ordinals))
+    for f in FIELDS:
+        section(struct.pack(f"<{n}d", *cols.values[f]))
+    section(struct.pack(f"<{n + 1}q", *cols.w_offsets))
+    section(struct.pack(f"<{w}q", *cols.w_minutes))
+    section(struct.pack(f"<{w}q", *cols.w_intensity))
+    for f in FIELDS:
+        section(bytes(cols.mask[f]))
+    section(struct.pack(f"<{w}H", *(type_idx[t] for t in cols.w_types)))
+    section(struct.pack(f"<{n + 1}I", *note_offsets))
+    section(b"".join(notes))
+    return b"".join(parts)
+
+def write_dayfile(path: str, payloads: Iterable[Dict[str, Any]]) -> int:
+    """Normalize `payloads` (the /weekly-report shape) into a DayFile; returns the user count."""
+    ingest = IngestorAgent()
+    index = []
+    with open(path, "wb") as f:
+        f.write(_FILE.pack(MAGIC, 0, 0))
+        for p in payloads:
+            block = encode_user(ingest.run(p), p.get("user_id"))
+            index.append((f.tell(), len(block)))
+            f.write(block)
+        index_offset = f.tell()
+        f.write(b"".join(_INDEX.pack(*e) for e in index))
+        f.seek(0)
+        f.write(_FILE.pack(MAGIC, len(index), index_offset))
+    return len(index)
+
+class DayFile(Sequence):
+    """A DayFile mapped read-only; item i is user i in `IngestorAgent.run` result shape.
+
+    The returned `normalized_logs` are views into the map: keep the
+    DayFile open while they are in use.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        magic, n, index_offset = _FILE.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a day file")
+        self._index = self._view[index_offset:index_offset + n * _INDEX.size].cast("Q")
+
+    def __len__(self) -> int:
+        return len(self._index) // 2
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("user index out of range")
+        return self._decode(self._index[2 * i])
+
+    def _decode(self, base: int) -> Dict[str, Any]:
+        view = self._view
+        n, w, meta_len, notes_len, *logged = _USER.unpack_from(view, base)
+        pos = base + _USER.size + _pad(_USER.size)
+
+        def take(size: int, fmt: Optional[str] = None):
+            nonlocal pos
+            v = view[pos:pos + size]
+            pos += size + _pad(size)
+            return v.cast(fmt) if fmt else v
+
+        meta = json.loads(bytes(take(meta_len)))
+        dates = take(4 * n, "i")
+        values = {f: take(8 * n, "d") for f in FIELDS}
+        w_offsets = take(8 * (n + 1), "q")
+        w_minutes = take(8 * w, "q")
+        w_intensity = take(8 * w, "q")
+        mask = {f: take(n, "B") for f in FIELDS}
+        w_types = take(2 * w, "H")
+        note_offsets = take(4 * (n + 1), "I")
+        notes = take(notes_len)
+        names = meta["workout_types"]
+        raw = {int(i): d for i, d in meta.get("raw_dates", {}).items()}
+        cols = MappedColumns(
+            _Lazy(range(n), lambda i: raw[i] if i in raw else _iso(dates[i])) if raw else _Lazy(dates, _iso),
+            _Lazy(range(n), lambda i: str(notes[note_offsets[i]:note_offsets[i + 1]], "utf-8")),
+            values, mask, w_offsets,
+            _Lazy(w_types, names.__getitem__),
+            w_minutes, w_intensity,
+            dict(zip(FIELDS, logged)),
+        )
+        return {
+            "status": meta["status"],
+            "missing_fields": meta["missing_fields"],
+            "normalized_profile": meta["profile"],
+            "normalized_logs": cols,
+            "normalized_targets": meta["targets"],
+            "user_id": meta["user_id"],
+        }
+
+    def close(self) -> None:
+        """Release the map; fails with BufferError while mapped columns are still referenced."""
+        self._index.release()
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "DayFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 2:
+        print(__doc__.splitlines()[2].strip(), file=sys.stderr)
+        return 2
+    src, dst = argv
+
+    def payloads():
+        with open(src, "rb") as f:
+            for k, line in enumerate(f, 1):
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError as e:
+                        raise SystemExit(f"{src}:{k}: {e}")
+    n = write_dayfile(dst, payloads())
+    print(f"{n} users -> {dst}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+import asyncio
+import contextvars
+import os
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+class Overloaded(RuntimeError):
+    """Raised when the pool's pending-request limit is reached."""
+
+# Methods that read/write per-process HealthRunner state (sessions, the history store's
+# connection); never shipped to a process pool
+_STATEFUL = {"upsert_day", "save_history", "report_history"}
+
+_worker_runner = None
+
+def _init_worker() -> None:
+    global _worker_runner
+    from roma_engine.budgets import StageBudgets
+    from roma_engine.cache import ReportCache
+    from roma_engine.cohorts import CohortStats
+    from roma_engine.instrumentation import Instrumentation
+    from roma_engine.memo import NodeMemo
+    from roma_engine.runner import HealthRunner
+    from roma_engine.scheduler import DagScheduler
+    _worker_runner = HealthRunner(cache=ReportCache.from_env(), memo=NodeMemo.from_env(),
+                                  cohorts=CohortStats.from_env(), budgets=StageBudgets.from_env(),
+                                  instrumentation=Instrumentation.from_env(keep_samples=True),
+                                  max_workers=DagScheduler.workers_from_env())
+
+def _call_worker(method: str, args: tuple, left: Optional[float] = None) -> Any:
+    """(result, stage samples); on failure the samples ride on the exception."""
+    from roma_engine.budgets import deadline
+    inst = _worker_runner.instrumentation
+    try:
+        # the caller's deadline arrives as seconds left: a context variable does not cross processes
+        with deadline(left):
+            out = getattr(_worker_runner, method)(*args)
+    except Exception as e:
+        e.stage_samples = inst.take_samples() if inst is not None else []
+        raise
+    return out, inst.take_samples() if inst is not None else []
+
+class RunnerPool:
+    """Run HealthRunner methods off the event loop with bounded concurrency.
+
+    mode "thread" uses a thread pool sharing `runner`; "process" uses a
+    process pool with one HealthRunner per worker (stateful methods still
+    run on a thread against `runner`, as do requests being profiled);
+    "inline" calls `runner` directly on the loop. Calls run in a copy of
+    the caller's context (a process worker gets its deadline); a process
+    worker's stage timings are recorded in `runner.instrumentation` when it
+    finishes. At most `max_pending` calls may be running or queued; beyond
+    that `call` raises Overloaded. A call waiting longer than `timeout_s`
+    raises asyncio.TimeoutError, but still counts as pending until its
+    worker actually finishes.
+    """
+    def __init__(self, runner: Any, mode: str = "thread", max_workers: int = 4,
+                 max_pending: int = 64, timeout_s: Optional[float] = 30.0):
+        if mode not in ("inline", "thread", "process"):
+            raise ValueError(f"unknown execution mode {mode!r}")
+        self.runner = runner
+        self.mode = mode
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout_s = timeout_s
+        self._executor: Optional[Executor] = None
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    @classmethod
+    def from_env(cls, runner: Any) -> "RunnerPool":
+        """HEALTH_EXEC_MODE, HEALTH_EXEC_WORKERS, HEALTH_EXEC_MAX_PENDING, HEALTH_EXEC_TIMEOUT_S (0 = none)."""
+        timeout = float(os.getenv("HEALTH_EXEC_TIMEOUT_S", "30") or 0)
+        return cls(
+            runner,
+            mode=os.getenv("HEALTH_EXEC_MODE", "thread"),
+            max_workers=int(os.getenv("HEALTH_EXEC_WORKERS", "4")),
+            max_pending=int(os.getenv("HEALTH_EXEC_MAX_PENDING", "64")),
+            timeout_s=timeout or None,
+        )
+
+    def _thread_pool(self) -> ThreadPoolExecutor:
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(self.max_workers, thread_name_prefix="health-runner")
+        return self._threads
+
+    def _submit(self, method: str, args: tuple) -> Tuple[Future, bool]:
+        """The call's future, and whether it runs in a worker process."""
+        if self.mode == "process" and method not in _STATEFUL:
+            # imported here: thread mode never needs them (nor multiprocessing), so app.py
+            # starts without them
+            from roma_engine.budgets import remaining
+            from roma_engine.profiling import current_session
+            # a profiled request stays in this process so its stages land in this profiler
+            if current_session() is None:
+                if self._executor is None:
+                    from concurrent.futures import ProcessPoolExecutor
+                    self._executor = ProcessPoolExecutor(self.max_workers, initializer=_init_worker)
+                cf = self._executor.submit(_call_worker, method, args, remaining())
+                cf.add_done_callback(self._record_worker)
+                return cf, True
+        ctx = contextvars.copy_context()
+        return self._thread_pool().submit(ctx.run, getattr(self.runner, method), *args), False
+
+    def _record_worker(self, cf: Future) -> None:
+        # also runs for calls the caller stopped waiting for, so /metrics still sees them
+        inst = getattr(self.runner, "instrumentation", None)
+        if inst is None or cf.cancelled():
+            return
+        e = cf.exception()
+        inst.record_samples(getattr(e, "stage_samples", []) if e is not None else cf.result()[1])
+
+    async def call(self, method: str, *args: Any) -> Any:
+        if self.mode == "inline":
+            return getattr(self.runner, method)(*args)
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded(f"{self.pending} requests pending")
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        cf, remote = self._submit(method, args)
+        cf.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        try:
+            out = await asyncio.wait_for(asyncio.wrap_future(cf), self.timeout_s)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        return out[0] if remote else out
+
+    def _release(self) -> None:
+        self.pending -= 1
+        self.completed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "timeout_s": self.timeout_s,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+    def shutdown(self) -> None:
+        for ex in (self._executor, self._threads):
+            if ex is not None:
+                ex.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._threads = None
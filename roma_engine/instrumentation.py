@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (1, 7, 14, 31, 90, 180, 365, 730, 1825, 3650)
+
+class Histogram:
+    """Fixed-bucket histogram; `counts[i]` is non-cumulative, last slot is +Inf."""
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v: float) -> None:
+        self.counts[bisect_left(self.buckets, v)] += 1
+        self.sum += v
+        self.count += 1
+
+    def lines(self, name: str, labels: str) -> List[str]:
+        out, acc = [], 0
+        for le, n in zip(self.buckets + ("+Inf",), self.counts):
+            acc += n
+            out.append(f'{name}_bucket{{{labels},le="{le}"}} {acc}')
+        out.append(f"{name}_sum{{{labels}}} {self.sum}")
+        out.append(f"{name}_count{{{labels}}} {self.count}")
+        return out
+
+def input_sizes(payload: Any) -> Tuple[int, int]:
+    """(days, workouts) carried by an agent payload, or a list of payloads."""
+    if isinstance(payload, list):
+        sizes = [input_sizes(p) for p in payload]
+        return sum(d for d, _ in sizes), sum(w for _, w in sizes)
+    logs = payload.get("normalized_logs")
+    if logs is None:
+        logs = payload.get("daily_logs") or []
+    w_minutes = getattr(logs, "w_minutes", None)
+    if w_minutes is not None:
+        return len(logs), len(w_minutes)
+    return len(logs), sum(len(d.get("workouts") or []) for d in logs if isinstance(d, dict))
+
+class Instrumentation:
+    """Per-agent latency histograms, call/error counts and input sizes.
+
+    Used as DagScheduler middleware around every agent call and rendered in
+    the Prometheus text format. Stats of other components (cache, pool) can
+    be attached with `register`; their numeric values become gauges. With
+    `keep_samples` every call is also kept as a sample until `take_samples`,
+    so a process-pool worker can hand its stage timings to the parent, which
+    records them with `record_samples`.
+    """
+    def __init__(self, keep_samples: bool = False):
+        self._lock = threading.Lock()
+        self.samples: Optional[List[Tuple[str, float, int, int, bool]]] = [] if keep_samples else None
+        self.latency: Dict[str, Histogram] = {}
+        self.days: Dict[str, Histogram] = {}
+        self.workouts: Dict[str, Histogram] = {}
+        self.calls: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self._collectors: List[Tuple[str, Callable[[], Dict[str, Any]]]] = []
+
+    @classmethod
+    def from_env(cls, keep_samples: bool = False) -> Optional["Instrumentation"]:
+        """On unless HEALTH_METRICS=0; when off nothing wraps the agents at all."""
+        return None if os.getenv("HEALTH_METRICS", "1") == "0" else cls(keep_samples)
+
+    def register(self, prefix: str, stats: Callable[[], Dict[str, Any]]) -> None:
+        self._collectors.append((prefix, stats))
+
+    def __call__(self, stage: str, call_next: Callable, payload: Any) -> Any:
+        t0, failed = time.perf_counter(), True
+        try:
+            out = call_next(payload)
+            failed = False
+            return out
+        finally:
+            dt = time.perf_counter() - t0
+            days, workouts = input_sizes(payload) if isinstance(payload, (dict, list)) else (0, 0)
+            self.record_samples([(stage, dt, days, workouts, failed)])
+
+    def record_samples(self, samples: List[Tuple[str, float, int, int, bool]]) -> None:
+        """Record (stage, seconds, days, workouts, failed) calls, e.g. ones a worker took."""
+        with self._lock:
+            for stage, dt, days, workouts, failed in samples:
+                if stage not in self.latency:
+                    self.latency[stage] = Histogram(LATENCY_BUCKETS)
+                    self.days[stage] = Histogram(SIZE_BUCKETS)
+                    self.workouts[stage] = Histogram(SIZE_BUCKETS)
+                self.latency[stage].observe(dt)
+                self.days[stage].observe(days)
+                self.workouts[stage].observe(workouts)
+                self.calls[stage] = self.calls.get(stage, 0) + 1
+                if failed:
+                    self.errors[stage] = self.errors.get(stage, 0) + 1
+            if self.samples is not None:
+                self.samples.extend(samples)
+
+    def take_samples(self) -> List[Tuple[str, float, int, int, bool]]:
+        """The samples kept since the last call (`keep_samples` only)."""
+        with self._lock:
+            out = self.samples or []
+            if self.samples is not None:
+                self.samples = []
+        return out
+
+    def render(self) -> str:
+        """Prometheus text exposition (format 0.0.4)."""
+        with self._lock:
+            stages = sorted(self.latency)
+            out = [
+                "# HELP health_agent_calls_total Agent run() calls.",
+                "# TYPE health_agent_calls_total counter",
+            ]
+            out += [f'health_agent_calls_total{{agent="{s}"}} {self.calls.get(s, 0)}' for s in stages]
+            out += [
+                "# HELP health_agent_errors_total Agent run() calls that raised.",
+                "# TYPE health_agent_errors_total counter",
+            ]
+            out += [f'health_agent_errors_total{{agent="{s}"}} {self.errors.get(s, 0)}' for s in stages]
+            for name, help_, hists in (
+                ("health_agent_latency_seconds", "Agent run() latency.", self.latency),
+                ("health_agent_input_days", "Days in the agent's input.", self.days),
+                ("health_agent_input_workouts", "Workouts in the agent's input.", self.workouts),
+            ):
+                out += [f"# HELP {name} {help_}", f"# TYPE {name} histogram"]
+                for s in stages:
+                    out += hists[s].lines(name, f'agent="{s}"')
+        for prefix, stats in self._collectors:
+            for k, v in stats().items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    out += [f"# TYPE health_{prefix}_{k} gauge", f"health_{prefix}_{k} {v}"]
+        return "\n".join(out) + "\n"
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import pickle
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+
+def fingerprint(obj: Any) -> Optional[bytes]:
+    """Content hash of an agent input, or None when it cannot be serialized.
+
+    Built on pickle rather than JSON: it is as fast as orjson, keeps NaN,
+    -0.0, ints, floats and bools apart, and handles DayColumns' typed
+    arrays. Equal fingerprints mean equal inputs, including key order;
+    structurally equal inputs may still hash differently (a miss, never a
+    wrong hit).
+    """
+    try:
+        blob = pickle.dumps(obj, protocol=5)
+    except Exception:  # e.g. columns backed by a memoryview of a mapped DayFile
+        return None
+    return hashlib.blake2b(blob, digest_size=16).digest()
+
+def combine(*parts: Union[bytes, str, None]) -> Optional[bytes]:
+    """Fingerprint of a sequence of fingerprints/labels; None if any part is None."""
+    h = hashlib.blake2b(digest_size=16)
+    for p in parts:
+        if p is None:
+            return None
+        if isinstance(p, str):
+            p = p.encode("utf-8")
+        h.update(len(p).to_bytes(4, "little"))
+        h.update(p)
+    return h.digest()
+
+class NodeMemo:
+    """Thread-safe LRU of agent results keyed by (node, input fingerprint).
+
+    DagScheduler consults it before running a node, so a stage runs again
+    only when one of its own inputs changed. Agents may also use it for
+    part of their work (IngestorAgent memoizes its log parse). Memoized
+    results are shared between requests and must be treated as read-only.
+    """
+    fingerprint = staticmethod(fingerprint)  # for agents, which do not import roma_engine
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._items: "OrderedDict[Tuple[str, bytes], Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nodes: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_env(cls) -> Optional["NodeMemo"]:
+        """HEALTH_MEMO_SIZE > 0 enables per-node memoization (entries across all nodes)."""
+        size = int(os.getenv("HEALTH_MEMO_SIZE", "0") or 0)
+        return cls(max_size=size) if size > 0 else None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, node: str, key: bytes) -> Optional[Any]:
+        with self._lock:
+            counts = self.nodes.setdefault(node, {"hits": 0, "misses": 0})
+            value = self._items.get((node, key))
+            if value is None:
+                self.misses += 1
+                counts["misses"] += 1
+                return None
+            self._items.move_to_end((node, key))
+            self.hits += 1
+            counts["hits"] += 1
+            return value
+
+    def put(self, node: str, key: bytes, value: Any) -> None:
+        with self._lock:
+            self._items[(node, key)] = value
+            self._items.move_to_end((node, key))
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, node: Optional[str] = None) -> None:
+        """Drop every entry, or only those of `node` (e.g. after its agent was replaced)."""
+        with self._lock:
+            if node is None:
+                self._items.clear()
+            else:
+                for k in [k for k in self._items if k[0] == node or k[0].startswith(node + ".")]:
+                    del self._items[k]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "nodes": {n: dict(c) for n, c in self.nodes.items()},
+            }
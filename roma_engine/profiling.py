@@ -0,0 +1,143 @@
+import contextvars
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+_session: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar("health_profile", default=None)
+
+def current_session() -> Optional["ProfileSession"]:
+    """The profile session of the current request, if it is being profiled."""
+    return _session.get()
+
+class ProfileSession:
+    """One profiled request: per-stage timings, peak memory and top functions."""
+    def __init__(self, id: int, label: str):
+        self.id = id
+        self.label = label
+        self.ts = time.time()
+        self.total_s: Optional[float] = None
+        self.stages: List[Dict[str, Any]] = []
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "label": self.label,
+            "ts": self.ts,
+            "total_s": self.total_s,
+            "stages": [{k: v for k, v in s.items() if k != "top"} for s in self.stages],
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**self.summary(), "stages": self.stages}
+
+class Profiler:
+    """Opt-in per-request profiling of agent stages.
+
+    A request is profiled when asked for (`session(force=True)`, e.g. from a
+    request header) or sampled at `sample_rate`. Used as DagScheduler
+    middleware: while a session is active, every agent call runs under
+    cProfile with tracemalloc tracking its peak allocation. Profiled stages
+    are serialized on a lock since tracemalloc is process wide; unprofiled
+    requests never take it, but memory they allocate meanwhile on other
+    threads can show up in a profiled stage's peak. Finished sessions go to
+    an in-memory ring buffer of the last `capacity` requests.
+    """
+    def __init__(self, sample_rate: float = 0.0, capacity: int = 100, top: int = 25):
+        self.sample_rate = sample_rate
+        self.capacity = capacity
+        self.top = top
+        self._ring: "deque[ProfileSession]" = deque(maxlen=capacity)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stage_lock = threading.Lock()
+        self.sessions = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["Profiler"]:
+        """HEALTH_PROFILE=1 (header-triggered) and/or HEALTH_PROFILE_RATE>0 enable it;
+        HEALTH_PROFILE_BUFFER sizes the ring buffer."""
+        rate = float(os.getenv("HEALTH_PROFILE_RATE", "0") or 0)
+        if os.getenv("HEALTH_PROFILE", "0") != "1" and rate <= 0:
+            return None
+        return cls(sample_rate=rate, capacity=int(os.getenv("HEALTH_PROFILE_BUFFER", "100")))
+
+    def sampled(self, force: bool = False) -> bool:
+        return force or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @contextmanager
+    def session(self, label: str, force: bool = False) -> Iterator[Optional[ProfileSession]]:
+        """Profile the enclosed work when forced or sampled; yields the session or None.
+
+        Nested use (a session is already active) joins the outer session.
+        """
+        active = _session.get()
+        if active is not None or not self.sampled(force):
+            yield active
+            return
+        s = ProfileSession(next(self._ids), label)
+        token = _session.set(s)
+        t0 = time.perf_counter()
+        try:
+            yield s
+        finally:
+            s.total_s = time.perf_counter() - t0
+            _session.reset(token)
+            with self._lock:
+                self._ring.append(s)
+                self.sessions += 1
+
+    def __call__(self, stage: str, call_next: Callable, payload: Any) -> Any:
+        s = _session.get()
+        if s is None:
+            return call_next(payload)
+        # imported on first use: the app imports this module at startup
+        import cProfile
+        import tracemalloc
+        with self._stage_lock:
+            prof = cProfile.Profile()
+            started = not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            t0 = time.perf_counter()
+            prof.enable()
+            try:
+                return call_next(payload)
+            finally:
+                prof.disable()
+                dt = time.perf_counter() - t0
+                peak = tracemalloc.get_traced_memory()[1] - base
+                if started:
+                    tracemalloc.stop()
+                s.stages.append({"stage": stage, "seconds": dt, "peak_bytes": peak, "top": self._top(prof)})
+
+    def _top(self, prof: Any) -> List[Dict[str, Any]]:
+        import pstats
+        stats = pstats.Stats(prof).stats
+        rows = sorted(stats.items(), key=lambda kv: kv[1][3], reverse=True)[:self.top]
+        return [
+            {"func": f"{file}:{line}({name})", "ncalls": nc, "tottime": tt, "cumtime": ct}
+            for (file, line, name), (_, nc, tt, ct, _) in rows
+        ]
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Summaries of the buffered sessions, newest first."""
+        with self._lock:
+            return [s.summary() for s in reversed(self._ring)]
+
+    def get(self, id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for s in self._ring:
+                if s.id == id:
+                    return s.to_dict()
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"sample_rate": self.sample_rate, "capacity": self.capacity,
+                "buffered": len(self._ring), "sessions": self.sessions}
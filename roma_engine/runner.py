@@ -1,68 +1,346 @@
-from typing import Any, Dict
+import math
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from roma_agents.columns import DayColumns, date_ordinal
 from roma_agents.ingestor import IngestorAgent
-from roma_agents.metrics import MetricsAgent
+from roma_agents.metrics import LogAggregatesAgent, MetricsAgent
 from roma_agents.coach import CoachAgent
 from roma_agents.reporter import ReporterAgent
+from roma_agents.trends import TrendsAgent
+from roma_engine.budgets import StageBudgets, deadline
+from roma_engine.cache import ReportCache, canonical_key
+from roma_engine.cohorts import CohortStats, unobserved
+from roma_engine.instrumentation import Instrumentation
+from roma_engine.memo import NodeMemo
+from roma_engine.profiling import Profiler
+from roma_engine.scheduler import DagScheduler
+from roma_engine.sessions import SessionStore
+from roma_engine.store import HistoryStore
+from roma_engine.streaming import ReportStream
 
 class HealthPlanner:
     """Break the top-level task into dependent subtasks."""
-    def plan(self, root_payload: Dict[str, Any]) -> Dict[str, Any]:
-        return {
-            "ingest": {"depends_on": [], "payload": root_payload},
-            "metrics": {"depends_on": ["ingest"]},
-            "coach": {"depends_on": ["ingest", "metrics"]},
-            "report": {"depends_on": ["metrics", "coach"]},
+    def __init__(self):
+        self.nodes: Dict[str, List[str]] = {
+            "ingest": [],
+            "aggregates": ["ingest"],
+            "metrics": ["ingest", "aggregates"],
+            "coach": ["ingest", "metrics"],
+            "report": ["metrics", "coach"],
+        }
+        # planned only when asked for (e.g. "include_trends" in the payload)
+        self.optional: Dict[str, List[str]] = {
+            "trends": ["ingest"],
         }
 
+    def add(self, name: str, depends_on: List[str]) -> None:
+        self.nodes[name] = list(depends_on)
+
+    def _nodes(self, extras: Iterable[str]) -> Dict[str, Any]:
+        plan = {name: {"depends_on": deps} for name, deps in self.nodes.items()}
+        for name in extras:
+            plan[name] = {"depends_on": self.optional[name]}
+        return plan
+
+    def plan(self, root_payload: Dict[str, Any], extras: Iterable[str] = ()) -> Dict[str, Any]:
+        plan = self._nodes(extras)
+        plan["ingest"]["payload"] = root_payload
+        return plan
+
+    def plan_from(self, ingested: Dict[str, Any], extras: Iterable[str] = ()) -> Dict[str, Any]:
+        """Plan for data that is already normalized (e.g. read from a HistoryStore)."""
+        plan = self._nodes(extras)
+        plan["ingest"]["result"] = ingested
+        return plan
+
 class HealthRunner:
     """A minimal ROMA-style runner using agent.run()—aligned with the README API."""
-    def __init__(self):
+    def __init__(self, cache: Optional[ReportCache] = None, max_workers: int = 1,
+                 instrumentation: Optional[Instrumentation] = None,
+                 store: Optional[HistoryStore] = None, profiler: Optional[Profiler] = None,
+                 memo: Optional[NodeMemo] = None, cohorts: Optional[CohortStats] = None,
+                 budgets: Optional[StageBudgets] = None, sessions: Optional[SessionStore] = None):
         self.agents = {
-            "ingest": IngestorAgent(),
+            "ingest": IngestorAgent(memo=memo),
+            "aggregates": LogAggregatesAgent(),
             "metrics": MetricsAgent(),
             "coach": CoachAgent(),
             "report": ReporterAgent(),
+            "trends": TrendsAgent(),
         }
         self.planner = HealthPlanner()
+        self.scheduler = DagScheduler(self.agents, max_workers=max_workers, memo=memo, budgets=budgets)
+        self.sessions = sessions if sessions is not None else SessionStore()
+        self.instrumentation = instrumentation
+        if instrumentation is not None:
+            self.scheduler.middleware.append(instrumentation)
+            if cache is not None:
+                instrumentation.register("cache", cache.stats)
+            if store is not None:
+                instrumentation.register("store", store.stats)
+            if profiler is not None:
+                instrumentation.register("profiler", profiler.stats)
+            if memo is not None:
+                instrumentation.register("memo", memo.stats)
+            if cohorts is not None:
+                instrumentation.register("cohorts", cohorts.stats)
+            if budgets is not None:
+                instrumentation.register("budget", budgets.stats)
+            instrumentation.register("sessions", self.sessions.stats)
+        if budgets is not None:
+            self.scheduler.middleware.append(budgets)
+        if profiler is not None:
+            self.scheduler.middleware.append(profiler)
+        if cohorts is not None:
+            self.scheduler.middleware.append(cohorts)
+        self.cohorts = cohorts
+        self.budgets = budgets
+        self.profiler = profiler
+        self.memo = memo
+        self.cache = cache
+        self.store = store
+
+    def run(self, root_payload: Dict[str, Any], profile: bool = False) -> Dict[str, Any]:
+        """The weekly report; with `profile` (and a profiler attached) every stage is
+        profiled into `self.profiler` (a cache hit records no stages). With budgets,
+        a report past its deadline comes back degraded (see StageBudgets)."""
+        if profile and self.profiler is not None:
+            with self.profiler.session("run", force=True):
+                return self.run(root_payload)
+        if self.cache is None:
+            return self._execute(root_payload)
+        key = canonical_key(root_payload)
+        out = self.cache.get(key)
+        if out is None:
+            out = self._execute(root_payload)
+            if "degraded" not in out:  # the next request may have time for the full report
+                self.cache.put(key, out)
+        return out
+
+    def _execute(self, root_payload: Dict[str, Any]) -> Dict[str, Any]:
+        plan = self.planner.plan(root_payload, self._extras(root_payload.get("include_trends")))
+        return self._run_plan(plan)
+
+    def _run_plan(self, plan: Dict[str, Any]) -> Dict[str, Any]:
+        with self._deadline():
+            results = self.scheduler.run(plan)
+        return self._finalize(results)
+
+    def _deadline(self):
+        return deadline(None if self.budgets is None else self.budgets.deadline_s)
+
+    @staticmethod
+    def _extras(include_trends: Any) -> Iterable[str]:
+        return ("trends",) if include_trends else ()
+
+    def trends(self, root_payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Rolling-window averages and week-over-week deltas only (no coaching report)."""
+        ing = self.scheduler.call("ingest", root_payload)
+        if ing["status"] != "ok":
+            return {"status": "needs_input", "missing_fields": ing["missing_fields"], "trends": {}}
+        out = self.scheduler.call("trends", {"normalized_logs": ing["normalized_logs"]})
+        return {"status": "ok", "missing_fields": [], "trends": out["trends"]}
+
+    def run_weeks(self, root_payload: Dict[str, Any], start: Optional[str] = None,
+                  end: Optional[str] = None) -> Dict[str, Any]:
+        """One report per ISO week of the payload's logs, oldest first.
+
+        The payload is ingested once; its date-ordered days are cut into
+        weeks in one pass (`start`/`end`, inclusive ISO dates, narrow them by
+        binary search) and every week is reported in a single batch pass,
+        under one deadline (see StageBudgets). Weeks are ranked against the
+        cohorts but not added to them: they are one user, not many.
+        """
+        with self._deadline():
+            ing = self.scheduler.call("ingest", root_payload)
+            if ing["status"] != "ok":
+                return {"status": "needs_input", "missing_fields": ing["missing_fields"], "weeks": []}
+            logs = ing["normalized_logs"]
+            weeks = logs.iso_weeks(start, end)
+            with unobserved():
+                reports = self.run_batch_normalized([{**ing, "normalized_logs": logs.take(range(i, j))}
+                                                     for _, i, j in weeks])
+        return {
+            "status": "ok",
+            "missing_fields": [],
+            "weeks": [{"week": week, "start": logs.dates[i], "end": logs.dates[j - 1], **report}
+                      for (week, i, j), report in zip(weeks, reports)],
+        }
 
-    def run(self, root_payload: Dict[str, Any]) -> Dict[str, Any]:
-        plan = self.planner.plan(root_payload)
-        results: Dict[str, Dict[str, Any]] = {}
-        pending = set(plan.keys())
-
-        # dependency-aware execution (recursion flattened)
-        while pending:
-            progressed = False
-            for name in list(pending):
-                deps = plan[name]["depends_on"]
-                if all(d in results for d in deps):
-                    # hydrate payload from deps
-                    payload = plan[name].get("payload", {})
-                    if name == "metrics":
-                        payload = {
-                            "normalized_profile": results["ingest"]["normalized_profile"],
-                            "normalized_logs": results["ingest"]["normalized_logs"],
-                            "normalized_targets": results["ingest"]["normalized_targets"],
-                        }
-                    elif name == "coach":
-                        payload = {
-                            "normalized_logs": results["ingest"]["normalized_logs"],
-                            "normalized_targets": results["ingest"]["normalized_targets"],
-                            "metrics": results["metrics"]["metrics"],
-                        }
-                    elif name == "report":
-                        payload = {
-                            "metrics": results["metrics"]["metrics"],
-                            "weekly_focus": results["coach"]["weekly_focus"],
-                        }
-                    # execute
-                    out = self.agents[name].run(payload)
-                    results[name] = out
-                    pending.remove(name)
-                    progressed = True
-            if not progressed:
-                raise RuntimeError("Dependency deadlock in plan")
+    def add_agent(self, name: str, agent: Any, depends_on: List[str]) -> None:
+        """Plug an extra agent (declaring `inputs`/`outputs`) into the plan."""
+        self.agents[name] = agent
+        self.planner.add(name, depends_on)
+        if self.memo is not None:
+            self.memo.clear()  # memoized results downstream of a replaced agent are stale
 
+    def run_batch(self, root_payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run many users' payloads together; element i equals `run(root_payloads[i])`.
+
+        Each stage is one scheduler call for the whole batch instead of one
+        DAG walk per user; the coaching rules run as a single pass over all
+        users' days (metrics stay per user). With a cache, only the misses are
+        computed. With budgets the whole batch shares one deadline, and coach
+        and trends degrade as in `run` (degraded reports are not cached).
+        """
+        if self.cache is None:
+            return self._execute_batch(root_payloads)
+        keys = [canonical_key(p) for p in root_payloads]
+        out = [self.cache.get(k) for k in keys]
+        todo = [i for i, r in enumerate(out) if r is None]
+        for i, r in zip(todo, self._execute_batch([root_payloads[i] for i in todo])):
+            if "degraded" not in r:
+                self.cache.put(keys[i], r)
+            out[i] = r
+        return out
+
+    def _execute_batch(self, root_payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with self._deadline():
+            ingested = [self.scheduler.call("ingest", p) for p in root_payloads]
+            return self._report_batch(ingested, [p.get("include_trends") for p in root_payloads])
+
+    def run_batch_normalized(self, ingested: List[Dict[str, Any]],
+                             include_trends: bool = False) -> List[Dict[str, Any]]:
+        """`run_batch` for already-normalized users (`IngestorAgent.run` result shape),
+        e.g. the zero-copy columns of a mapped DayFile; ingest is skipped."""
+        with self._deadline():
+            return self._report_batch(ingested, [include_trends] * len(ingested))
+
+    def _report_batch(self, ingested: List[Dict[str, Any]], trends: List[Any]) -> List[Dict[str, Any]]:
+        call, guarded = self.scheduler.call, self.scheduler.call_guarded
+        computed = call("metrics", [
+            {
+                "normalized_profile": ing["normalized_profile"],
+                "normalized_logs": ing["normalized_logs"],
+                "normalized_targets": ing["normalized_targets"],
+            }
+            for ing in ingested
+        ], self.agents["metrics"].run_batch)
+        coached = guarded("coach", [
+            {
+                "normalized_logs": ing["normalized_logs"],
+                "normalized_targets": ing["normalized_targets"],
+                "metrics": met["metrics"],
+            }
+            for ing, met in zip(ingested, computed)
+        ], self.agents["coach"].run_batch)
+        out = []
+        for include_trends, ing, met, coach in zip(trends, ingested, computed, coached):
+            report = call("report", {
+                "metrics": met["metrics"],
+                "weekly_focus": coach["weekly_focus"],
+            })
+            results = {"ingest": ing, "metrics": met, "coach": coach, "report": report}
+            if include_trends:
+                results["trends"] = guarded("trends", {"normalized_logs": ing["normalized_logs"]})
+            out.append(self._finalize(results))
+        return out
+
+    def run_stream(self, records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """Streaming mode: yield each day's suggestion as it is produced, then the summary.
+
+        `records` is a profile/targets record followed by daily log entries
+        (see ReportStream); days are not retained, only a few numbers per date.
+        """
+        stream = ReportStream(self)
+        for record in records:
+            out = stream.feed(record)
+            if out is not None:
+                yield out
+        yield stream.close()
+
+    def upsert_day(self, user_id: str, day: Dict[str, Any],
+                   user_profile: Optional[Dict[str, Any]] = None,
+                   targets: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Absorb one new or corrected day for `user_id`; return the updated report.
+
+        Metrics come from the session's running sums, so syncing a day costs
+        O(1) for aggregation no matter how many days were synced before.
+        Calls for one user are serialized on the session's lock; suggestions
+        come back in date order (undated days last), as from `run`. Re-sending
+        unchanged targets is free; changed ones re-tip every day. Sessions are
+        per process and bounded (see SessionStore).
+        """
+        ingest, coach = self.agents["ingest"], self.agents["coach"]
+        s = self.sessions.get(user_id)
+        with s.lock:
+            if user_profile is not None:
+                s.profile_missing = []
+                s.profile = ingest.profile(user_profile, s.profile_missing)
+            norm_targets = None if targets is None else ingest.targets(targets)
+            if norm_targets is not None and norm_targets != s.targets:
+                s.targets = norm_targets
+                s.tips = {d: coach.day_tips(v, s.targets) for d, v in s.days.items()}
+
+            missing: List[str] = []
+            norm = ingest.day(day, missing)
+            if not missing:
+                s.days[norm["date"]] = norm
+                s.tips[norm["date"]] = coach.day_tips(norm, s.targets)
+                s.metrics.add_day(norm)
+
+            metrics = s.metrics.metrics(s.profile, s.targets)
+            missing = s.profile_missing + missing
+            ok = not missing and len(s.days) > 0
+            profile = s.profile
+            daily = [{"date": d, "tips": t}
+                     for d, t in sorted(s.tips.items(), key=lambda kv: date_ordinal(kv[0]) or math.inf)]
+        focus = coach.focus(metrics["adherence"])
+        return self._finalize({
+            "ingest": {"status": "ok" if ok else "needs_input", "missing_fields": missing,
+                       "normalized_profile": profile},
+            "metrics": {"metrics": metrics},
+            "coach": {
+                "daily_suggestions": daily,
+                "weekly_focus": focus,
+            },
+            "report": self.agents["report"].run({"metrics": metrics, "weekly_focus": focus}),
+        })
+
+    def save_history(self, user_id: str, user_profile: Optional[Dict[str, Any]] = None,
+                     targets: Optional[Dict[str, Any]] = None,
+                     daily_logs: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Normalize and persist a delta for `user_id`: any of profile, targets, new or corrected days.
+
+        Days failing validation are not stored; their problems come back in
+        `missing_fields`. A repeated date replaces the stored day.
+        """
+        if self.store is None:
+            raise RuntimeError("No history store configured (set HEALTH_STORE_PATH)")
+        ingest = self.agents["ingest"]
+        profile_missing: List[str] = []
+        prof = None if user_profile is None else ingest.profile(user_profile, profile_missing)
+        norm_targets = None if targets is None else ingest.targets(targets)
+        if prof is not None or norm_targets is not None:
+            self.store.put_user(user_id, prof, profile_missing, norm_targets)
+
+        missing: List[str] = []
+        days, valid = DayColumns(), []
+        for row in daily_logs or []:
+            before = len(missing)
+            days.append_row(row, missing)
+            valid.append(len(missing) == before)
+        stored = self.store.put_days(user_id, days, [i for i, ok in enumerate(valid) if ok])
+        missing = profile_missing + missing
+        return {"status": "needs_input" if missing else "ok", "user_id": user_id,
+                "days_stored": stored, "missing_fields": missing}
+
+    def report_history(self, user_id: str, start: Optional[str] = None,
+                       end: Optional[str] = None, include_trends: bool = False) -> Dict[str, Any]:
+        """Report from `user_id`'s stored history between `start` and `end` (inclusive ISO dates).
+
+        Stored data is already normalized, so the ingest stage is skipped.
+        """
+        if self.store is None:
+            raise RuntimeError("No history store configured (set HEALTH_STORE_PATH)")
+        ingested = self.scheduler.call("history", (user_id, start, end), lambda a: self.store.load(*a))
+        return self.run_normalized(ingested, include_trends)
+
+    def run_normalized(self, ingested: Dict[str, Any], include_trends: bool = False) -> Dict[str, Any]:
+        """Report for one already-normalized user (`IngestorAgent.run` result shape); ingest is skipped."""
+        plan = self.planner.plan_from(ingested, self._extras(include_trends))
+        return self._run_plan(plan)
+
+    def _finalize(self, results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
         # aggregate to final
         if results["ingest"]["status"] != "ok":
             return {
@@ -73,7 +351,7 @@ class HealthRunner:
                 "weekly_plan": {},
                 "next_actions": []
             }
-        return {
+        out = {
             "status": "ok",
             "missing_fields": [],
             "week_summary": results["report"]["week_summary"],
@@ -81,3 +359,18 @@ class HealthRunner:
             "weekly_plan": results["report"]["weekly_plan"],
             "next_actions": results["report"]["next_actions"]
         }
+        if self.cohorts is not None:
+            standing = self.cohorts.standing(results["ingest"].get("normalized_profile"),
+                                             results["metrics"]["metrics"])
+            if standing is not None:
+                out["week_summary"] = {**out["week_summary"], "cohort": standing}
+        if "trends" in results:
+            out["trends"] = results["trends"]["trends"]
+        # stages that fell back to a cheap stand-in (out of time, or raised)
+        degraded = [{"stage": stage, "reason": r["degraded"], **{k: r[k] for k in ("detail", "error") if k in r}}
+                    for stage, r in results.items() if r.get("status") == "degraded"]
+        if degraded:
+            out["degraded"] = degraded
+        if self.budgets is not None:
+            self.budgets.record(out.get("degraded"))
+        return out
@@ -0,0 +1,222 @@
+import contextvars
+import logging
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from roma_engine.budgets import StageBudgets
+from roma_engine.memo import NodeMemo, combine, fingerprint
+
+logger = logging.getLogger(__name__)
+
+class DagScheduler:
+    """Run a `HealthPlanner` plan as a dependency graph.
+
+    Each agent declares `inputs` (payload keys it reads) and `outputs` (keys
+    of its result later nodes may read); a node's payload is assembled from
+    whichever dependency declares each input, or taken verbatim from the
+    plan's "payload" entry. A node with a "result" entry is not run; that
+    result is used as its output. The topological order and input wiring are
+    computed once per plan shape. With `max_workers > 1`, nodes whose
+    dependencies are done run concurrently on a thread pool.
+
+    `middleware` entries are called as `mw(stage, call_next, payload)`
+    around every agent call (timing, profiling, ...); with none registered
+    agents are called directly.
+
+    With a `memo`, every output key carries a fingerprint: from the
+    producing agent's "fingerprints" (IngestorAgent gives one per part of
+    the payload), from the value itself for a "result" entry, or derived
+    from the node's own input fingerprint. A wired node whose inputs all
+    have fingerprints is looked up in the memo first and only run on a
+    miss, so e.g. a targets-only change reuses the log aggregates.
+
+    With `budgets`, a node whose agent has a `degrade` method gets the
+    result of `degrade(payload, reason)` instead of a run when its budget no
+    longer fits the deadline ("deadline"), or when the run raises ("error");
+    that result carries "status": "degraded" and the reason, and nothing
+    downstream of it is memoized. `call_guarded` applies the same to the
+    per-stage batch calls of HealthRunner.run_batch; a failure that is
+    degraded is logged.
+    """
+    def __init__(self, agents: Dict[str, Any], max_workers: int = 1, memo: Optional[NodeMemo] = None,
+                 budgets: Optional[StageBudgets] = None):
+        self.agents = agents
+        self.max_workers = max_workers
+        self.memo = memo
+        self.budgets = budgets
+        self._compiled: Dict[Tuple, Tuple[List[str], Dict[str, Dict[str, str]]]] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self.middleware: List[Callable[[str, Callable, Any], Any]] = []
+
+    @staticmethod
+    def workers_from_env() -> int:
+        """HEALTH_DAG_WORKERS: threads running a report's independent nodes at once (default 1, serial)."""
+        return max(1, int(os.getenv("HEALTH_DAG_WORKERS", "1") or 1))
+
+    def compile(self, plan: Dict[str, Any]) -> Tuple[List[str], Dict[str, Dict[str, str]]]:
+        """Topological order plus, per node, input key -> providing dependency."""
+        shape = tuple((name, tuple(node["depends_on"]), "payload" in node or "result" in node)
+                      for name, node in plan.items())
+        hit = self._compiled.get(shape)
+        if hit is not None:
+            return hit
+
+        indeg = {name: len(node["depends_on"]) for name, node in plan.items()}
+        children: Dict[str, List[str]] = {name: [] for name in plan}
+        for name, node in plan.items():
+            for d in node["depends_on"]:
+                if d not in plan:
+                    raise RuntimeError(f"Unknown dependency {d!r} for {name!r}")
+                children[d].append(name)
+        order = [name for name, n in indeg.items() if n == 0]
+        for name in order:
+            for c in children[name]:
+                indeg[c] -= 1
+                if indeg[c] == 0:
+                    order.append(c)
+        if len(order) != len(plan):
+            raise RuntimeError("Dependency deadlock in plan")
+
+        wiring: Dict[str, Dict[str, str]] = {}
+        for name, node in plan.items():
+            if "payload" in node or "result" in node:
+                continue
+            sources = {}
+            for key in self.agents[name].inputs:
+                src = [d for d in node["depends_on"] if key in self.agents[d].outputs]
+                if not src:
+                    raise RuntimeError(f"No dependency of {name!r} provides {key!r}")
+                sources[key] = src[-1]
+            wiring[name] = sources
+
+        self._compiled[shape] = (order, wiring)
+        return order, wiring
+
+    def call(self, name: str, payload: Any, fn: Optional[Callable] = None) -> Any:
+        """Invoke agent `name` (or `fn`, e.g. a batch method) through the middleware."""
+        fn = fn or self.agents[name].run
+        for mw in reversed(self.middleware):
+            fn = partial(mw, name, fn)
+        return fn(payload)
+
+    def call_guarded(self, name: str, payload: Any, fn: Optional[Callable] = None) -> Any:
+        """`call`, but with budgets an agent's `degrade` stands in (for each payload of a
+        batch) when the stage does not fit the deadline or raises, as in `run`."""
+        degrade = None if self.budgets is None else getattr(self.agents[name], "degrade", None)
+        if degrade is None:
+            return self.call(name, payload, fn)
+        batch = payload if isinstance(payload, list) else [payload]
+        error = None
+        if self.budgets.admit(name, len(batch)):
+            try:
+                return self.call(name, payload, fn)
+            except Exception as e:
+                error = self._failed(name, e)
+        out = [self._stand_in(degrade, p, error) for p in batch]
+        return out if isinstance(payload, list) else out[0]
+
+    def run(self, plan: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        order, wiring = self.compile(plan)
+        results: Dict[str, Dict[str, Any]] = {}
+        fps: Dict[Tuple[str, str], Optional[bytes]] = {}  # (node, output key) -> fingerprint
+
+        def hydrate(name: str) -> Dict[str, Any]:
+            if name not in wiring:
+                return plan[name]["payload"]
+            return {key: results[src][key] for key, src in wiring[name].items()}
+
+        def compute(name: str) -> Dict[str, Any]:
+            if self.memo is None:
+                return self.call(name, hydrate(name))
+            return self._memo_call(name, hydrate, wiring.get(name), fps)
+
+        def execute(name: str) -> Dict[str, Any]:
+            node = plan[name]
+            if "result" in node:
+                if self.memo is None:
+                    return node["result"]
+                return self._fingerprint_outputs(name, node["result"], None, fps)
+            degrade = None if self.budgets is None else getattr(self.agents[name], "degrade", None)
+            if degrade is None:
+                return compute(name)
+            error = None
+            if self.budgets.admit(name):
+                try:
+                    return compute(name)
+                except Exception as e:
+                    error = self._failed(name, e)
+            for out in self.agents[name].outputs:
+                fps[(name, out)] = None  # a stand-in result is never memoized, nor anything built on it
+            return self._stand_in(degrade, hydrate(name), error)
+
+        if self.max_workers <= 1:
+            for name in order:
+                results[name] = execute(name)
+            return results
+
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="health-dag")
+        waiting = {name: set(plan[name]["depends_on"]) for name in order}
+        running = {}
+        while waiting or running:
+            for name in [n for n, deps in waiting.items() if not deps]:
+                del waiting[name]
+                if "result" in plan[name]:
+                    results[name] = execute(name)
+                    for deps in waiting.values():
+                        deps.discard(name)
+                    continue
+                # each node runs in a copy of the caller's context (request-scoped state such as a profile session)
+                ctx = contextvars.copy_context()
+                running[self._pool.submit(ctx.run, execute, name)] = name
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                name = running.pop(fut)
+                results[name] = fut.result()
+                for deps in waiting.values():
+                    deps.discard(name)
+        return results
+
+    def _memo_call(self, name: str, hydrate: Callable[[str], Dict[str, Any]],
+                   sources: Optional[Dict[str, str]], fps: Dict[Tuple[str, str], Optional[bytes]]) -> Dict[str, Any]:
+        """Node `name` from the memo when its input fingerprints match, else run and remember it."""
+        key = None
+        if sources is not None:
+            key = combine(name, *(x for k, src in sources.items() for x in (k, fps.get((src, k)))))
+        result = self.memo.get(name, key) if key is not None else None
+        if result is None:
+            result = self.call(name, hydrate(name))
+            if key is not None:
+                self.memo.put(name, key, result)
+        return self._fingerprint_outputs(name, result, key, fps)
+
+    @staticmethod
+    def _stand_in(degrade: Callable, payload: Dict[str, Any], error: Optional[Exception]) -> Dict[str, Any]:
+        reason = "deadline" if error is None else "error"
+        result = {**degrade(payload, reason), "status": "degraded", "degraded": reason}
+        if error is not None:
+            result["error"] = f"{type(error).__name__}: {error}"
+        return result
+
+    @staticmethod
+    def _failed(name: str, error: Exception) -> Exception:
+        logger.error("stage %r failed, using its degraded result", name, exc_info=error)
+        return error
+
+    def _fingerprint_outputs(self, name: str, result: Dict[str, Any], key: Optional[bytes],
+                             fps: Dict[Tuple[str, str], Optional[bytes]]) -> Dict[str, Any]:
+        """Record a fingerprint per output key; without an input `key` (a root node or a
+        plan-supplied result) keys the agent did not fingerprint are hashed by value."""
+        own = result.get("fingerprints") or {}
+        for out in self.agents[name].outputs:
+            fp = own.get(out)
+            if fp is None:
+                fp = combine(key, out) if key is not None else fingerprint(result.get(out))
+            fps[(name, out)] = fp
+        return result
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
@@ -0,0 +1,90 @@
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# field -> (type, list item type or None, required)
+FieldSpec = Tuple[type, Optional[type], bool]
+
+PAYLOAD_SCHEMA: Dict[str, FieldSpec] = {
+    "user_profile": (dict, None, True),
+    "targets": (dict, None, True),
+    "daily_logs": (list, dict, True),
+    "include_trends": (bool, None, False),
+}
+
+_TYPE_NAMES = {dict: "dict", list: "list", bool: "bool", str: "string", int: "int", float: "float"}
+
+class PayloadError(ValueError):
+    """Request body failed the schema check; `errors` uses FastAPI's 422 detail shape."""
+    def __init__(self, errors: List[Dict[str, Any]]):
+        super().__init__(f"{len(errors)} validation error(s)")
+        self.errors = errors
+
+def _type_error(loc: list, expected: type, value: Any) -> Dict[str, Any]:
+    name = _TYPE_NAMES.get(expected, expected.__name__)
+    return {"type": f"{name}_type", "loc": loc, "msg": f"Input should be a valid {name}",
+            "input": type(value).__name__}
+
+def compile_schema(schema: Dict[str, FieldSpec]) -> Callable[[Any, tuple], List[Dict[str, Any]]]:
+    """Turn a schema table into a checker `check(obj, loc) -> errors`.
+
+    Only structure is checked (top-level types, list item types); the
+    agents normalize field values themselves, so nothing is copied or
+    rebuilt here and the checked object is passed on as-is.
+    """
+    fields = tuple((name, typ, item, required) for name, (typ, item, required) in schema.items())
+
+    def check(obj: Any, loc: tuple = ("body",)) -> List[Dict[str, Any]]:
+        if type(obj) is not dict:
+            return [_type_error(list(loc), dict, obj)]
+        errors = []
+        for name, typ, item, required in fields:
+            v = obj.get(name)
+            if v is None:
+                if required:
+                    errors.append({"type": "missing", "loc": [*loc, name], "msg": "Field required"})
+                continue
+            if not isinstance(v, typ):
+                errors.append(_type_error([*loc, name], typ, v))
+            elif item is not None:
+                for i, x in enumerate(v):
+                    if not isinstance(x, item):
+                        errors.append(_type_error([*loc, name, i], item, x))
+        return errors
+
+    return check
+
+check_payload = compile_schema(PAYLOAD_SCHEMA)
+# same types, nothing required: missing fields are left to IngestorAgent (a needs_input report)
+check_lenient = compile_schema({name: (typ, item, False) for name, (typ, item, _) in PAYLOAD_SCHEMA.items()})
+
+def validate_payload(obj: Any, check: Callable = check_payload) -> Dict[str, Any]:
+    """`obj` itself when it passes `check`; raises PayloadError otherwise."""
+    errors = check(obj)
+    if errors:
+        raise PayloadError(errors)
+    return obj
+
+def validate_batch(obj: Any, check: Callable = check_payload) -> List[Dict[str, Any]]:
+    """`obj` itself when it is a list of payloads passing `check`; raises PayloadError otherwise."""
+    if type(obj) is not list:
+        raise PayloadError([_type_error(["body"], list, obj)])
+    errors = [e for i, p in enumerate(obj) for e in check(p, ("body", i))]
+    if errors:
+        raise PayloadError(errors)
+    return obj
+
+def validate_dates(**params: Optional[str]) -> None:
+    """Raises PayloadError unless every given (not None) query parameter is a YYYY-MM-DD date."""
+    errors = []
+    for name, value in params.items():
+        if value is None:
+            continue
+        try:
+            ok = date.fromisoformat(value).isoformat() == value
+        except ValueError:
+            ok = False
+        if not ok:
+            errors.append({"type": "date_parsing", "loc": ["query", name],
+                           "msg": "Input should be a valid date in the format YYYY-MM-DD", "input": value})
+    if errors:
+        raise PayloadError(errors)
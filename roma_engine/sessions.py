@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+from roma_agents.metrics import MetricsAccumulator
+
+class UserSession:
+    """Per-user state for day-at-a-time sync (see `HealthRunner.upsert_day`).
+
+    Read and changed only under `lock`: the sync endpoint runs on many threads.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.profile: Dict[str, Any] = {}
+        self.profile_missing: List[str] = ["user_profile"]
+        self.targets: Dict[str, Any] = {}
+        self.metrics = MetricsAccumulator()
+        # date -> normalized day / its tips, in first-seen order
+        self.days: Dict[Any, Dict[str, Any]] = {}
+        self.tips: Dict[Any, List[str]] = {}
+
+class SessionStore:
+    """Thread-safe LRU map of user id -> UserSession, with an idle TTL.
+
+    Past `max_users` the least recently synced user is evicted, and a
+    session not synced for `ttl_s` expires; that user starts over (the next
+    sync must carry the profile and targets again). Sessions live in this
+    process: with several server workers (`uvicorn --workers N`) each has
+    its own, so a user's syncs must reach the same worker, or use the
+    history store (HEALTH_STORE_PATH), which all workers share.
+    """
+    def __init__(self, max_users: int = 10_000, ttl_s: Optional[float] = 86_400.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_users = max_users
+        self.ttl_s = ttl_s
+        self._clock = clock
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()  # user id -> (expires_at, session)
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        """HEALTH_SESSIONS_MAX users (default 10000); HEALTH_SESSIONS_TTL_S idle seconds
+        (default 86400, 0 = no expiry)."""
+        ttl = float(os.getenv("HEALTH_SESSIONS_TTL_S", "86400") or 0)
+        return cls(max_users=int(os.getenv("HEALTH_SESSIONS_MAX", "10000")), ttl_s=ttl or None)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, user_id: str) -> UserSession:
+        """`user_id`'s session, a new one if it had none or it expired."""
+        now = self._clock()
+        with self._lock:
+            item = self._items.get(user_id)
+            if item is not None and item[0] is not None and item[0] <= now:
+                self.expirations += 1
+                item = None
+            session = UserSession() if item is None else item[1]
+            self.created += item is None
+            self._items[user_id] = (now + self.ttl_s if self.ttl_s else None, session)
+            self._items.move_to_end(user_id)
+            while len(self._items) > self.max_users:
+                self._items.popitem(last=False)
+                self.evictions += 1
+            return session
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._items),
+            "max_size": self.max_users,
+            "ttl_s": self.ttl_s,
+            "created": self.created,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
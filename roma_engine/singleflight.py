@@ -0,0 +1,53 @@
+import asyncio
+import os
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+class SingleFlight:
+    """Coalesce concurrent identical requests into one in-flight computation.
+
+    `do(key, make)` starts `make()` as a task the first time `key` is seen
+    and hands every caller arriving before it finishes that same task, so
+    all of them get its result, or its exception (a pool timeout or
+    Overloaded included). Callers await the task through `asyncio.shield`:
+    one client disconnecting does not cancel the work the others wait on.
+    The key is forgotten as soon as the task finishes; this shares work in
+    flight only and caches nothing (see ReportCache for that). Event-loop
+    only; not thread-safe.
+    """
+    def __init__(self):
+        self._inflight: Dict[str, "asyncio.Future[Any]"] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls) -> Optional["SingleFlight"]:
+        """On unless HEALTH_COALESCE=0."""
+        return None if os.getenv("HEALTH_COALESCE", "1") == "0" else cls()
+
+    async def do(self, key: str, make: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(make())
+            self._inflight[key] = task
+            self.leaders += 1
+            task.add_done_callback(partial(self._done, key))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _done(self, key: str, task: "asyncio.Future[Any]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # retrieving the exception here also keeps asyncio from logging it when every caller left
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+        }
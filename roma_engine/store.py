@@ -0,0 +1,156 @@
+import json
+import os
+import sqlite3
+import threading
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+from roma_agents.columns import FIELDS, DayColumns
+
+# Day values are stored in untyped columns so ints stay ints and floats stay
+# floats; NULL is a missing value. Workouts live in their own table.
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    profile TEXT NOT NULL,
+    profile_missing TEXT NOT NULL,
+    targets TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS days (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    {", ".join(FIELDS)},
+    notes TEXT NOT NULL,
+    PRIMARY KEY (user_id, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS workouts (
+    user_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    minutes INTEGER NOT NULL,
+    intensity INTEGER NOT NULL,
+    PRIMARY KEY (user_id, date, seq)
+) WITHOUT ROWID;
+"""
+
+class HistoryStore:
+    """Embedded SQLite store of normalized profiles, targets and days per user.
+
+    Days are keyed by (user_id, date); writing a stored date replaces that
+    day. `load` reads a user's days for a date range straight into
+    `DayColumns`, already normalized, in date order. Runs fully offline:
+    the database is a local file (or ":memory:").
+    """
+    def __init__(self, path: str = ":memory:"):
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._db:
+            if path != ":memory:":
+                self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(_SCHEMA)
+
+    @classmethod
+    def from_env(cls) -> Optional["HistoryStore"]:
+        """HEALTH_STORE_PATH (a SQLite file) enables the store."""
+        path = os.getenv("HEALTH_STORE_PATH", "")
+        return cls(path) if path else None
+
+    def put_user(self, user_id: str, profile: Optional[Dict[str, Any]] = None,
+                 profile_missing: Optional[List[str]] = None,
+                 targets: Optional[Dict[str, Any]] = None) -> None:
+        """Create or update a user's normalized profile and/or targets."""
+        with self._lock, self._db:
+            row = self._db.execute("SELECT profile, profile_missing, targets FROM users WHERE user_id = ?",
+                                   (user_id,)).fetchone()
+            old = row or ("{}", '["user_profile"]', "{}")
+            self._db.execute(
+                "INSERT OR REPLACE INTO users VALUES (?, ?, ?, ?)",
+                (
+                    user_id,
+                    old[0] if profile is None else json.dumps(profile),
+                    old[1] if profile is None else json.dumps(profile_missing or []),
+                    old[2] if targets is None else json.dumps(targets),
+                ),
+            )
+
+    def put_days(self, user_id: str, cols: DayColumns, only: Optional[Iterable[int]] = None) -> int:
+        """Upsert the days of `cols` (all, or the indices in `only`); returns the number written."""
+        days, workouts = [], []
+        # a date repeated within one delta: its last entry wins, as a later put_days would
+        latest = {cols.dates[i]: i for i in (range(len(cols)) if only is None else only)}
+        for i in sorted(latest.values()):
+            date = cols.dates[i]
+            days.append((user_id, date, *(cols.value(f, i) for f in FIELDS), cols.notes[i]))
+            a, b = cols.w_offsets[i], cols.w_offsets[i + 1]
+            workouts.extend(
+                (user_id, date, seq, t, m, k)
+                for seq, (t, m, k) in enumerate(zip(cols.w_types[a:b], cols.w_minutes[a:b], cols.w_intensity[a:b]))
+            )
+        with self._lock, self._db:
+            self._db.executemany(f"INSERT OR REPLACE INTO days VALUES ({', '.join('?' * (len(FIELDS) + 3))})", days)
+            self._db.executemany("DELETE FROM workouts WHERE user_id = ? AND date = ?", [d[:2] for d in days])
+            self._db.executemany("INSERT INTO workouts VALUES (?, ?, ?, ?, ?, ?)", workouts)
+        return len(days)
+
+    def load(self, user_id: str, start: Optional[str] = None, end: Optional[str] = None) -> Dict[str, Any]:
+        """A user's stored data in `IngestorAgent.run` result shape.
+
+        `start`/`end` are inclusive ISO dates; either may be omitted.
+        """
+        where, args = "user_id = ?", [user_id]
+        if start is not None:
+            where += " AND date >= ?"
+            args.append(start)
+        if end is not None:
+            where += " AND date <= ?"
+            args.append(end)
+        with self._lock:
+            user = self._db.execute("SELECT profile, profile_missing, targets FROM users WHERE user_id = ?",
+                                    (user_id,)).fetchone()
+            days = self._db.execute(f"SELECT date, {', '.join(FIELDS)}, notes FROM days WHERE {where} ORDER BY date",
+                                    args).fetchall()
+            workouts = self._db.execute(f"SELECT date, type, minutes, intensity FROM workouts WHERE {where} "
+                                        "ORDER BY date, seq", args).fetchall()
+
+        cols = DayColumns()
+        if days:
+            dates, *fields, notes = zip(*days)
+            cols.dates, cols.notes = list(dates), list(notes)
+            for f, vals in zip(FIELDS, fields):
+                cols.values[f] = array("d", [0.0 if v is None else v for v in vals])
+                cols.mask[f] = bytearray(0 if v is None else 2 if type(v) is int else 1 for v in vals)
+        if workouts:
+            w_dates, w_types, w_minutes, w_intensity = zip(*workouts)
+            cols.w_types = list(w_types)
+            cols.w_minutes = array("q", w_minutes)
+            cols.w_intensity = array("q", w_intensity)
+            # both queries are date-ordered: walk the workouts once alongside the days
+            j, n = 0, len(w_dates)
+            for date in cols.dates:
+                while j < n and w_dates[j] == date:
+                    j += 1
+                cols.w_offsets.append(j)
+        else:
+            cols.w_offsets.extend([0] * len(cols.dates))
+
+        profile, missing, targets = user or ("{}", '["user_profile"]', "{}")
+        missing = json.loads(missing)
+        ok = not missing and len(cols) > 0
+        return {
+            "status": "ok" if ok else "needs_input",
+            "missing_fields": [] if ok else missing,
+            "normalized_profile": json.loads(profile),
+            "normalized_logs": cols,
+            "normalized_targets": json.loads(targets),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            users, = self._db.execute("SELECT COUNT(*) FROM users").fetchone()
+            days, = self._db.execute("SELECT COUNT(*) FROM days").fetchone()
+        return {"users": users, "days": days}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,108 @@
+import json
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional
+from roma_agents.metrics import MetricsAccumulator
+
+# A partial line longer than this is dropped (with an error line) rather than buffered
+MAX_LINE_BYTES = 1 << 20
+
+class ReportStream:
+    """Push-style ingest -> metrics -> coach -> report over one user's days.
+
+    A record carrying `user_profile` and/or `targets` sets them (send it
+    first: day tips use the targets in force); every other record is one
+    `daily_logs` entry. Each day is folded into running sums and dropped;
+    only a few numbers per date are kept, so a re-sent date replaces the
+    earlier entry (as in `run`) and its tips come back again.
+    """
+    def __init__(self, runner: Any):
+        self.ingest = runner.agents["ingest"]
+        self.coach = runner.agents["coach"]
+        self.reporter = runner.agents["report"]
+        self._finalize = runner._finalize
+        self.user: Dict[str, Any] = {}
+        self.targets = self.ingest.targets({})
+        self.metrics = MetricsAccumulator()
+        self.missing: List[str] = []
+
+    def feed(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Absorb one record; returns that day's suggestion, if it was a day. A record
+        that cannot be normalized (e.g. workout minutes "abc") is left out and an
+        error line comes back for it instead; the stream carries on."""
+        try:
+            return self._feed(record)
+        except (AttributeError, TypeError, ValueError) as e:
+            return {"type": "error", "error": f"record skipped: {e}"}
+
+    def _feed(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if "user_profile" in record or "targets" in record:
+            user, targets = record.get("user_profile") or {}, record.get("targets") or {}
+            if not isinstance(user, dict) or not isinstance(targets, dict):
+                raise TypeError("user_profile and targets must be objects")
+            if "user_profile" in record:
+                self.user = user
+            if "targets" in record:
+                self.targets = self.ingest.targets(targets)
+            return None
+        missing: List[str] = []
+        day = self.ingest.day(record, missing)  # raises before any state changes
+        self.missing += missing
+        self.metrics.add_day(day)
+        return {"type": "day", "date": day["date"], "tips": self.coach.day_tips(day, self.targets)}
+
+    def close(self) -> Dict[str, Any]:
+        """Final report, minus the daily suggestions already streamed."""
+        missing: List[str] = []
+        prof = self.ingest.profile(self.user, missing)
+        missing += self.missing
+        ok = not missing and len(self.metrics) > 0
+        metrics = self.metrics.metrics(prof, self.targets)
+        focus = self.coach.focus(metrics["adherence"])
+        out = self._finalize({
+            "ingest": {"status": "ok" if ok else "needs_input", "missing_fields": missing,
+                       "normalized_profile": prof},
+            "metrics": {"metrics": metrics},
+            "coach": {"daily_suggestions": [], "weekly_focus": focus},
+            "report": self.reporter.run({"metrics": metrics, "weekly_focus": focus}),
+        })
+        del out["daily_suggestions"]
+        return {"type": "summary", **out}
+
+def _feed_line(stream: ReportStream, line: bytes) -> Optional[bytes]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError("each line must be a JSON object")
+    except ValueError as e:
+        return _dump({"type": "error", "error": str(e)})
+    out = stream.feed(record)
+    return _dump(out) if out is not None else None
+
+def _dump(obj: Dict[str, Any]) -> bytes:
+    return json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
+
+async def stream_ndjson(runner: Any, chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """NDJSON body in, NDJSON out: one line per day as produced, the summary last."""
+    stream = ReportStream(runner)
+    buf = b""
+    skipping = False  # inside a line that outgrew MAX_LINE_BYTES
+    async for chunk in chunks:
+        *lines, buf = (buf + chunk).split(b"\n")
+        for line in lines:
+            if skipping:
+                skipping = False  # the tail of the dropped line
+                continue
+            out = _feed_line(stream, line)
+            if out is not None:
+                yield out
+        if len(buf) > MAX_LINE_BYTES:
+            if not skipping:
+                yield _dump({"type": "error", "error": f"line longer than {MAX_LINE_BYTES} bytes skipped"})
+            skipping, buf = True, b""
+    if not skipping:
+        out = _feed_line(stream, buf)
+        if out is not None:
+            yield out
+    yield _dump(stream.close())
@@ -0,0 +1,216 @@
+# Starlette/FastAPI helpers shared by api.py and app.py
+import gzip
+import hashlib
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from roma_engine.cache import ReportCache, canonical_key
+from roma_engine.jsonio import dumps, loads
+from roma_engine.profiling import Profiler
+from roma_engine.schema import PayloadError
+from roma_engine.singleflight import SingleFlight
+
+try:  # optional: smaller than gzip at a similar speed
+    import brotli
+except ImportError:  # pragma: no cover - depends on the environment
+    brotli = None
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson when installed.
+
+    Return it from an endpoint (instead of a dict) so FastAPI also skips
+    `jsonable_encoder`, which walks and copies the whole report first.
+    """
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+async def read_json(request: Request, validate: Callable[[Any], Any] = lambda obj: obj) -> Any:
+    """Parse the raw request body and run `validate` on it; no model is built or copied."""
+    try:
+        obj = loads(await request.body())
+    except ValueError as e:
+        raise PayloadError([{"type": "json_invalid", "loc": ["body"], "msg": f"JSON decode error: {e}"}])
+    return validate(obj)
+
+async def coalesced(flights: Optional[SingleFlight], method: str, args: Any,
+                    make: Callable[[], Awaitable[Any]]) -> Any:
+    """`await make()`, shared with concurrent requests for the same method and canonical args."""
+    if flights is None:
+        return await make()
+    # hashed off the loop: canonicalizing a multi-year history takes milliseconds
+    key = f"{method}:{await run_in_threadpool(canonical_key, args)}"
+    return await flights.do(key, make)
+
+def _etag(key: str, body: bytes) -> str:
+    # weak: the same report is sent identity, gzip or br encoded under one tag
+    return 'W/"' + hashlib.blake2b(key.encode() + body, digest_size=16).hexdigest() + '"'
+
+def _if_none_match(request: Request) -> List[str]:
+    header = request.headers.get("if-none-match", "")
+    return [t.strip().removeprefix("W/") for t in header.split(",") if t.strip()]
+
+def _matches(etag: str, tags: List[str]) -> bool:
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+def _encoding(request: Request) -> Optional[str]:
+    """"br" or "gzip" when the client's Accept-Encoding allows it, br preferred."""
+    accepted = set()
+    for part in request.headers.get("accept-encoding", "").lower().split(","):
+        name, _, params = part.partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    return "gzip" if "gzip" in accepted else None
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=4)
+    return gzip.compress(body, compresslevel=5, mtime=0)
+
+class ReportResponses:
+    """Conditional (ETag / If-None-Match) and compressed report responses.
+
+    The ETag hashes the canonical request together with the rendered
+    report, so it changes when either does. A request naming the tag of a
+    report still in the ReportCache gets 304 before the pipeline runs (the
+    tag is kept with the cache entry); otherwise the report is computed,
+    shared with identical concurrent requests, and a matching tag still
+    gets an empty 304. Bodies of `min_compress_bytes` or more go out br
+    (with the brotli package) or gzip, as Accept-Encoding allows.
+    """
+    def __init__(self, flights: Optional[SingleFlight] = None, min_compress_bytes: int = 4096):
+        self.flights = flights
+        self.min_compress_bytes = min_compress_bytes
+        self.not_modified = 0
+        self.not_modified_cached = 0
+        self.compressed = 0
+        self.compressed_bytes_in = 0
+        self.compressed_bytes_out = 0
+
+    @classmethod
+    def from_env(cls, flights: Optional[SingleFlight] = None) -> "ReportResponses":
+        """HEALTH_COMPRESS_MIN_BYTES (0 = never compress)."""
+        return cls(flights, min_compress_bytes=int(os.getenv("HEALTH_COMPRESS_MIN_BYTES", "4096") or 0))
+
+    async def report(self, request: Request, method: str, payload: Any, make: Callable[[], Awaitable[Any]],
+                     cache: Optional[ReportCache] = None) -> Response:
+        """Response for `await make()`, the report of `payload`; `cache` is where the runner
+        caches it (keyed by `canonical_key(payload)`), if anywhere."""
+        key = await run_in_threadpool(canonical_key, payload)  # off the loop, as in `coalesced`
+        tags = _if_none_match(request)
+        if tags and cache is not None:
+            etag = await run_in_threadpool(cache.etag, key, lambda report: _etag(key, dumps(report)))
+            if etag is not None and _matches(etag, tags):
+                self.not_modified_cached += 1
+                return self._not_modified(etag)
+        result = await (make() if self.flights is None else self.flights.do(f"{method}:{key}", make))
+        body = dumps(result)
+        etag = _etag(key, body)
+        if cache is not None and "degraded" not in result:
+            cache.etag(key, lambda _: etag)  # tag the entry this run just cached (degraded ones are not)
+        if _matches(etag, tags):
+            self.not_modified += 1
+            return self._not_modified(etag)
+        encoding = _encoding(request) if self.min_compress_bytes and len(body) >= self.min_compress_bytes else None
+        if encoding is not None:
+            body = await run_in_threadpool(self._compressed, body, encoding)
+        return self._response(body, etag, encoding)
+
+    def static(self, request: Request, content: Any) -> Response:
+        """Conditional, compressed response for small fixed content (e.g. /example), on the loop."""
+        body = dumps(content)
+        etag = _etag("", body)
+        if _matches(etag, _if_none_match(request)):
+            self.not_modified += 1
+            return self._not_modified(etag)
+        encoding = _encoding(request) if self.min_compress_bytes and len(body) >= self.min_compress_bytes else None
+        return self._response(self._compressed(body, encoding) if encoding else body, etag, encoding)
+
+    def _compressed(self, body: bytes, encoding: str) -> bytes:
+        out = _compress(body, encoding)
+        self.compressed += 1
+        self.compressed_bytes_in += len(body)
+        self.compressed_bytes_out += len(out)
+        return out
+
+    @staticmethod
+    def _response(body: bytes, etag: str, encoding: Optional[str]) -> Response:
+        headers = {"etag": etag, "vary": "Accept-Encoding"}
+        if encoding is not None:
+            headers["content-encoding"] = encoding
+        return Response(body, media_type="application/json", headers=headers)
+
+    @staticmethod
+    def _not_modified(etag: str) -> Response:
+        return Response(status_code=304, headers={"etag": etag, "vary": "Accept-Encoding"})
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "min_compress_bytes": self.min_compress_bytes,
+            "not_modified": self.not_modified,
+            "not_modified_cached": self.not_modified_cached,
+            "compressed": self.compressed,
+            "compressed_bytes_in": self.compressed_bytes_in,
+            "compressed_bytes_out": self.compressed_bytes_out,
+        }
+
+def payload_error_response(request: Request, exc: PayloadError) -> JSONResponse:
+    """Exception handler: 422 in FastAPI's validation error shape."""
+    return FastJSONResponse(status_code=422, content={"detail": exc.errors})
+
+PROFILE_HEADER = b"x-health-profile"
+
+class ProfilingMiddleware:
+    """ASGI middleware: profile a request when it sends `X-Health-Profile: 1` or is sampled.
+
+    The profile session lives in a context variable for the whole request,
+    so runner calls made from the endpoint (threadpool or runner pool)
+    record their stages in it. The response carries `X-Health-Profile-Id`
+    for fetching the record from /debug/profiles/{id}.
+    """
+    def __init__(self, app, profiler: Profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["path"].startswith("/debug/"):
+            return await self.app(scope, receive, send)
+        force = any(k == PROFILE_HEADER and v.strip() == b"1" for k, v in scope["headers"])
+        with self.profiler.session(f"{scope['method']} {scope['path']}", force=force) as session:
+            if session is None:
+                return await self.app(scope, receive, send)
+
+            async def send_with_id(message) -> None:
+                if message["type"] == "http.response.start":
+                    headers = [*message.get("headers", ()), (b"x-health-profile-id", str(session.id).encode())]
+                    message = {**message, "headers": headers}
+                await send(message)
+            await self.app(scope, receive, send_with_id)
+
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse whose body iterator is itself reading the request body.
+
+    Starlette normally watches `receive` for a client disconnect while it
+    streams; here `request.stream()` is consuming `receive`, and that
+    watcher would steal its body chunks. A disconnect still surfaces as
+    ClientDisconnect from `request.stream()`.
+    """
+    async def __call__(self, scope, receive, send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+def ndjson_report_response(runner: Any, request: Request) -> StreamingResponse:
+    """Streamed report: NDJSON daily logs in, NDJSON day lines + summary out."""
+    # imported here: it pulls in the agents, which app.py loads lazily
+    from roma_engine.streaming import stream_ndjson
+    return DuplexStreamingResponse(stream_ndjson(runner, request.stream()), media_type="application/x-ndjson")
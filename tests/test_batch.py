@@ -0,0 +1,36 @@
+from bench.synthetic import make_payload, make_payloads
+from roma_engine.cache import ReportCache
+from roma_engine.runner import HealthRunner
+
+def _mixed_payloads():
+    payloads = make_payloads(20, days=14, workout_density=1.0, missing_rate=0.3)
+    payloads += [make_payload(s, days=d) for s, d in ((101, 1), (102, 90), (103, 365))]
+    bad = make_payload(104)
+    bad["daily_logs"][2]["steps"] = "abc"
+    bad["daily_logs"][4]["date"] = None
+    partial = make_payload(105)
+    del partial["user_profile"]["age"], partial["targets"]["steps"]
+    trends = {**make_payload(106, days=60), "include_trends": True}
+    return payloads + [bad, partial, trends, {"daily_logs": []}, {}]
+
+def test_run_batch_matches_run_per_user():
+    payloads = _mixed_payloads()
+    expected = [HealthRunner().run(p) for p in payloads]
+    assert HealthRunner().run_batch(payloads) == expected
+    assert {r["status"] for r in expected} == {"ok", "needs_input"}
+
+def test_run_batch_with_cache_computes_only_misses():
+    payloads = _mixed_payloads()
+    expected = [HealthRunner().run(p) for p in payloads]
+    cached = HealthRunner(cache=ReportCache(64))
+    assert cached.run_batch(payloads[:5]) == expected[:5]
+    assert cached.run_batch(payloads) == expected
+    assert cached.cache.stats()["hits"] == 5
+
+def test_parallel_dag_workers_match_serial(monkeypatch):
+    from roma_engine.scheduler import DagScheduler
+    monkeypatch.setenv("HEALTH_DAG_WORKERS", "3")
+    assert DagScheduler.workers_from_env() == 3
+    payloads = _mixed_payloads()
+    parallel = HealthRunner(max_workers=DagScheduler.workers_from_env())
+    assert [parallel.run(p) for p in payloads] == HealthRunner().run_batch(payloads)
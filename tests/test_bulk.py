@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from bench.synthetic import make_payloads
+from roma_engine import bulk
+from roma_engine.cohorts import CohortStats
+
+def _inputs(tmp_path):
+    path = tmp_path / "users.jsonl"
+    path.write_text("".join(json.dumps(p) + "\n" for p in make_payloads(300, 7, seed=3)))
+    return path
+
+def _crash_after(monkeypatch, chunks):
+    submit, calls = bulk._submit, []
+    def crashing(*args):
+        calls.append(1)
+        if len(calls) > chunks:
+            raise KeyboardInterrupt
+        return submit(*args)
+    monkeypatch.setattr(bulk, "_submit", crashing)
+
+def _cohorts(path):
+    stats = CohortStats.load(str(path))
+    return stats.observed, stats.to_dict()["cohorts"].keys()
+
+def test_resume_after_crash_matches_a_clean_run(tmp_path, monkeypatch):
+    inp, args = _inputs(tmp_path), ["--workers", "0", "--chunk-size", "40"]
+    bulk.main([str(inp), "--out", str(tmp_path / "full.jsonl"), "--cohorts", str(tmp_path / "full.json"), *args])
+    with monkeypatch.context() as m:
+        _crash_after(m, 3)
+        with pytest.raises(KeyboardInterrupt):
+            bulk.main([str(inp), "--out", str(tmp_path / "out.jsonl"), "--cohorts", str(tmp_path / "c.json"), *args])
+    bulk.main([str(inp), "--out", str(tmp_path / "out.jsonl"), "--cohorts", str(tmp_path / "c.json"),
+               "--resume", *args])
+    assert (tmp_path / "out.jsonl").read_bytes() == (tmp_path / "full.jsonl").read_bytes()
+    assert _cohorts(tmp_path / "c.json") == _cohorts(tmp_path / "full.json")
+
+def test_shard_rerun_skips_finished_chunks(tmp_path, monkeypatch):
+    inp, args = _inputs(tmp_path), ["--workers", "0", "--chunk-size", "40"]
+    bulk.main([str(inp), "--out", str(tmp_path / "full.jsonl"), "--cohorts", str(tmp_path / "full.json"), *args])
+    out_dir = tmp_path / "shards"
+    with monkeypatch.context() as m:
+        _crash_after(m, 3)
+        with pytest.raises(KeyboardInterrupt):
+            bulk.main([str(inp), "--out-dir", str(out_dir), "--cohorts", str(tmp_path / "c.json"), *args])
+    bulk.main([str(inp), "--out-dir", str(out_dir), "--cohorts", str(tmp_path / "c.json"), *args])
+    shards = sorted(p for p in out_dir.iterdir() if p.suffix == ".jsonl")
+    assert b"".join(p.read_bytes() for p in shards) == (tmp_path / "full.jsonl").read_bytes()
+    assert _cohorts(tmp_path / "c.json") == _cohorts(tmp_path / "full.json")
+
+def test_shard_rerun_with_cohorts_needs_their_sketches(tmp_path):
+    inp, args = _inputs(tmp_path), ["--workers", "0", "--chunk-size", "40"]
+    bulk.main([str(inp), "--out-dir", str(tmp_path / "shards"), *args])
+    with pytest.raises(SystemExit):
+        bulk.main([str(inp), "--out-dir", str(tmp_path / "shards"), "--cohorts", str(tmp_path / "c.json"), *args])
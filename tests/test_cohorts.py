@@ -0,0 +1,59 @@
+from bench.synthetic import make_payload
+from roma_engine.cohorts import CohortStats
+from roma_engine.runner import HealthRunner
+
+PROFILE = {"age": 34, "sex": "F", "goal": "fat loss"}
+
+def _metrics(i):
+    return {"sleep_avg_h": 5 + i % 40 / 10, "steps_avg": 3000 + 97 * i % 9000, "water_avg_l": 1 + i % 25 / 10}
+
+def test_standing_does_not_rebuild_on_every_report():
+    stats = CohortStats(min_count=30, refresh_every=500, refresh_s=3600)
+    for i in range(100):
+        stats.observe(PROFILE, _metrics(i))
+    assert stats.standing(PROFILE, _metrics(0)) is not None
+    rebuilds = stats.rebuilds
+    # one observe + one standing per report, as HealthRunner does
+    for i in range(100, 400):
+        stats.observe(PROFILE, _metrics(i))
+        stats.standing(PROFILE, _metrics(i))
+    assert stats.rebuilds == rebuilds
+    for i in range(400, 700):
+        stats.observe(PROFILE, _metrics(i))
+    stats.standing(PROFILE, _metrics(0))
+    assert stats.rebuilds == rebuilds + 1
+
+def test_snapshot_tracks_merge():
+    stats, other = CohortStats(min_count=30), CohortStats(min_count=30)
+    for i in range(50):
+        other.observe(PROFILE, _metrics(i))
+    assert stats.standing(PROFILE, _metrics(0)) is None
+    stats.merge(other)
+    standing = stats.standing(PROFILE, _metrics(0))
+    assert standing["cohort"] == "30-39/F/fat loss" and standing["users"] == 50
+
+def test_weekly_reports_observe_nobody():
+    runner = HealthRunner(cohorts=CohortStats(min_count=1, refresh_every=1))
+    payload = make_payload(7, days=70, missing_rate=0)
+    weeks = runner.run_weeks(payload)["weeks"]
+    assert len(weeks) == 10 and runner.cohorts.observed == 0
+    runner.run(payload)
+    assert runner.cohorts.observed == 1
+    assert runner.run_weeks(payload)["weeks"][0]["week_summary"]["cohort"]["users"] == 1
+
+def test_repeated_observation_counts_once():
+    stats = CohortStats(min_count=1, refresh_every=1)
+    for _ in range(5):
+        stats.observe(PROFILE, _metrics(1))
+    stats.observe({**PROFILE, "weight_kg": 70}, _metrics(1))
+    stats.observe(PROFILE, _metrics(2))
+    assert (stats.observed, stats.repeats) == (3, 4)
+    assert stats.standing(PROFILE, _metrics(1))["users"] == 3
+
+def test_unusable_ages_fall_in_the_unknown_band():
+    stats = CohortStats(min_count=1)
+    for i, age in enumerate((float("nan"), "thirty", float("inf"))):
+        stats.observe({**PROFILE, "age": age}, {**_metrics(i), "steps_avg": float("nan")})
+    assert stats.stats()["observed"] == 3
+    assert stats.standing({**PROFILE, "age": "?"}, _metrics(0))["cohort"] == "unknown/F/fat loss"
+    assert stats.standing({**PROFILE, "age": None}, _metrics(0)) is None
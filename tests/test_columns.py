@@ -0,0 +1,57 @@
+from datetime import date, timedelta
+
+import pytest
+
+from bench.synthetic import make_payload
+from roma_agents.columns import DayColumns
+from roma_engine.runner import HealthRunner
+
+def _days(*dates, **fields):
+    return DayColumns.from_rows([{"date": d, "steps": i, **fields} for i, d in enumerate(dates)])
+
+def test_by_date_sorts_and_keeps_the_last_entry_per_date():
+    cols = _days("2025-01-03", "2025-01-01", "yesterday", "2025-01-03", None, "2025-01-02").by_date()
+    assert cols.dates == ["2025-01-01", "2025-01-02", "2025-01-03", "yesterday", None]
+    assert list(cols.values["steps"]) == [1, 5, 3, 2, 4]
+
+def test_by_date_returns_ordered_columns_as_is():
+    cols = _days("2025-01-01", "2025-01-02")
+    assert cols.by_date() is cols
+
+def test_iso_weeks_cut_at_mondays_across_the_year_end():
+    start = date(2024, 12, 25)
+    cols = _days(*[(start + timedelta(d)).isoformat() for d in range(0, 21, 2)], "undated")
+    weeks = cols.iso_weeks()
+    assert [w for w, _, _ in weeks] == ["2024-W52", "2025-W01", "2025-W02", "2025-W03"]
+    assert [(cols.dates[i], cols.dates[j - 1]) for _, i, j in weeks] == [
+        ("2024-12-25", "2024-12-29"), ("2024-12-31", "2025-01-04"),
+        ("2025-01-06", "2025-01-12"), ("2025-01-14", "2025-01-14")]
+    assert cols.iso_weeks("2024-12-30", "2025-01-06") == [("2025-W01", 3, 6), ("2025-W02", 6, 7)]
+
+def test_date_range_rejects_bounds_that_are_not_iso():
+    with pytest.raises(ValueError):
+        _days("2025-01-01").date_range(start="01/01/2025")
+
+def test_run_weeks_reports_each_week_like_run():
+    payload = make_payload(9, days=40, workout_density=1.0, start=date(2024, 12, 20))
+    logs = payload["daily_logs"]
+    shuffled = {**payload, "daily_logs": logs[::-1] + [dict(logs[10], steps=1)]}
+    runner = HealthRunner()
+    weeks = runner.run_weeks(shuffled)["weeks"]
+    assert [w["week"] for w in weeks] == ["2024-W51", "2024-W52"] + [f"2025-W{k:02d}" for k in range(1, 6)]
+    fixed = [dict(d, steps=1) if d["date"] == logs[10]["date"] else d for d in logs]
+    for w in weeks:
+        in_week = [d for d in fixed if w["start"] <= d["date"] <= w["end"]]
+        report = runner.run({**payload, "daily_logs": in_week})
+        assert {k: w[k] for k in report} == report
+
+def test_run_weeks_degraded_detail_counts_the_weeks_days(monkeypatch):
+    from roma_engine.budgets import StageBudgets
+    monkeypatch.setenv("HEALTH_DEADLINE_MS", "0.001")
+    payload = make_payload(9, days=17, start=date(2024, 12, 20))
+    weeks = HealthRunner(budgets=StageBudgets.from_env()).run_weeks(payload)["weeks"]
+    assert [w["degraded"][0]["detail"] for w in weeks] == [
+        "daily_suggestions cover all 3 days", "daily_suggestions cover all 7 days",
+        "daily_suggestions cover all 7 days"]
+    month = HealthRunner(budgets=StageBudgets.from_env()).run(make_payload(9, days=30))
+    assert month["degraded"][0]["detail"] == "daily_suggestions cover the last 7 of 30 days"
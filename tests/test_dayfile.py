@@ -0,0 +1,52 @@
+import json
+
+from bench.synthetic import make_payloads
+from roma_engine import bulk
+from roma_engine.dayfile import DayFile, write_dayfile
+from roma_engine.runner import HealthRunner
+
+def _payloads():
+    payloads = make_payloads(12, days=14, workout_density=1.0, missing_rate=0.2, seed=5)
+    logs = [p["daily_logs"] for p in payloads]
+    logs[0][3]["date"] = "yesterday"
+    logs[0][5]["notes"] = "knee pain — rest day ✓"
+    logs[1][2]["date"] = "20240103"
+    logs[2][1]["date"] = None
+    logs[3][4]["steps"] = "abc"
+    logs[4].insert(2, dict(logs[4][5], steps=1))
+    logs[5].clear()
+    for i, p in enumerate(payloads):
+        p["user_id"] = f"u{i}"
+    return payloads
+
+def test_round_trip_gives_the_same_users_and_reports(tmp_path):
+    payloads, path = _payloads(), str(tmp_path / "users.rhd")
+    assert write_dayfile(path, payloads) == len(payloads)
+    runner = HealthRunner()
+    with DayFile(path) as f:
+        users = f[:]
+        read = [(u["user_id"], u["status"], u["missing_fields"], u["normalized_logs"].to_list()) for u in users]
+        reports = runner.run_batch_normalized(users)
+        del users  # mapped views must be gone before the file closes
+    ingested = [runner.agents["ingest"].run(p) for p in payloads]
+    assert read == [(p["user_id"], i["status"], i["missing_fields"], i["normalized_logs"].to_list())
+                    for p, i in zip(payloads, ingested)]
+    assert reports == runner.run_batch(payloads)
+
+def test_a_failing_user_does_not_fail_the_chunk(tmp_path, monkeypatch):
+    payloads, path = _payloads(), str(tmp_path / "users.rhd")
+    payloads[4]["daily_logs"][0]["notes"] = "fail me"
+    write_dayfile(path, payloads)
+    bulk._init_worker()
+    coach = bulk._worker_runner.agents["coach"]
+    run = coach.run
+    def broken(p):
+        if "fail me" in p["normalized_logs"].notes:
+            raise RuntimeError("boom")
+        return run(p)
+    monkeypatch.setattr(coach, "run", broken)
+    monkeypatch.setattr(coach, "run_batch", lambda ps: [broken(p) for p in ps])
+    reports = [json.loads(line) for line in bulk.run_dayfile_chunk(path, 0, len(payloads)).splitlines()]
+    assert [r.get("status") for r in reports].count("error") == 1
+    assert reports[4] == {"user_id": "u4", "status": "error", "error": "boom"}
+    bulk._worker_dayfiles.pop(path).close()
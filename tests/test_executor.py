@@ -0,0 +1,35 @@
+import asyncio
+from concurrent.futures import Future
+
+import pytest
+
+from bench.synthetic import make_payload
+from roma_engine import executor
+from roma_engine.instrumentation import Instrumentation
+from roma_engine.runner import HealthRunner
+
+def _calls(inst):
+    return {s: (inst.calls[s], inst.errors.get(s, 0)) for s in inst.calls}
+
+def test_process_mode_records_worker_stages_in_the_parent():
+    runner = HealthRunner(instrumentation=Instrumentation())
+    pool = executor.RunnerPool(runner, mode="process", max_workers=1)
+    payload = {**make_payload(1, days=14), "include_trends": True}
+    try:
+        out = asyncio.run(pool.call("run", payload))
+    finally:
+        pool.shutdown()
+    assert out == HealthRunner().run(payload)
+    assert _calls(runner.instrumentation) == {s: (1, 0) for s in runner.agents}
+
+def test_failed_worker_call_still_records_its_stages(monkeypatch):
+    executor._init_worker()
+    monkeypatch.setattr(executor._worker_runner.agents["coach"], "run", lambda p: 1 / 0)
+    with pytest.raises(ZeroDivisionError) as raised:
+        executor._call_worker("run", (make_payload(2),))
+    cf = Future()
+    cf.set_exception(raised.value)
+    runner = HealthRunner(instrumentation=Instrumentation())
+    executor.RunnerPool(runner, mode="process")._record_worker(cf)
+    assert _calls(runner.instrumentation) == {"ingest": (1, 0), "aggregates": (1, 0), "metrics": (1, 0),
+                                              "coach": (1, 1)}
@@ -0,0 +1,46 @@
+import random
+
+from bench.synthetic import make_payload
+from roma_engine.runner import HealthRunner
+from roma_engine.sessions import SessionStore
+
+def test_upsert_day_matches_run_on_the_same_days():
+    payload = make_payload(3, days=21, workout_density=1.0)
+    days = payload["daily_logs"][:]
+    random.Random(0).shuffle(days)
+    corrected = {**days[5], "steps": 15000, "workouts": []}
+    runner = HealthRunner()
+    runner.upsert_day("u1", days[0], payload["user_profile"], payload["targets"])
+    for day in days[1:] + [corrected]:
+        synced = runner.upsert_day("u1", day)
+    final = [corrected if d["date"] == corrected["date"] else d for d in payload["daily_logs"]]
+    assert synced == runner.run({**payload, "daily_logs": final})
+
+def test_upsert_day_without_profile_needs_input():
+    payload = make_payload(4)
+    out = HealthRunner().upsert_day("u2", payload["daily_logs"][0], targets=payload["targets"])
+    assert out["status"] == "needs_input" and "user_profile" in out["missing_fields"]
+
+def test_sessions_are_bounded_and_expire():
+    now = [0.0]
+    runner = HealthRunner(sessions=SessionStore(max_users=2, ttl_s=60, clock=lambda: now[0]))
+    payload = make_payload(5)
+    for user in ("a", "b", "c"):
+        runner.upsert_day(user, payload["daily_logs"][0], payload["user_profile"], payload["targets"])
+    assert len(runner.sessions) == 2 and runner.sessions.stats()["evictions"] == 1
+    now[0] = 61
+    out = runner.upsert_day("c", payload["daily_logs"][1])
+    assert out["status"] == "needs_input" and runner.sessions.stats()["expirations"] == 1
+
+def test_unchanged_targets_do_not_retip_every_day(monkeypatch):
+    payload = make_payload(6, days=30)
+    runner = HealthRunner()
+    for day in payload["daily_logs"]:
+        runner.upsert_day("u3", day, payload["user_profile"], payload["targets"])
+    calls = []
+    day_tips = runner.agents["coach"].day_tips
+    monkeypatch.setattr(runner.agents["coach"], "day_tips", lambda *a: calls.append(a) or day_tips(*a))
+    runner.upsert_day("u3", payload["daily_logs"][-1], targets=payload["targets"])
+    assert len(calls) == 1
+    runner.upsert_day("u3", payload["daily_logs"][-1], targets={**payload["targets"], "steps": 1})
+    assert len(calls) == 1 + 30 + 1
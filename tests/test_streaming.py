@@ -0,0 +1,30 @@
+from roma_engine.runner import HealthRunner
+
+PROFILE = {"age": 41, "sex": "M", "height_cm": 180, "weight_kg": 84, "goal": "endurance"}
+TARGETS = {"sleep_h": 7.5, "steps": 10000, "workouts_per_week": 3, "water_liters": 2.5}
+
+def _day(d, steps, sleep, workouts=0):
+    return {"date": f"2025-03-{d:02d}", "steps": steps, "sleep_hours": sleep, "water_liters": 2.1,
+            "workouts": [{"type": "run", "minutes": 30, "intensity_1_5": 3}] * workouts}
+
+# 2025-03-05 is sent twice; the second entry is the one that counts
+LOGS = [_day(3, 12000, 7.1, 1), _day(4, 15400, 6.2), _day(5, 21050, 8.4, 2),
+        _day(6, 9800, 7.9, 1), _day(5, 18300, 6.6, 1), _day(7, 17700, 7.0, 2)]
+
+def _summary(report):
+    return {k: report[k] for k in ("status", "week_summary", "weekly_plan", "next_actions")}
+
+def test_repeated_date_counts_once_in_stream_run_and_upsert():
+    runner = HealthRunner()
+    full = runner.run({"user_profile": PROFILE, "targets": TARGETS, "daily_logs": LOGS})
+    assert full["status"] == "ok"
+    assert [s["date"] for s in full["daily_suggestions"]] == [f"2025-03-0{d}" for d in range(3, 8)]
+
+    *days, summary = runner.run_stream([{"user_profile": PROFILE, "targets": TARGETS}, *LOGS])
+    assert len(days) == len(LOGS)
+    assert _summary(summary) == _summary(full)
+
+    for day in LOGS:
+        synced = runner.upsert_day("u1", day, PROFILE, TARGETS)
+    assert _summary(synced) == _summary(full)
+    assert synced["daily_suggestions"] == full["daily_suggestions"]